@@ -0,0 +1,59 @@
+"""Merged recent-activity feed across report collections.
+
+Each collection contributes at most ``limit`` of its newest reports (an index
+walk on ``created_at_id``); the branches are unioned, sorted and cut to the
+true top N server-side, so one report type dominating does not starve the feed.
+"""
+from typing import List, Optional
+
+import pagination
+
+FEED_FIELDS = {"_id": 0, "id": 1, "location_name": 1, "district": 1, "status": 1, "created_at": 1}
+
+# collection -> (activity type, extra fields needed for the title)
+SOURCES = {
+    "water_reports": ("water_report", {}),
+    "patient_reports": ("patient_report", {"suspected_disease": 1}),
+}
+
+
+def feed_pipeline(limit: int, cursor: Optional[str] = None) -> List[dict]:
+    match = pagination.keyset_filter(cursor)
+    sort = dict(pagination.SORT)
+
+    def branch(collection):
+        activity_type, extra = SOURCES[collection]
+        return [
+            {"$match": match},
+            {"$sort": sort},
+            {"$limit": limit},
+            {"$project": {**FEED_FIELDS, **extra, "type": {"$literal": activity_type}}},
+        ]
+
+    first, *rest = SOURCES
+    pipeline = branch(first)
+    for collection in rest:
+        pipeline.append({"$unionWith": {"coll": collection, "pipeline": branch(collection)}})
+    pipeline += [{"$sort": sort}, {"$limit": limit}]
+    return pipeline
+
+
+def format_activity(doc: dict) -> dict:
+    if doc["type"] == "water_report":
+        title = f"Water Quality Report - {doc['location_name']}"
+    else:
+        title = f"Patient Report - {doc['suspected_disease']}"
+    return {
+        "id": doc["id"],
+        "type": doc["type"],
+        "title": title,
+        "location": f"{doc['location_name']}, {doc['district']}",
+        "status": doc["status"],
+        "created_at": doc["created_at"],
+    }
+
+
+async def recent_activity(db, limit: int, cursor: Optional[str] = None) -> List[dict]:
+    first = next(iter(SOURCES))
+    docs = await db[first].aggregate(feed_pipeline(limit, cursor)).to_list(length=limit)
+    return [format_activity(doc) for doc in docs]
@@ -0,0 +1,209 @@
+"""Hot/cold tiering: old processed reports move to Parquet archives.
+
+``archive_reports`` moves reports whose status is in ``ARCHIVE_STATUSES``
+and whose report date is older than ``ARCHIVE_AFTER_DAYS`` out of the hot
+collections into zstd-compressed Parquet files under ``ARCHIVE_DIR``,
+partitioned by district and month::
+
+    water_reports/district=Kamrup/month=2025-03/part-<batch>.parquet
+
+Each chunk is first tagged with a batch id in MongoDB, written to one file
+per partition (atomically, through a rename) and only then deleted, so a
+run that dies halfway is finished by the next one without losing or
+duplicating reports. The delete re-checks the status; a report changed in
+the meantime stays in MongoDB and is taken out of the batch's files. Deleted reports leave sync tombstones and are taken
+out of the status counters; the district rollups keep counting them, so
+``rebuild-rollups`` after archiving would drop the archived months.
+
+The archive is read-only through the API. Queries pick partitions from the
+directory names alone, newest month first, and open only those files.
+"""
+import asyncio
+import itertools
+import os
+import uuid
+from collections import Counter, defaultdict
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional
+from urllib.parse import quote, unquote
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+import export
+import report_stats
+import rollups
+import sync
+
+ARCHIVE_DIR = Path(os.environ.get('ARCHIVE_DIR', Path(__file__).parent / 'archive'))
+ARCHIVE_AFTER_DAYS = int(os.environ.get('ARCHIVE_AFTER_DAYS', '180'))
+ARCHIVE_STATUSES = ("processed",)
+ARCHIVE_CHUNK_SIZE = 20000
+BATCH_FIELD = "archive_batch"
+COMPRESSION = "zstd"
+MAX_ARCHIVE_RESULTS = 1000
+
+
+class Partition(NamedTuple):
+    district: str
+    month: str
+    path: Path
+
+
+def _month(value: datetime) -> str:
+    return value.strftime("%Y-%m")
+
+
+def _district_dir(root: Path, collection: str, district: str) -> Path:
+    # District names may hold spaces or slashes; quoting keeps them one directory level
+    return root / collection / f"district={quote(district, safe='')}"
+
+
+def partition_path(root: Path, collection: str, district: str, month: str) -> Path:
+    return _district_dir(root, collection, district) / f"month={month}"
+
+
+def _write_partition(path: Path, rows: List[dict], schema: pa.Schema):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    partial = path.with_suffix(".partial")
+    pq.write_table(pa.Table.from_pylist(rows, schema=schema), partial, compression=COMPRESSION)
+    os.replace(partial, path)
+
+
+def _drop_rows(path: Path, ids: List[str]):
+    """Rewrite a partition file without the given report ids (atomically); removes it when nothing is left."""
+    if not path.exists():
+        return
+    table = pq.read_table(path)
+    kept = table.filter(pc.invert(pc.is_in(table["id"], value_set=pa.array(ids, pa.string()))))
+    if kept.num_rows == table.num_rows:
+        return
+    if not kept.num_rows:
+        path.unlink()
+        return
+    partial = path.with_suffix(".partial")
+    pq.write_table(kept, partial, compression=COMPRESSION)
+    os.replace(partial, path)
+
+
+async def _archive_batch(db, collection: str, schema: pa.Schema, batch: str, root: Path) -> int:
+    date_field, _ = rollups.SOURCES[collection]
+    reports = await db[collection].find({BATCH_FIELD: batch}, {"_id": 0}).to_list(length=None)
+    partitions = defaultdict(list)
+    for report in reports:
+        partitions[(report["district"], _month(report[date_field]))].append(report)
+    for (district, month), rows in partitions.items():
+        path = partition_path(root, collection, district, month) / f"part-{batch}.parquet"
+        # A file left by an interrupted run is complete and may hold reports already deleted
+        if not path.exists():
+            await asyncio.to_thread(_write_partition, path, rows, schema)
+
+    # Tombstones go first so a run that dies after the delete can't lose them
+    await sync.record_deletions(db, collection, [report["id"] for report in reports])
+    result = await db[collection].delete_many({BATCH_FIELD: batch, "status": {"$in": list(ARCHIVE_STATUSES)}})
+    # Reports whose status changed since tagging stay hot and leave the archive again
+    kept = await db[collection].find(
+        {BATCH_FIELD: batch}, {"_id": 0, "id": 1, "district": 1, date_field: 1}).to_list(length=None)
+    kept_ids = [report["id"] for report in kept]
+    if kept:
+        for district, month in {(report["district"], _month(report[date_field])) for report in kept}:
+            path = partition_path(root, collection, district, month) / f"part-{batch}.parquet"
+            await asyncio.to_thread(_drop_rows, path, kept_ids)
+        await db[sync.TOMBSTONES_COLLECTION].delete_many({"collection": collection, "id": {"$in": kept_ids}})
+        await db[collection].update_many({BATCH_FIELD: batch}, {"$unset": {BATCH_FIELD: ""}})
+        # Restamped after their tombstones, so a client that already applied one gets the report back
+        await sync.update_each(db, collection, kept_ids, {}, {})
+    deleted = set(report["id"] for report in reports) - set(kept_ids)
+    await report_stats.remove_counts(
+        db, collection, Counter(report["status"] for report in reports if report["id"] in deleted))
+    return result.deleted_count
+
+
+async def archive_collection(db, collection: str, model, older_than_days: int = ARCHIVE_AFTER_DAYS,
+                             root: Path = ARCHIVE_DIR, chunk_size: int = ARCHIVE_CHUNK_SIZE) -> int:
+    """Move eligible reports of one collection to the archive; returns how many were moved."""
+    date_field, _ = rollups.SOURCES[collection]
+    schema = export.arrow_schema(model)
+    cutoff = datetime.combine(datetime.utcnow().date() - timedelta(days=older_than_days), datetime.min.time())
+    eligible = {"status": {"$in": list(ARCHIVE_STATUSES)}, date_field: {"$lt": cutoff}}
+    archived = 0
+    # Finish what an interrupted run had tagged before starting new batches
+    for batch in await db[collection].distinct(BATCH_FIELD):
+        archived += await _archive_batch(db, collection, schema, batch, root)
+    while True:
+        ids = [doc["_id"] for doc in await db[collection].find(
+            {**eligible, BATCH_FIELD: {"$exists": False}}, {"_id": 1}).limit(chunk_size).to_list(length=chunk_size)]
+        if not ids:
+            return archived
+        batch = uuid.uuid4().hex
+        await db[collection].update_many({"_id": {"$in": ids}, **eligible}, {"$set": {BATCH_FIELD: batch}})
+        archived += await _archive_batch(db, collection, schema, batch, root)
+
+
+async def archive_reports(db, models: Dict[str, type], older_than_days: int = ARCHIVE_AFTER_DAYS,
+                          root: Path = ARCHIVE_DIR) -> Dict[str, int]:
+    return {collection: await archive_collection(db, collection, model, older_than_days, root)
+            for collection, model in models.items()}
+
+
+def partitions(collection: str, district: Optional[str] = None, start: Optional[date] = None,
+               end: Optional[date] = None, root: Path = ARCHIVE_DIR) -> List[Partition]:
+    """Partitions that can hold matching reports, newest month first, chosen from directory names."""
+    base = root / collection
+    if district:
+        district_dirs = [_district_dir(root, collection, district)]
+    else:
+        district_dirs = sorted(base.glob("district=*")) if base.is_dir() else []
+    found = []
+    for district_dir in district_dirs:
+        if not district_dir.is_dir():
+            continue
+        for month_dir in district_dir.glob("month=*"):
+            month = month_dir.name[len("month="):]
+            if (start and month < _month(start)) or (end and month > _month(end)):
+                continue
+            found.append(Partition(unquote(district_dir.name[len("district="):]), month, month_dir))
+    found.sort(key=lambda partition: (partition.month, partition.district), reverse=True)
+    return found
+
+
+def partition_summary(collection: str, root: Path = ARCHIVE_DIR) -> List[dict]:
+    """Reports and files per partition, from the Parquet footers only."""
+    summary = []
+    for partition in partitions(collection, root=root):
+        files = sorted(partition.path.glob("*.parquet"))
+        summary.append({
+            "district": partition.district,
+            "month": partition.month,
+            "files": len(files),
+            "reports": sum(pq.read_metadata(file).num_rows for file in files),
+        })
+    return summary
+
+
+def read_reports(collection: str, district: Optional[str] = None, start: Optional[date] = None,
+                 end: Optional[date] = None, status: Optional[str] = None, limit: int = 100,
+                 root: Path = ARCHIVE_DIR) -> List[dict]:
+    """Archived reports matching the filters, newest first. Blocking; run it in a thread."""
+    date_field, _ = rollups.SOURCES[collection]
+    filters = []
+    if start:
+        filters.append((date_field, ">=", datetime.combine(start, datetime.min.time())))
+    if end:
+        filters.append((date_field, "<", datetime.combine(end, datetime.min.time()) + timedelta(days=1)))
+    if status:
+        filters.append(("status", "=", status))
+
+    rows = []
+    for _, month_partitions in itertools.groupby(partitions(collection, district, start, end, root),
+                                                 key=lambda partition: partition.month):
+        for partition in month_partitions:
+            for file in sorted(partition.path.glob("*.parquet")):
+                rows.extend(pq.read_table(file, filters=filters or None).to_pylist())
+        # Every remaining partition is an older month
+        if len(rows) >= limit:
+            break
+    rows.sort(key=lambda row: row[date_field], reverse=True)
+    return rows[:limit]
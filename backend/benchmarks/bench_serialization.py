@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""Per-item cost of serializing a page of reports, before and after the fast path.
+
+"model" reproduces the old read path: build a WaterQualityReport per document,
+let FastAPI validate it against response_model and dump it with json.dumps.
+"direct" is the current path: the projected document goes straight to orjson.
+
+    python benchmarks/bench_serialization.py --items 500 --repeat 20
+"""
+import argparse
+import json
+import os
+import sys
+import timeit
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import List, Tuple
+
+import orjson
+from pydantic import TypeAdapter
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "bench")
+
+from server import WaterQualityReport, api_projection  # noqa: E402
+
+
+def make_documents(count: int) -> Tuple[List[dict], List[dict]]:
+    now = datetime.utcnow().replace(microsecond=0)
+    fields = api_projection(WaterQualityReport)
+    docs = []
+    for i in range(count):
+        doc = {
+            "_id": uuid.uuid4().hex[:24],
+            "id": str(uuid.uuid4()),
+            "location_name": f"Village {i}",
+            "district": "Kamrup",
+            "water_source": "borewell",
+            "collection_date": now - timedelta(days=i % 30),
+            "collection_time": "10:30 AM",
+            "collector_name": "Collector",
+            "collector_id": f"C{i:04d}",
+            "phone_number": "9876543210",
+            "ph_level": 7.1,
+            "turbidity": 2.5,
+            "chlorine": 0.4,
+            "e_coli": 0,
+            "total_coliform": 3,
+            "tds": 210.0,
+            "status": "under_review",
+            "risk_score": 35.0,
+            "risk_flags": ["turbidity"],
+            "risk_profile": "bis_10500",
+            "risk_status": "under_review",
+            "created_at": now - timedelta(minutes=i),
+            "latitude": 26.14,
+            "longitude": 91.73,
+        }
+        docs.append(doc)
+    # The fast path reads with a projection, so it never sees _id
+    projected = [{k: v for k, v in doc.items() if fields.get(k)} for doc in docs]
+    return docs, projected
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--items", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    raw_docs, projected = make_documents(args.items)
+    adapter = TypeAdapter(List[WaterQualityReport])
+
+    def model_path():
+        models = [WaterQualityReport(**doc) for doc in raw_docs]
+        validated = adapter.validate_python(models, from_attributes=True)
+        return json.dumps(adapter.dump_python(validated, mode="json")).encode()
+
+    def direct_path():
+        return orjson.dumps(projected)
+
+    assert json.loads(model_path()) == json.loads(direct_path())
+
+    results = {}
+    for name, fn in (("model", model_path), ("direct", direct_path)):
+        best = min(timeit.repeat(fn, number=1, repeat=args.repeat))
+        results[name] = best / args.items * 1e6
+        print(f"{name:>6}: {results[name]:8.2f} us/item  ({best * 1e3:.2f} ms per {args.items}-item page)")
+    print(f"speedup: {results['model'] / results['direct']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
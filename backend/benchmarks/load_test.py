@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+"""Concurrent load test of the API routes: throughput and tail latency.
+
+Seeds the running backend with synthetic reports through the batch endpoints
+(so counters, rollups and outbreak counts stay consistent), then drives each
+route with a fixed number of concurrent clients and records req/s and
+p50/p95/p99 latency. With several ``--volumes`` the data set is grown step by
+step and every route is measured again at each size.
+
+    python benchmarks/load_test.py --volumes 1000,10000 --concurrency 32 --output run.json
+    python benchmarks/load_test.py --no-seed --compare run.json --routes 'report-stats,map-*'
+
+Results are written as JSON; ``--compare`` flags routes whose p95 latency or
+throughput regressed by more than ``--tolerance`` against an earlier run and
+exits non-zero if any did. The SSE feed is not measured (it holds its
+connection open), nor are risk profile changes and FAQ creation, which
+rescore every report or rebuild the FAQ indexes.
+"""
+import argparse
+import asyncio
+import fnmatch
+import json
+import random
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, NamedTuple
+
+import httpx
+import numpy as np
+
+SEED_BATCH_SIZE = 500
+SEED_CONCURRENCY = 4
+
+DISTRICTS = [
+    ("Kamrup Metropolitan", 26.14, 91.73), ("Dibrugarh", 27.47, 94.91), ("Imphal West", 24.81, 93.94),
+    ("East Khasi Hills", 25.57, 91.88), ("Aizawl", 23.73, 92.72), ("Kohima", 25.67, 94.11),
+    ("West Tripura", 23.84, 91.28), ("Papum Pare", 27.10, 93.62), ("East Sikkim", 27.33, 88.61),
+]
+WATER_SOURCES = ["borewell", "river", "lake", "pond", "well", "tap", "spring"]
+DISEASES = ["Cholera", "Typhoid", "Hepatitis A", "Diarrhea", "Dysentery"]
+STATUSES = ["submitted", "processed", "under_review", "high_priority"]
+
+
+def _place(rng: random.Random):
+    district, lat, lng = rng.choice(DISTRICTS)
+    return district, lat + rng.uniform(-0.3, 0.3), lng + rng.uniform(-0.3, 0.3)
+
+
+def water_report(rng: random.Random, now: datetime) -> dict:
+    district, lat, lng = _place(rng)
+    return {
+        "location_name": f"Bench site {rng.randrange(10000)}",
+        "district": district,
+        "water_source": rng.choice(WATER_SOURCES),
+        "collection_date": (now - timedelta(days=rng.randrange(90))).isoformat(),
+        "collection_time": "10:30 AM",
+        "collector_name": "Load Test",
+        "collector_id": f"LT{rng.randrange(1000):03d}",
+        "phone_number": "9000000000",
+        "ph_level": round(rng.gauss(7.2, 0.7), 2),
+        "turbidity": round(abs(rng.gauss(2.0, 2.0)), 2),
+        "chlorine": round(abs(rng.gauss(0.4, 0.3)), 2),
+        "e_coli": rng.choice([0, 0, 0, 1, 3]),
+        "total_coliform": rng.choice([0, 0, 2, 5]),
+        "tds": round(abs(rng.gauss(350, 150)), 1),
+        "latitude": lat,
+        "longitude": lng,
+    }
+
+
+def patient_report(rng: random.Random, now: datetime) -> dict:
+    district, lat, lng = _place(rng)
+    return {
+        "patient_name": "Load Test",
+        "age": rng.randrange(1, 90),
+        "gender": rng.choice(["male", "female"]),
+        "location_name": f"Bench village {rng.randrange(10000)}",
+        "district": district,
+        "symptoms": ["diarrhea", "fever"],
+        "suspected_disease": rng.choice(DISEASES),
+        "water_source_used": rng.choice(WATER_SOURCES),
+        "reporter_name": "Load Test",
+        "reporter_phone": "9000000000",
+        "report_date": (now - timedelta(days=rng.randrange(60))).isoformat(),
+        "latitude": lat,
+        "longitude": lng,
+    }
+
+
+async def seed(client: httpx.AsyncClient, endpoint: str, factory: Callable, count: int,
+               rng: random.Random) -> List[str]:
+    """Submit ``count`` synthetic reports through a batch endpoint; returns the created ids."""
+    now = datetime.utcnow()
+    semaphore = asyncio.Semaphore(SEED_CONCURRENCY)
+    ids: List[str] = []
+
+    async def submit(size: int):
+        batch = [factory(rng, now) for _ in range(size)]
+        async with semaphore:
+            response = await client.post(endpoint, json=batch, timeout=120)
+        response.raise_for_status()
+        ids.extend(r["id"] for r in response.json()["results"] if r["status"] == "created")
+
+    full, rest = divmod(count, SEED_BATCH_SIZE)
+    sizes = [SEED_BATCH_SIZE] * full + ([rest] if rest else [])
+    await asyncio.gather(*(submit(size) for size in sizes))
+    return ids
+
+
+class Route(NamedTuple):
+    name: str
+    method: str
+    # Builds (path, query params, json body) for one request
+    build: Callable[[random.Random], tuple]
+
+
+def routes(water_ids: List[str]) -> List[Route]:
+    def get(path, params=None):
+        return lambda rng: (path, params, None)
+
+    now = datetime.utcnow()
+
+    def nearby_params(rng):
+        _, lat, lng = _place(rng)
+        return {"lat": lat, "lng": lng, "radius_km": 5}
+
+    def export_params(rng, export_format):
+        end = (now - timedelta(days=rng.randrange(90))).date()
+        return {"format": export_format, "district": rng.choice(DISTRICTS)[0],
+                "start": (end - timedelta(days=6)).isoformat(), "end": end.isoformat()}
+
+    return [
+        Route("root", "GET", get("/")),
+        Route("districts", "GET", get("/districts")),
+        Route("water-reports", "GET", get("/water-reports", {"limit": 50})),
+        Route("water-reports-ndjson", "GET", get("/water-reports", {"limit": 500, "format": "ndjson"})),
+        Route("water-reports-high-risk", "GET", get("/water-reports/high-risk")),
+        Route("water-report-by-id", "GET", lambda rng: (f"/water-reports/{rng.choice(water_ids)}", None, None)),
+        Route("patient-reports", "GET", get("/patient-reports", {"limit": 50})),
+        Route("report-stats", "GET", get("/report-stats")),
+        Route("recent-activity", "GET", get("/recent-activity")),
+        Route("faqs", "GET", get("/faqs")),
+        Route("faqs-search", "GET", lambda rng: (
+            "/faqs/search", {"q": rng.choice(["water", "boil", "cholera", "symptoms"])}, None)),
+        Route("queries", "GET", get("/queries")),
+        Route("alerts", "GET", get("/alerts")),
+        Route("risk-profile", "GET", get("/risk-profile")),
+        Route("district-trends", "GET", get("/analytics/district-trends")),
+        Route("map-locations", "GET", get("/map-locations")),
+        Route("map-clusters", "GET", get("/map-locations", {
+            "min_lat": 22, "min_lng": 88, "max_lat": 29, "max_lng": 97, "zoom": 6})),
+        Route("map-points", "GET", lambda rng: ("/map-locations", {
+            "min_lat": 26.10, "min_lng": 91.69, "max_lat": 26.18, "max_lng": 91.77, "zoom": 15}, None)),
+        Route("reports-nearby", "GET", lambda rng: ("/reports/nearby", nearby_params(rng), None)),
+        Route("hotspots", "GET", get("/hotspots")),
+        Route("sync", "GET", get("/sync", {"limit": 500})),
+        Route("archive-partitions", "GET", get("/archive/water_reports/partitions")),
+        Route("archive-reports", "GET", get("/archive/water_reports", {"limit": 100})),
+        # One district and week per export, so the response size stays comparable across volumes
+        Route("export-csv", "GET", lambda rng: ("/export/water_reports", export_params(rng, "csv"), None)),
+        Route("export-parquet", "GET", lambda rng: ("/export/water_reports", export_params(rng, "parquet"), None)),
+        Route("create-water-report", "POST", lambda rng: ("/water-reports", None, water_report(rng, now))),
+        Route("create-patient-report", "POST", lambda rng: ("/patient-reports", None, patient_report(rng, now))),
+        Route("create-water-reports-batch", "POST", lambda rng: (
+            "/water-reports/batch", None, [water_report(rng, now) for _ in range(10)])),
+        Route("create-query", "POST", lambda rng: ("/queries", None, {
+            "user_name": "Load Test", "phone_number": "9000000000", "question": "Is it safe to drink tap water?"})),
+        Route("update-status", "PUT", lambda rng: (
+            f"/water-reports/{rng.choice(water_ids)}/status", None, {"status": rng.choice(STATUSES)})),
+    ]
+
+
+async def measure(client: httpx.AsyncClient, route: Route, requests: int, concurrency: int, rng: random.Random) -> dict:
+    latencies = np.zeros(requests)
+    errors = 0
+    next_request = 0
+
+    async def worker():
+        nonlocal errors, next_request
+        while next_request < requests:
+            index = next_request
+            next_request += 1
+            path, params, body = route.build(rng)
+            started = time.perf_counter()
+            try:
+                response = await client.request(route.method, path, params=params, json=body)
+                failed = response.status_code >= 400
+            except httpx.HTTPError:
+                failed = True
+            latencies[index] = time.perf_counter() - started
+            errors += failed
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) * 1e3
+    return {
+        "requests": requests,
+        "errors": errors,
+        "rps": round(requests / elapsed, 1),
+        "p50_ms": round(p50, 2),
+        "p95_ms": round(p95, 2),
+        "p99_ms": round(p99, 2),
+        "max_ms": round(latencies.max() * 1e3, 2),
+    }
+
+
+def compare(current: dict, baseline: dict, tolerance: float) -> List[str]:
+    """Return a line per route whose p95 or throughput regressed beyond ``tolerance``."""
+    regressions = []
+    for volume, results in current["runs"].items():
+        for name, result in results.items():
+            before = baseline.get("runs", {}).get(volume, {}).get(name)
+            if not before:
+                continue
+            if result["p95_ms"] > before["p95_ms"] * (1 + tolerance):
+                regressions.append(f"{volume}/{name}: p95 {before['p95_ms']} -> {result['p95_ms']} ms")
+            if result["rps"] < before["rps"] / (1 + tolerance):
+                regressions.append(f"{volume}/{name}: rps {before['rps']} -> {result['rps']}")
+    return regressions
+
+
+def print_table(volume: str, results: Dict[str, dict]):
+    print(f"\n== {volume} water reports ==")
+    print(f"{'route':<26}{'req/s':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}")
+    for name, r in results.items():
+        print(f"{name:<26}{r['rps']:>9}{r['p50_ms']:>10}{r['p95_ms']:>10}{r['p99_ms']:>10}{r['errors']:>8}")
+
+
+async def run(args) -> dict:
+    rng = random.Random(args.seed)
+    patterns = [p.strip() for p in args.routes.split(",")] if args.routes else ["*"]
+    volumes = [int(v) for v in args.volumes.split(",")] if args.volumes else [0]
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    report = {
+        "started_at": datetime.utcnow().isoformat(),
+        "base_url": args.base_url,
+        "concurrency": args.concurrency,
+        "requests_per_route": args.requests,
+        "runs": {},
+    }
+
+    async with httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=30) as client:
+        water_ids: List[str] = []
+        seeded = 0
+        for volume in volumes:
+            if not args.no_seed and volume > seeded:
+                count = volume - seeded
+                patients = int(count * args.patient_ratio)
+                print(f"seeding {count} water and {patients} patient reports...", file=sys.stderr)
+                water_ids += await seed(client, "/water-reports/batch", water_report, count, rng)
+                await seed(client, "/patient-reports/batch", patient_report, patients, rng)
+                seeded = volume
+            if not water_ids:
+                # Reuse whatever is already there for the by-id and status routes
+                page = (await client.get("/water-reports", params={"limit": 500})).json()
+                water_ids = [r["id"] for r in page] or [str(uuid.uuid4())]
+
+            results = {}
+            for route in routes(water_ids):
+                if not any(fnmatch.fnmatch(route.name, p) for p in patterns):
+                    continue
+                # Warm caches, connections and the FAQ index before timing
+                await measure(client, route, min(args.concurrency, args.requests), args.concurrency, rng)
+                results[route.name] = await measure(client, route, args.requests, args.concurrency, rng)
+            report["runs"][str(volume or "existing")] = results
+            print_table(str(volume or "existing"), results)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--base-url", default="http://localhost:8001/api")
+    parser.add_argument("--volumes", default="1000",
+                        help="comma-separated water report totals to grow the data set to, measuring at each")
+    parser.add_argument("--patient-ratio", type=float, default=0.5, help="patient reports seeded per water report")
+    parser.add_argument("--no-seed", action="store_true", help="measure against the data already in the database")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=500, help="requests per route")
+    parser.add_argument("--routes", help="comma-separated route name patterns, e.g. 'report-stats,map-*'")
+    parser.add_argument("--seed", type=int, default=1, help="random seed for synthetic data")
+    parser.add_argument("--output", help="write results to this JSON file")
+    parser.add_argument("--compare", help="earlier results JSON to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative slowdown before flagging")
+    args = parser.parse_args()
+    if args.no_seed:
+        args.volumes = None
+
+    report = asyncio.run(run(args))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            sys.exit(1)
+        print("no regressions")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""Response compression with brotli or gzip, negotiated from Accept-Encoding.
+
+Bodies sent in one piece are compressed only above ``minimum_size``.
+Streamed bodies (NDJSON pages, CSV exports) are compressed chunk by chunk
+and flushed after each chunk, so clients still receive rows as they are
+produced. Server-sent events and already-compressed formats pass through.
+"""
+import gzip
+import zlib
+from typing import Optional
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+MINIMUM_SIZE = 1024
+BROTLI_QUALITY = 4  # fast enough to run on every dynamic response
+GZIP_LEVEL = 6
+EXCLUDED_MEDIA_TYPES = ("text/event-stream", "application/vnd.apache.parquet")
+
+
+def _accepted(header: str) -> set:
+    accepted = set()
+    for item in header.split(","):
+        coding, _, params = item.strip().partition(";")
+        if params.strip().replace(" ", "") in ("q=0", "q=0.0"):
+            continue
+        accepted.add(coding.strip().lower())
+    return accepted
+
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    accepted = _accepted(accept_encoding)
+    if brotli is not None and "br" in accepted:
+        return "br"
+    if "gzip" in accepted:
+        return "gzip"
+    return None
+
+
+class _Compressor:
+    def __init__(self, encoding: str):
+        if encoding == "br":
+            self._brotli = brotli.Compressor(quality=BROTLI_QUALITY)
+        else:
+            self._zlib = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        self.encoding = encoding
+
+    def chunk(self, data: bytes) -> bytes:
+        """Compress and flush, so everything so far can be decoded by the client."""
+        if self.encoding == "br":
+            return self._brotli.process(data) + self._brotli.flush()
+        return self._zlib.compress(data) + self._zlib.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        if self.encoding == "br":
+            return self._brotli.finish()
+        return self._zlib.flush()
+
+
+def compress(data: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=GZIP_LEVEL)
+
+
+class CompressionMiddleware:
+    def __init__(self, app, minimum_size: int = MINIMUM_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = dict(scope["headers"])
+        encoding = choose_encoding(headers.get(b"accept-encoding", b"").decode("latin-1"))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start = None
+        compressor = None
+        passthrough = False
+
+        async def compressing_send(message):
+            nonlocal start, compressor, passthrough
+            if message["type"] == "http.response.start":
+                response_headers = {k.lower(): v for k, v in message.get("headers", [])}
+                media_type = response_headers.get(b"content-type", b"").decode("latin-1")
+                if (message["status"] in (204, 304) or b"content-encoding" in response_headers
+                        or media_type.startswith(EXCLUDED_MEDIA_TYPES)):
+                    passthrough = True
+                    await send(message)
+                else:
+                    start = message
+                return
+            if passthrough or message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if start is not None:
+                # First body message decides between one-shot and streamed compression
+                response_start, start = start, None
+                headers = [(k, v) for k, v in response_start.get("headers", [])
+                           if k.lower() not in (b"content-length", b"vary")]
+                vary = [v for k, v in response_start.get("headers", []) if k.lower() == b"vary"]
+                headers.append((b"vary", b", ".join(vary + [b"Accept-Encoding"])))
+                if not more_body and len(body) < self.minimum_size:
+                    passthrough = True
+                    headers.append((b"content-length", str(len(body)).encode()))
+                    await send({**response_start, "headers": headers})
+                    await send(message)
+                    return
+                headers.append((b"content-encoding", encoding.encode()))
+                if not more_body:
+                    body = compress(body, encoding)
+                    headers.append((b"content-length", str(len(body)).encode()))
+                    await send({**response_start, "headers": headers})
+                    await send({"type": "http.response.body", "body": body})
+                    return
+                compressor = _Compressor(encoding)
+                await send({**response_start, "headers": headers})
+
+            data = compressor.chunk(body) if body else b""
+            if not more_body:
+                data += compressor.finish()
+            await send({"type": "http.response.body", "body": data, "more_body": more_body})
+
+        await self.app(scope, receive, compressing_send)
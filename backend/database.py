@@ -0,0 +1,114 @@
+"""MongoDB client settings, creation and connection warm-up.
+
+Every knob is read from the environment so deployments can tune the pool
+without code changes; ``launch.py`` divides a total connection budget
+between worker processes through ``MONGO_MAX_POOL_SIZE``. Clients are
+created inside each worker on startup, never at import time, because a
+Motor client must not be shared across a fork.
+"""
+import asyncio
+import logging
+import os
+from typing import NamedTuple, Optional
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReadPreference, WriteConcern
+
+logger = logging.getLogger(__name__)
+
+READ_PREFERENCES = {
+    "primary": ReadPreference.PRIMARY,
+    "primaryPreferred": ReadPreference.PRIMARY_PREFERRED,
+    "secondary": ReadPreference.SECONDARY,
+    "secondaryPreferred": ReadPreference.SECONDARY_PREFERRED,
+    "nearest": ReadPreference.NEAREST,
+}
+
+
+def _env_int(name: str, default: Optional[int]) -> Optional[int]:
+    value = os.environ.get(name)
+    return int(value) if value else default
+
+
+class MongoSettings(NamedTuple):
+    url: str
+    db_name: str
+    max_pool_size: int = 100
+    min_pool_size: int = 10
+    max_idle_time_ms: Optional[int] = 300000
+    connect_timeout_ms: int = 5000
+    server_selection_timeout_ms: int = 5000
+    socket_timeout_ms: Optional[int] = None
+    # How long a request waits for a free pooled connection before failing
+    wait_queue_timeout_ms: Optional[int] = 2000
+    read_preference: str = "primary"
+    # Unset means the server's default write concern
+    write_concern_w: Optional[str] = None
+    write_concern_journal: Optional[bool] = None
+    write_concern_timeout_ms: Optional[int] = None
+
+    @classmethod
+    def from_env(cls) -> "MongoSettings":
+        journal = os.environ.get('MONGO_WRITE_CONCERN_J')
+        settings = cls(
+            url=os.environ['MONGO_URL'],
+            db_name=os.environ['DB_NAME'],
+            max_pool_size=_env_int('MONGO_MAX_POOL_SIZE', 100),
+            min_pool_size=_env_int('MONGO_MIN_POOL_SIZE', 10),
+            max_idle_time_ms=_env_int('MONGO_MAX_IDLE_TIME_MS', 300000),
+            connect_timeout_ms=_env_int('MONGO_CONNECT_TIMEOUT_MS', 5000),
+            server_selection_timeout_ms=_env_int('MONGO_SERVER_SELECTION_TIMEOUT_MS', 5000),
+            socket_timeout_ms=_env_int('MONGO_SOCKET_TIMEOUT_MS', None),
+            wait_queue_timeout_ms=_env_int('MONGO_WAIT_QUEUE_TIMEOUT_MS', 2000),
+            read_preference=os.environ.get('MONGO_READ_PREFERENCE', 'primary'),
+            write_concern_w=os.environ.get('MONGO_WRITE_CONCERN_W') or None,
+            write_concern_journal=journal.lower() == 'true' if journal else None,
+            write_concern_timeout_ms=_env_int('MONGO_WRITE_CONCERN_TIMEOUT_MS', None),
+        )
+        if settings.read_preference not in READ_PREFERENCES:
+            raise ValueError(f"Unknown MONGO_READ_PREFERENCE: {settings.read_preference}")
+        return settings._replace(min_pool_size=min(settings.min_pool_size, settings.max_pool_size))
+
+    def write_concern(self) -> WriteConcern:
+        w = self.write_concern_w
+        if w is not None and w.isdigit():
+            w = int(w)
+        return WriteConcern(w=w, j=self.write_concern_journal, wtimeout=self.write_concern_timeout_ms)
+
+
+def create_client(settings: MongoSettings, event_listeners=()) -> AsyncIOMotorClient:
+    return AsyncIOMotorClient(
+        settings.url,
+        maxPoolSize=settings.max_pool_size,
+        minPoolSize=settings.min_pool_size,
+        maxIdleTimeMS=settings.max_idle_time_ms,
+        connectTimeoutMS=settings.connect_timeout_ms,
+        serverSelectionTimeoutMS=settings.server_selection_timeout_ms,
+        socketTimeoutMS=settings.socket_timeout_ms,
+        waitQueueTimeoutMS=settings.wait_queue_timeout_ms,
+        event_listeners=list(event_listeners),
+    )
+
+
+def get_database(client: AsyncIOMotorClient, settings: MongoSettings):
+    return client.get_database(
+        settings.db_name,
+        read_preference=READ_PREFERENCES[settings.read_preference],
+        write_concern=settings.write_concern(),
+    )
+
+
+async def warm_up(db, connections: int):
+    """Open ``connections`` pooled connections by pinging concurrently, so the first requests don't pay for them."""
+    # Concurrent commands can't share a socket, so each ping checks out its own connection
+    await asyncio.gather(*(db.command("ping") for _ in range(max(1, connections))))
+    logger.info("MongoDB pool warmed up with %d connections", max(1, connections))
+
+
+async def ping(db, timeout: float) -> bool:
+    try:
+        await asyncio.wait_for(db.command("ping"), timeout)
+        return True
+    except Exception as exc:
+        logger.warning("MongoDB ping failed: %s", exc)
+        return False
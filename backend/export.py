@@ -0,0 +1,149 @@
+"""Streaming CSV and Parquet export of report collections.
+
+The cursor is read in large batches; each batch is turned into columns and
+encoded (off the event loop) into one CSV block or one Parquet row group,
+which is sent before the next batch is read. Memory is bounded by the batch
+size however many rows match. Column types come from the report model, so
+every Parquet row group shares one schema even when a batch is all nulls.
+"""
+import asyncio
+import io
+import typing
+from datetime import date, datetime, timedelta
+from enum import Enum
+from typing import AsyncIterator, Dict, List, Optional
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+EXPORT_BATCH_SIZE = 10000
+# Separator for list fields (symptoms, risk flags) in CSV cells
+LIST_SEPARATOR = ";"
+
+MEDIA_TYPES = {"csv": "text/csv", "parquet": "application/vnd.apache.parquet"}
+
+
+def _arrow_type(annotation) -> pa.DataType:
+    origin = typing.get_origin(annotation)
+    if origin is typing.Union:
+        annotation, = [arg for arg in typing.get_args(annotation) if arg is not type(None)]
+        return _arrow_type(annotation)
+    if origin in (list, List):
+        return pa.list_(_arrow_type(typing.get_args(annotation)[0]))
+    if isinstance(annotation, type) and issubclass(annotation, Enum):
+        return pa.string()
+    return {
+        str: pa.string(),
+        int: pa.int64(),
+        float: pa.float64(),
+        bool: pa.bool_(),
+        datetime: pa.timestamp("ms"),
+    }[annotation]
+
+
+def arrow_schema(model) -> pa.Schema:
+    return pa.schema([(name, _arrow_type(field.annotation)) for name, field in model.model_fields.items()])
+
+
+def _columns(docs: List[dict], schema: pa.Schema) -> Dict[str, list]:
+    return {name: [doc.get(name) for doc in docs] for name in schema.names}
+
+
+class CSVEncoder:
+    def __init__(self, schema: pa.Schema):
+        self.schema = schema
+        self.header = True
+
+    def encode(self, docs: List[dict]) -> bytes:
+        columns = _columns(docs, self.schema)
+        for field in self.schema:
+            if pa.types.is_list(field.type):
+                columns[field.name] = [LIST_SEPARATOR.join(map(str, v)) if v else "" for v in columns[field.name]]
+        frame = pd.DataFrame(columns, columns=self.schema.names)
+        block = frame.to_csv(index=False, header=self.header, date_format="%Y-%m-%dT%H:%M:%S")
+        self.header = False
+        return block.encode()
+
+    def close(self) -> bytes:
+        # An empty export still gets its header row
+        return ",".join(self.schema.names).encode() + b"\n" if self.header else b""
+
+
+class _DrainSink(io.RawIOBase):
+    """Append-only sink whose written bytes are handed out and dropped.
+
+    ``tell`` keeps counting everything ever written, since the Parquet
+    footer records absolute offsets of each row group.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.chunks: List[bytes] = []
+        self.position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+class ParquetEncoder:
+    def __init__(self, schema: pa.Schema):
+        self.schema = schema
+        self.sink = _DrainSink()
+        self.writer = pq.ParquetWriter(pa.PythonFile(self.sink, mode="w"), schema, compression="snappy")
+
+    def _drain(self) -> bytes:
+        return self.sink.drain()
+
+    def encode(self, docs: List[dict]) -> bytes:
+        self.writer.write_table(pa.Table.from_pydict(_columns(docs, self.schema), schema=self.schema))
+        return self._drain()
+
+    def close(self) -> bytes:
+        self.writer.close()
+        return self._drain()
+
+
+ENCODERS = {"csv": CSVEncoder, "parquet": ParquetEncoder}
+
+
+def export_filter(date_field: str, start: Optional[date] = None, end: Optional[date] = None,
+                  district: Optional[str] = None) -> dict:
+    query = {}
+    if district:
+        query["district"] = district
+    if start or end:
+        query[date_field] = {}
+        if start:
+            query[date_field]["$gte"] = datetime.combine(start, datetime.min.time())
+        if end:
+            # Inclusive of the whole end day
+            query[date_field]["$lt"] = datetime.combine(end, datetime.min.time()) + timedelta(days=1)
+    return query
+
+
+async def stream_export(cursor, model, format: str, batch_size: int = EXPORT_BATCH_SIZE) -> AsyncIterator[bytes]:
+    """Encode documents from ``cursor`` batch by batch in the requested format."""
+    encoder = ENCODERS[format](arrow_schema(model))
+    batch = []
+    async for doc in cursor.batch_size(batch_size):
+        batch.append(doc)
+        if len(batch) >= batch_size:
+            yield await asyncio.to_thread(encoder.encode, batch)
+            batch = []
+    if batch:
+        yield await asyncio.to_thread(encoder.encode, batch)
+    yield await asyncio.to_thread(encoder.close)
@@ -0,0 +1,147 @@
+"""Automatic answers for user queries that repeat an FAQ.
+
+The FAQs are kept as a TF-IDF matrix, one row per FAQ blending its
+normalised question and answer vectors, rebuilt whenever the FAQs change.
+A batch of questions is vectorised the same way and scored against every
+FAQ with a single matrix product; each query gets its closest FAQ and the
+weighted cosine similarity (0-1) as confidence. At or above
+``FAQ_AUTO_ANSWER_THRESHOLD`` the query is answered with that FAQ; below
+it the match is only attached for whoever answers the query by hand.
+"""
+import math
+import os
+from collections import Counter
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+from pymongo import UpdateOne
+
+import sync
+from faq_search import tokenize
+
+FAQ_AUTO_ANSWER_THRESHOLD = float(os.environ.get('FAQ_AUTO_ANSWER_THRESHOLD', '0.6'))
+PENDING = "pending"
+AUTO_ANSWERED = "auto_answered"
+BACKFILL_CHUNK_SIZE = 1000
+# A query is mostly compared with FAQ questions; answers add the vocabulary questions leave out
+FIELD_SHARES = {"question": 0.7, "answer": 0.3}
+
+
+class Match(NamedTuple):
+    faq: dict
+    confidence: float
+
+
+def _term_weight(tf: float) -> float:
+    # Sublinear, so a word repeated in a long answer doesn't dominate
+    return 1.0 + math.log(tf)
+
+
+class FAQMatcher:
+    def __init__(self):
+        self._faqs: List[dict] = []
+        self._terms: Dict[str, int] = {}
+        self._idf = np.zeros(0)
+        self._unseen_idf = 1.0
+        self._matrix = np.zeros((0, 0))
+
+    def __len__(self):
+        return len(self._faqs)
+
+    def build(self, faqs: List[dict]):
+        fields = {field: [Counter(tokenize(faq.get(field, ""))) for faq in faqs] for field in FIELD_SHARES}
+        terms = {term: column for column, term in
+                 enumerate(sorted(set().union(*(c for counts in fields.values() for c in counts))))}
+
+        n = len(faqs)
+        matrices = {}
+        for field, counts in fields.items():
+            weights = np.zeros((n, len(terms)))
+            for row, counter in enumerate(counts):
+                for term, tf in counter.items():
+                    weights[row, terms[term]] = _term_weight(tf)
+            matrices[field] = weights
+        df = np.count_nonzero(sum(matrices.values()), axis=0)
+        idf = np.log((1 + n) / (1 + df)) + 1
+
+        # Cosine is linear in the normalised rows, so one blended matrix scores every field at once
+        matrix = np.zeros((n, len(terms)))
+        for field, weights in matrices.items():
+            weights *= idf
+            norms = np.linalg.norm(weights, axis=1, keepdims=True)
+            matrix += FIELD_SHARES[field] * weights / np.where(norms > 0, norms, 1)
+        # Swap in the new state in one go so concurrent matches never see a partial index
+        self._terms, self._idf, self._unseen_idf = terms, idf, math.log(1 + n) + 1
+        self._matrix, self._faqs = matrix, list(faqs)
+
+    def _vectors(self, questions: List[str]) -> np.ndarray:
+        vectors = np.zeros((len(questions), len(self._terms)))
+        # Words no FAQ uses still count towards a question's length, so they lower its confidence
+        unseen = np.zeros(len(questions))
+        for row, question in enumerate(questions):
+            for term, tf in Counter(tokenize(question)).items():
+                column = self._terms.get(term)
+                if column is None:
+                    unseen[row] += (_term_weight(tf) * self._unseen_idf) ** 2
+                else:
+                    vectors[row, column] = _term_weight(tf) * self._idf[column]
+        norms = np.sqrt((vectors ** 2).sum(axis=1) + unseen)
+        return vectors / np.where(norms > 0, norms, 1)[:, None]
+
+    def match(self, questions: List[str]) -> List[Optional[Match]]:
+        """Best FAQ for each question, scored in one matrix product; None when nothing overlaps."""
+        if not self._faqs or not questions:
+            return [None] * len(questions)
+        scores = self._vectors(questions) @ self._matrix.T
+        best = scores.argmax(axis=1)
+        confidences = scores[np.arange(len(questions)), best]
+        return [Match(self._faqs[faq], round(float(confidence), 4)) if confidence > 0 else None
+                for faq, confidence in zip(best, confidences)]
+
+
+def answer_fields(match: Optional[Match], threshold: float = FAQ_AUTO_ANSWER_THRESHOLD) -> dict:
+    """Query fields for a match: always the FAQ and confidence, plus the answer above the threshold."""
+    if match is None:
+        return {"faq_id": None, "match_confidence": None}
+    fields = {"faq_id": match.faq["id"], "match_confidence": match.confidence}
+    if match.confidence >= threshold:
+        fields.update(status=AUTO_ANSWERED, response=match.faq["answer"])
+    return fields
+
+
+async def answer_pending(db, matcher: FAQMatcher, threshold: float = FAQ_AUTO_ANSWER_THRESHOLD,
+                         chunk_size: int = BACKFILL_CHUNK_SIZE) -> Tuple[int, int]:
+    """Match every pending query in chunks; returns (queries updated, queries auto-answered)."""
+    projection = {"_id": 0, "id": 1, "question": 1, "faq_id": 1, "match_confidence": 1}
+    cursor = db.queries.find({"status": PENDING}, projection).batch_size(chunk_size)
+    updated = answered = 0
+    chunk = []
+
+    async def flush():
+        nonlocal updated, answered
+        changes = []
+        for query, match in zip(chunk, matcher.match([query["question"] for query in chunk])):
+            fields = answer_fields(match, threshold)
+            if fields.get("status") or (fields["faq_id"], fields["match_confidence"]) != (
+                    query.get("faq_id"), query.get("match_confidence")):
+                changes.append((query["id"], fields))
+        chunk.clear()
+        if not changes:
+            return
+        first_seq, stamped_at = await sync.reserve(db, len(changes))
+        await db.queries.bulk_write([
+            # Still pending: a human may have answered it since it was read
+            UpdateOne({"id": query_id, "status": PENDING},
+                      {"$set": {**fields, sync.SEQ_FIELD: first_seq + offset, sync.AT_FIELD: stamped_at}})
+            for offset, (query_id, fields) in enumerate(changes)
+        ], ordered=False)
+        updated += len(changes)
+        answered += sum(1 for _, fields in changes if fields.get("status") == AUTO_ANSWERED)
+
+    async for query in cursor:
+        chunk.append(query)
+        if len(chunk) >= chunk_size:
+            await flush()
+    if chunk:
+        await flush()
+    return updated, answered
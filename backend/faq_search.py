@@ -0,0 +1,87 @@
+"""In-process inverted index over FAQ questions and answers.
+
+The FAQ collection is tiny, so it is loaded once and searched in memory with
+BM25-style scoring; no user input ever reaches the database as a pattern.
+"""
+import math
+import re
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from typing import Dict, List
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset(
+    "a an and are as at be by can do does for from how i if in is it my of on or "
+    "should the to what when where which who why will with you your".split()
+)
+# Matches in the question count more than matches in the answer
+FIELD_WEIGHTS = {"question": 2.0, "answer": 1.0}
+K1 = 1.2
+B = 0.75
+# Query terms shorter than this are not expanded as prefixes
+MIN_PREFIX_LEN = 3
+MAX_PREFIX_EXPANSIONS = 20
+
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in TOKEN_RE.findall(text.lower()) if t not in STOPWORDS]
+
+
+class FAQSearchIndex:
+    def __init__(self):
+        self._faqs: List[dict] = []
+        self._postings: Dict[str, Dict[int, float]] = {}
+        self._idf: Dict[str, float] = {}
+        self._vocabulary: List[str] = []
+
+    def __len__(self):
+        return len(self._faqs)
+
+    def build(self, faqs: List[dict]):
+        postings = defaultdict(dict)
+        lengths = []
+        term_freqs = []
+        for faq in faqs:
+            weighted = Counter()
+            for field, weight in FIELD_WEIGHTS.items():
+                for token in tokenize(faq.get(field, "")):
+                    weighted[token] += weight
+            term_freqs.append(weighted)
+            lengths.append(sum(weighted.values()))
+
+        avg_len = (sum(lengths) / len(lengths)) if lengths else 0.0
+        for doc, weighted in enumerate(term_freqs):
+            norm = K1 * (1 - B + B * lengths[doc] / avg_len) if avg_len else K1
+            for token, tf in weighted.items():
+                postings[token][doc] = tf * (K1 + 1) / (tf + norm)
+
+        n = len(faqs)
+        # Swap in the new state in one go so concurrent searches never see a partial index
+        self._idf = {t: math.log(1 + (n - len(docs) + 0.5) / (len(docs) + 0.5)) for t, docs in postings.items()}
+        self._postings = dict(postings)
+        self._vocabulary = sorted(postings)
+        self._faqs = list(faqs)
+
+    def _expand(self, token: str) -> List[str]:
+        if token in self._postings:
+            return [token]
+        if len(token) < MIN_PREFIX_LEN:
+            return []
+        # Partial words ("contam") match every indexed term they prefix
+        start = bisect_left(self._vocabulary, token)
+        matches = []
+        for term in self._vocabulary[start:start + MAX_PREFIX_EXPANSIONS]:
+            if not term.startswith(token):
+                break
+            matches.append(term)
+        return matches
+
+    def search(self, query: str, limit: int = 50) -> List[dict]:
+        scores: Dict[int, float] = defaultdict(float)
+        for token in set(tokenize(query)):
+            for term in self._expand(token):
+                idf = self._idf[term]
+                for doc, weight in self._postings[term].items():
+                    scores[doc] += idf * weight
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:limit]
+        return [self._faqs[doc] for doc, _ in ranked]
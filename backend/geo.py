@@ -0,0 +1,62 @@
+"""GeoJSON report locations and nearby-report search.
+
+Reports keep their ``latitude``/``longitude`` fields for the API, and also
+store them as a GeoJSON point in ``location`` for the 2dsphere index.
+Coordinates out of range are left without a location rather than rejected,
+since the index would refuse the insert.
+"""
+from typing import Dict, List, Optional
+
+LOCATION_FIELD = "location"
+MAX_RADIUS_KM = 50.0
+MAX_NEARBY_RESULTS = 500
+
+
+def point(latitude: Optional[float], longitude: Optional[float]) -> Optional[dict]:
+    if latitude is None or longitude is None:
+        return None
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        return None
+    return {"type": "Point", "coordinates": [longitude, latitude]}
+
+
+def with_location(document: dict) -> dict:
+    location = point(document.get("latitude"), document.get("longitude"))
+    if location:
+        document[LOCATION_FIELD] = location
+    return document
+
+
+async def migrate_locations(db, collections) -> Dict[str, int]:
+    """Add ``location`` to existing reports that have valid coordinates; returns documents updated per collection."""
+    updated = {}
+    for collection in collections:
+        result = await db[collection].update_many(
+            {
+                LOCATION_FIELD: {"$exists": False},
+                "latitude": {"$type": "number", "$gte": -90, "$lte": 90},
+                "longitude": {"$type": "number", "$gte": -180, "$lte": 180},
+            },
+            # Pipeline update, so the point is built server-side from each document's own fields
+            [{"$set": {LOCATION_FIELD: {"type": "Point", "coordinates": ["$longitude", "$latitude"]}}}],
+        )
+        updated[collection] = result.modified_count
+    return updated
+
+
+async def nearby(db, collection: str, latitude: float, longitude: float, radius_km: float,
+                 query: dict, projection: dict, limit: int) -> List[dict]:
+    """Reports within ``radius_km`` matching ``query``, nearest first, with ``distance_m``."""
+    pipeline = [
+        {"$geoNear": {
+            "near": {"type": "Point", "coordinates": [longitude, latitude]},
+            "key": LOCATION_FIELD,
+            "distanceField": "distance_m",
+            "maxDistance": radius_km * 1000,
+            "query": query,
+            "spherical": True,
+        }},
+        {"$limit": limit},
+        {"$project": {**projection, "distance_m": 1}},
+    ]
+    return await db[collection].aggregate(pipeline).to_list(length=limit)
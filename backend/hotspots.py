@@ -0,0 +1,211 @@
+"""Spatial hotspots of illness and contaminated-water reports.
+
+Geotagged patient reports and failing water reports (risk score at or above
+the review threshold) from the last ``HOTSPOT_WINDOW_DAYS`` are bucketed
+into a grid of ``HOTSPOT_CELL_KM`` cells. A cell is dense when it and its
+eight neighbours hold at least ``HOTSPOT_MIN_REPORTS`` reports, and a
+hotspot is a connected group of dense cells. Each step only looks at a
+cell's neighbours, so clustering is linear in the number of occupied cells
+instead of comparing every pair of reports.
+
+Each worker keeps its own index: reports it stores are added as they
+arrive, and the whole window is reloaded from MongoDB when the day rolls
+over or after ``HOTSPOT_REFRESH_SECONDS``, which picks up other workers'
+reports, rescoring and expired days. Hotspots are recomputed only after
+the index changed.
+"""
+import asyncio
+import logging
+import math
+import os
+import time
+from collections import Counter, deque
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+import water_risk
+
+logger = logging.getLogger(__name__)
+
+HOTSPOT_WINDOW_DAYS = int(os.environ.get('HOTSPOT_WINDOW_DAYS', '14'))
+HOTSPOT_CELL_KM = float(os.environ.get('HOTSPOT_CELL_KM', '1.0'))
+HOTSPOT_MIN_REPORTS = int(os.environ.get('HOTSPOT_MIN_REPORTS', '5'))
+HOTSPOT_REFRESH_SECONDS = float(os.environ.get('HOTSPOT_REFRESH_SECONDS', '60'))
+
+KM_PER_DEGREE = 111.32
+TOP_LABELS = 3
+# Most hotspots one response lists
+MAX_HOTSPOTS = 500
+
+# collection -> (point type, date field, label field, extra filter)
+SOURCES = {
+    "patient_reports": ("patient_report", "report_date", "suspected_disease", {}),
+    "water_reports": ("water_report", "collection_date", "water_source",
+                      {"risk_score": {"$gte": water_risk.REVIEW_SCORE}}),
+}
+
+Cell = Tuple[int, int]
+NEIGHBOURS = [(dx, dy) for dx in (-1, 0, 1) for dy in (-1, 0, 1)]
+
+
+class Point(NamedTuple):
+    id: str
+    type: str
+    latitude: float
+    longitude: float
+    day: date
+    label: str
+
+
+def _day(value) -> Optional[date]:
+    if isinstance(value, datetime):
+        return value.date()
+    return value if isinstance(value, date) else None
+
+
+def to_point(collection: str, document: dict) -> Optional[Point]:
+    """The hotspot point for a stored report, or None if it doesn't qualify."""
+    point_type, date_field, label_field, _ = SOURCES[collection]
+    latitude, longitude = document.get("latitude"), document.get("longitude")
+    day = _day(document.get(date_field))
+    if latitude is None or longitude is None or day is None:
+        return None
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        return None
+    if collection == "water_reports" and (document.get("risk_score") or 0) < water_risk.REVIEW_SCORE:
+        return None
+    label = document.get(label_field) or ""
+    # Freshly validated reports still hold enum members
+    label = " ".join(str(getattr(label, "value", label)).split()).lower()
+    return Point(document["id"], point_type, latitude, longitude, day, label)
+
+
+class HotspotIndex:
+    def __init__(self, window_days: int = HOTSPOT_WINDOW_DAYS, cell_km: float = HOTSPOT_CELL_KM,
+                 min_reports: int = HOTSPOT_MIN_REPORTS, refresh_seconds: float = HOTSPOT_REFRESH_SECONDS):
+        self.window_days = window_days
+        self.cell_km = cell_km
+        # Uniform degree cells; east-west they narrow with latitude (about 15% at 30 degrees)
+        self.cell_degrees = cell_km / KM_PER_DEGREE
+        self.min_reports = min_reports
+        self.refresh_seconds = refresh_seconds
+        self.today: Optional[date] = None
+        self.loaded_at = 0.0
+        self.cells: Dict[Cell, Dict[str, Point]] = {}
+        self._version = 0
+        self._computed: Optional[Tuple[int, List[dict]]] = None
+        self._lock = asyncio.Lock()
+
+    def __len__(self):
+        return sum(len(points) for points in self.cells.values())
+
+    def cell(self, latitude: float, longitude: float) -> Cell:
+        return math.floor(longitude / self.cell_degrees), math.floor(latitude / self.cell_degrees)
+
+    def _in_window(self, day: date) -> bool:
+        return 0 <= (self.today - day).days < self.window_days
+
+    def add(self, point: Point) -> bool:
+        if self.today is None or not self._in_window(point.day):
+            return False
+        self.cells.setdefault(self.cell(point.latitude, point.longitude), {})[point.id] = point
+        self._version += 1
+        return True
+
+    def add_reports(self, collection: str, documents: Iterable[dict]) -> int:
+        """Add newly stored reports; a no-op until the index has been loaded."""
+        added = 0
+        for document in documents:
+            point = to_point(collection, document)
+            if point is not None and self.add(point):
+                added += 1
+        return added
+
+    async def load(self, db, today: date):
+        """Rebuild the index from the reports of the window ending at ``today``."""
+        start = datetime.combine(today - timedelta(days=self.window_days - 1), datetime.min.time())
+        cells: Dict[Cell, Dict[str, Point]] = {}
+        for collection, (_, date_field, label_field, extra) in SOURCES.items():
+            query = {date_field: {"$gte": start}, "latitude": {"$ne": None}, "longitude": {"$ne": None}, **extra}
+            projection = {"_id": 0, "id": 1, "latitude": 1, "longitude": 1, date_field: 1, label_field: 1,
+                          "risk_score": 1}
+            async for document in db[collection].find(query, projection):
+                point = to_point(collection, document)
+                if point is not None and 0 <= (today - point.day).days < self.window_days:
+                    cells.setdefault(self.cell(point.latitude, point.longitude), {})[point.id] = point
+        self.today, self.cells = today, cells
+        self.loaded_at = time.monotonic()
+        self._version += 1
+
+    async def refresh(self, db):
+        """Reload when the day rolled over or the index is older than ``refresh_seconds``."""
+        today = datetime.utcnow().date()
+        if self.today == today and time.monotonic() - self.loaded_at < self.refresh_seconds:
+            return
+        async with self._lock:
+            # Another request may have reloaded while this one waited
+            if self.today != today or time.monotonic() - self.loaded_at >= self.refresh_seconds:
+                await self.load(db, today)
+
+    def _dense_cells(self) -> set:
+        dense = set()
+        for (x, y) in self.cells:
+            nearby = sum(len(self.cells.get((x + dx, y + dy), ())) for dx, dy in NEIGHBOURS)
+            if nearby >= self.min_reports:
+                dense.add((x, y))
+        return dense
+
+    def _components(self, dense: set) -> List[List[Cell]]:
+        seen, components = set(), []
+        for start in dense:
+            if start in seen:
+                continue
+            seen.add(start)
+            component, queue = [], deque([start])
+            while queue:
+                x, y = queue.popleft()
+                component.append((x, y))
+                for dx, dy in NEIGHBOURS:
+                    neighbour = (x + dx, y + dy)
+                    if neighbour in dense and neighbour not in seen:
+                        seen.add(neighbour)
+                        queue.append(neighbour)
+            components.append(component)
+        return components
+
+    def _hotspot(self, component: List[Cell]) -> dict:
+        points = [point for cell in component for point in self.cells[cell].values()]
+        types = Counter(point.type for point in points)
+        labels = {point_type: Counter() for point_type, *_ in SOURCES.values()}
+        for point in points:
+            if point.label:
+                labels[point.type][point.label] += 1
+        x, y = min(component)
+        return {
+            "id": f"{x}:{y}",
+            "latitude": round(sum(point.latitude for point in points) / len(points), 6),
+            "longitude": round(sum(point.longitude for point in points) / len(points), 6),
+            "min_lat": min(point.latitude for point in points),
+            "min_lng": min(point.longitude for point in points),
+            "max_lat": max(point.latitude for point in points),
+            "max_lng": max(point.longitude for point in points),
+            "cells": len(component),
+            "count": len(points),
+            "patient_reports": types["patient_report"],
+            "water_reports": types["water_report"],
+            # Illness and contaminated water clustering in the same place
+            "co_located": bool(types["patient_report"] and types["water_report"]),
+            "suspected_diseases": dict(labels["patient_report"].most_common(TOP_LABELS)),
+            "water_sources": dict(labels["water_report"].most_common(TOP_LABELS)),
+            "first_day": min(point.day for point in points).isoformat(),
+            "last_day": max(point.day for point in points).isoformat(),
+        }
+
+    def hotspots(self) -> List[dict]:
+        """Hotspots ordered co-located first, then by size; cached until the index changes."""
+        if self._computed is not None and self._computed[0] == self._version:
+            return self._computed[1]
+        found = [self._hotspot(component) for component in self._components(self._dense_cells())]
+        found.sort(key=lambda h: (h["co_located"], h["count"]), reverse=True)
+        self._computed = (self._version, found)
+        return found
@@ -0,0 +1,94 @@
+"""Conditional responses: ETags, Cache-Control and 304 Not Modified.
+
+Static payloads get an ETag hashed from their bytes once at import time.
+Collection-backed payloads get an ETag built from per-collection version
+tokens, which writers rotate with ``bump_versions``; checking it costs one
+small read, so an unchanged resource is answered with a 304 without
+recomputing it.
+"""
+import hashlib
+import uuid
+from typing import Iterable, Optional
+
+import orjson
+from fastapi import Request, Response
+
+VERSIONS_COLLECTION = "collection_versions"
+
+# Cache-Control policies
+STATIC = "public, max-age=86400"
+# Clients keep a copy but must revalidate, which is a cheap 304 when unchanged
+REVALIDATE = "no-cache"
+
+
+def content_etag(body: bytes) -> str:
+    # Weak, since the same representation may be sent gzip-encoded or not
+    return f'W/"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+
+
+def _opaque(tag: str) -> str:
+    return tag[2:] if tag.startswith("W/") else tag
+
+
+def is_fresh(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    return _opaque(etag) in {_opaque(tag.strip()) for tag in header.split(",")}
+
+
+def cache_headers(etag: str, cache_control: str) -> dict:
+    return {"ETag": etag, "Cache-Control": cache_control}
+
+
+def not_modified(etag: str, cache_control: str) -> Response:
+    return Response(status_code=304, headers=cache_headers(etag, cache_control))
+
+
+def json_response(request: Request, content, cache_control: str, etag: Optional[str] = None) -> Response:
+    """Serialize ``content`` and answer 304 if it matches the client's copy."""
+    body = content if isinstance(content, bytes) else orjson.dumps(content)
+    etag = etag or content_etag(body)
+    if is_fresh(request, etag):
+        return not_modified(etag, cache_control)
+    return Response(content=body, media_type="application/json", headers=cache_headers(etag, cache_control))
+
+
+class StaticPayload:
+    """A JSON payload serialized and hashed once."""
+
+    def __init__(self, content, cache_control: str = STATIC):
+        self.body = orjson.dumps(content)
+        self.etag = content_etag(self.body)
+        self.cache_control = cache_control
+
+    def respond(self, request: Request) -> Response:
+        return json_response(request, self.body, self.cache_control, etag=self.etag)
+
+
+async def bump_versions(db, *collections: str):
+    """Mark collections as changed; every ETag derived from them is invalidated."""
+    for collection in collections:
+        await db[VERSIONS_COLLECTION].update_one(
+            {"_id": collection}, {"$set": {"token": uuid.uuid4().hex}}, upsert=True
+        )
+
+
+async def version_etag(db, name: str, collections: Iterable[str]) -> str:
+    collections = list(collections)
+    docs = await db[VERSIONS_COLLECTION].find({"_id": {"$in": collections}}).to_list(length=len(collections))
+    tokens = {doc["_id"]: doc["token"] for doc in docs}
+    for collection in collections:
+        if collection not in tokens:
+            # Random tokens rather than counters, so a wiped database never
+            # reproduces an ETag a client cached before the wipe
+            token = uuid.uuid4().hex
+            await db[VERSIONS_COLLECTION].update_one(
+                {"_id": collection}, {"$setOnInsert": {"token": token}}, upsert=True
+            )
+            doc = await db[VERSIONS_COLLECTION].find_one({"_id": collection})
+            tokens[collection] = doc["token"]
+    digest = hashlib.blake2b("|".join(tokens[c] for c in collections).encode(), digest_size=12).hexdigest()
+    return f'W/"{name}-{digest}"'
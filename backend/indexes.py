@@ -0,0 +1,139 @@
+"""Declarative index definitions, created at startup and verified with explain."""
+import logging
+from typing import Dict, List
+
+from pymongo import ASCENDING, DESCENDING, GEOSPHERE, IndexModel
+from pymongo.errors import OperationFailure
+
+import sync
+
+logger = logging.getLogger(__name__)
+
+
+def _report_indexes() -> List[IndexModel]:
+    return [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        # Serves the newest-first listings and keyset pagination
+        IndexModel([("created_at", DESCENDING), ("id", DESCENDING)], name="created_at_id"),
+        IndexModel([("status", ASCENDING)], name="status"),
+        IndexModel([("district", ASCENDING), ("created_at", DESCENDING)], name="district_created_at"),
+        IndexModel([("latitude", ASCENDING), ("longitude", ASCENDING)], name="coordinates"),
+        # Nearby search ($geoNear); reports without valid coordinates have no location and are skipped
+        IndexModel([("location", GEOSPHERE)], name="location_2dsphere"),
+        IndexModel([("sync_seq", ASCENDING)], name="sync_seq"),
+    ]
+
+
+INDEXES: Dict[str, List[IndexModel]] = {
+    "water_reports": _report_indexes() + [
+        IndexModel([("risk_score", DESCENDING), ("created_at", DESCENDING)], name="risk_score"),
+        # Hotspot window reload
+        IndexModel([("collection_date", DESCENDING)], name="collection_date"),
+    ],
+    "patient_reports": _report_indexes() + [
+        # Outbreak escalation looks up a district's reports for one day
+        IndexModel([("district", ASCENDING), ("report_date", DESCENDING)], name="district_report_date"),
+        IndexModel([("report_date", DESCENDING)], name="report_date"),
+    ],
+    "queries": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("created_at", DESCENDING), ("id", DESCENDING)], name="created_at_id"),
+        IndexModel([("sync_seq", ASCENDING)], name="sync_seq"),
+    ],
+    "faqs": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        # The startup seed upserts on question; unique so concurrent workers can't both insert one
+        IndexModel([("question", ASCENDING)], name="question_unique", unique=True),
+        IndexModel([("sync_seq", ASCENDING)], name="sync_seq"),
+    ],
+    "sync_tombstones": [
+        IndexModel([("sync_seq", ASCENDING)], name="sync_seq"),
+        # Tokens older than this lifetime get a full resync
+        IndexModel([("sync_at", ASCENDING)], name="sync_at_ttl", expireAfterSeconds=sync.SYNC_TOMBSTONE_DAYS * 86400),
+    ],
+    "daily_case_counts": [
+        IndexModel([("day", ASCENDING)], name="day"),
+    ],
+    "alerts": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("day", DESCENDING), ("cases", DESCENDING)], name="day_cases"),
+        IndexModel([("district", ASCENDING), ("day", DESCENDING)], name="district_day"),
+    ],
+    "district_daily_rollups": [
+        IndexModel([("collection", ASCENDING), ("district", ASCENDING), ("day", ASCENDING)],
+                   name="collection_district_day"),
+        IndexModel([("collection", ASCENDING), ("day", ASCENDING)], name="collection_day"),
+    ],
+}
+
+# Queries issued by the API that must be served by an index: name -> (collection, filter, sort)
+QUERY_PLANS = {
+    "water_reports.latest": ("water_reports", {}, [("created_at", -1), ("id", -1)]),
+    "water_reports.by_id": ("water_reports", {"id": ""}, None),
+    "water_reports.by_status": ("water_reports", {"status": "submitted"}, None),
+    "water_reports.by_district": ("water_reports", {"district": ""}, [("created_at", -1)]),
+    "water_reports.high_risk": (
+        "water_reports", {"risk_score": {"$gte": 30}}, [("risk_score", -1), ("created_at", -1)]),
+    "water_reports.hotspot_window": ("water_reports", {"collection_date": {"$gte": ""}}, None),
+    "patient_reports.hotspot_window": ("patient_reports", {"report_date": {"$gte": ""}}, None),
+    "patient_reports.latest": ("patient_reports", {}, [("created_at", -1), ("id", -1)]),
+    "patient_reports.by_status": ("patient_reports", {"status": "submitted"}, None),
+    "patient_reports.by_district": ("patient_reports", {"district": ""}, [("created_at", -1)]),
+    "water_reports.sync": ("water_reports", {"sync_seq": {"$gt": 0}}, [("sync_seq", 1)]),
+    "patient_reports.sync": ("patient_reports", {"sync_seq": {"$gt": 0}}, [("sync_seq", 1)]),
+    "queries.sync": ("queries", {"sync_seq": {"$gt": 0}}, [("sync_seq", 1)]),
+    "faqs.by_question": ("faqs", {"question": ""}, None),
+    "faqs.sync": ("faqs", {"sync_seq": {"$gt": 0}}, [("sync_seq", 1)]),
+    "queries.latest": ("queries", {}, [("created_at", -1), ("id", -1)]),
+    "district_daily_rollups.trends": (
+        "district_daily_rollups", {"collection": "water_reports", "day": {"$gte": ""}}, None),
+    "district_daily_rollups.district_trends": (
+        "district_daily_rollups", {"collection": "water_reports", "district": "", "day": {"$gte": ""}}, None),
+}
+
+
+async def ensure_indexes(db) -> Dict[str, List[str]]:
+    """Create every declared index that does not exist yet; returns the names built."""
+    built = {}
+    for collection, models in INDEXES.items():
+        existing = await db[collection].index_information()
+        existing_keys = {tuple(info["key"]) for info in existing.values()}
+        missing = [
+            model for model in models
+            if model.document["name"] not in existing
+            and tuple(model.document["key"].items()) not in existing_keys
+        ]
+        if not missing:
+            continue
+        try:
+            names = await db[collection].create_indexes(missing)
+        except OperationFailure as exc:
+            logger.error("Failed to build indexes on %s: %s", collection, exc)
+            continue
+        built[collection] = names
+        logger.info("Built indexes on %s: %s", collection, ", ".join(names))
+    return built
+
+
+def _plan_stages(plan: dict):
+    yield plan.get("stage")
+    for key in ("inputStage", "queryPlan"):
+        if key in plan:
+            yield from _plan_stages(plan[key])
+    for child in plan.get("inputStages", []):
+        yield from _plan_stages(child)
+
+
+async def verify_query_plans(db) -> List[str]:
+    """Explain every registered query and return the names still planned as COLLSCAN."""
+    collscans = []
+    for name, (collection, query_filter, sort) in QUERY_PLANS.items():
+        command = {"find": collection, "filter": query_filter}
+        if sort:
+            command["sort"] = dict(sort)
+        explained = await db.command({"explain": command, "verbosity": "queryPlanner"})
+        winning_plan = explained["queryPlanner"]["winningPlan"]
+        if "COLLSCAN" in _plan_stages(winning_plan):
+            collscans.append(name)
+            logger.warning("Query %s is not served by an index (COLLSCAN)", name)
+    return collscans
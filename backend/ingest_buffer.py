@@ -0,0 +1,172 @@
+"""Write-behind group commit for single report submissions.
+
+With group commit enabled, submitted reports wait on a per-collection
+in-process queue and a background task stores them with one bulk insert
+once ``INGEST_BATCH_SIZE`` reports are waiting or ``INGEST_FLUSH_MS`` has
+passed since the first one, so a surge of submissions costs a few round
+trips instead of one each.
+
+``INGEST_ACK`` chooses when a submission is acknowledged:
+
+- ``flush`` (default): after its batch is stored, so the caller sees
+  triage, escalation and write errors exactly as with a direct insert.
+- ``immediate``: as soon as it is queued. Faster, but reports still queued
+  when the process dies are lost, and write errors are only logged.
+
+The queue holds at most ``INGEST_MAX_PENDING`` reports per collection;
+beyond that, submissions wait for room. On shutdown the buffer stops
+accepting reports and flushes everything already queued.
+"""
+import asyncio
+import logging
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+INGEST_BATCH_SIZE = int(os.environ.get('INGEST_BATCH_SIZE', '500'))
+INGEST_FLUSH_MS = float(os.environ.get('INGEST_FLUSH_MS', '50'))
+INGEST_MAX_PENDING = int(os.environ.get('INGEST_MAX_PENDING', '20000'))
+INGEST_ACK = os.environ.get('INGEST_ACK', 'flush')
+
+ACK_FLUSH = "flush"
+ACK_IMMEDIATE = "immediate"
+
+_STOP = object()
+
+Pending = Tuple[Any, Optional[asyncio.Future]]
+
+
+class BufferClosed(RuntimeError):
+    pass
+
+
+class WriteBehindBuffer:
+    def __init__(self, flush: Callable[[str, list], Awaitable[List[Tuple[Optional[dict], Any]]]],
+                 batch_size: int = INGEST_BATCH_SIZE, flush_interval: float = INGEST_FLUSH_MS / 1000,
+                 max_pending: int = INGEST_MAX_PENDING, ack: str = INGEST_ACK):
+        """``flush(collection, reports)`` stores a batch.
+
+        It returns one ``(write error or None, result)`` per report.
+        """
+        if ack not in (ACK_FLUSH, ACK_IMMEDIATE):
+            raise ValueError(f"Unknown INGEST_ACK: {ack}")
+        self.flush = flush
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.ack = ack
+        self._queues: Dict[str, asyncio.Queue] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._closing = False
+        # Submissions past the running check that may still be waiting for queue room
+        self._putting = 0
+        self._puts_done = asyncio.Event()
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks) and not self._closing
+
+    def start(self, collections: Iterable[str]):
+        self._closing = False
+        for collection in collections:
+            self._queues[collection] = asyncio.Queue(maxsize=self.max_pending)
+            self._tasks[collection] = asyncio.create_task(self._run(collection))
+        logger.info("Group commit ingestion started (batch %d, %.0f ms, ack on %s)",
+                    self.batch_size, self.flush_interval * 1000, self.ack)
+
+    async def submit(self, collection: str, report):
+        """Queue a report; returns its flush outcome, or None when acknowledged immediately."""
+        if not self.running:
+            raise BufferClosed("ingestion buffer is not accepting reports")
+        queue = self._queues[collection]
+        future = asyncio.get_running_loop().create_future() if self.ack == ACK_FLUSH else None
+        self._putting += 1
+        try:
+            await queue.put((report, future))
+        finally:
+            self._putting -= 1
+            if not self._putting:
+                self._puts_done.set()
+        metrics.INGEST_QUEUE_DEPTH.labels(collection).set(queue.qsize())
+        if future is None:
+            return None
+        # A disconnecting client must not cancel the outcome other code may still read
+        return await asyncio.shield(future)
+
+    async def close(self):
+        """Stop accepting reports and flush everything already queued."""
+        if not self._tasks:
+            return
+        self._closing = True
+        # A submission blocked on a full queue must land ahead of the stop marker, or it is never flushed
+        if self._putting:
+            self._puts_done.clear()
+            await self._puts_done.wait()
+        for queue in self._queues.values():
+            await queue.put(_STOP)
+        await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+        self._tasks.clear()
+        logger.info("Group commit ingestion stopped")
+
+    async def _next_batch(self, queue: asyncio.Queue) -> Tuple[List[Pending], bool]:
+        """Wait for a report, then collect more until the batch is full or the interval has passed."""
+        first = await queue.get()
+        if first is _STOP:
+            return [], True
+        batch = [first]
+        deadline = asyncio.get_running_loop().time() + self.flush_interval
+        while len(batch) < self.batch_size:
+            if queue.empty():
+                timeout = deadline - asyncio.get_running_loop().time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+            else:
+                item = queue.get_nowait()
+            if item is _STOP:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    async def _run(self, collection: str):
+        queue = self._queues[collection]
+        stopping = False
+        while not stopping:
+            batch, stopping = await self._next_batch(queue)
+            metrics.INGEST_QUEUE_DEPTH.labels(collection).set(queue.qsize())
+            if batch:
+                await self._flush(collection, batch)
+
+    async def _flush(self, collection: str, batch: List[Pending]):
+        started = time.perf_counter()
+        try:
+            outcomes = await self.flush(collection, [report for report, _ in batch])
+        except Exception as exc:
+            metrics.INGEST_FLUSH_FAILURES.labels(collection).inc()
+            logger.exception("Group commit of %d %s failed", len(batch), collection)
+            if self.ack == ACK_IMMEDIATE:
+                logger.error("Acknowledged reports lost: %s", ", ".join(str(report.id) for report, _ in batch))
+            for _, future in batch:
+                if future is not None and not future.done():
+                    future.set_exception(exc)
+                    # Retrieved here so a future whose requester went away doesn't warn
+                    future.exception()
+            return
+        finally:
+            metrics.INGEST_FLUSH_DURATION.labels(collection).observe(time.perf_counter() - started)
+            metrics.INGEST_BATCH_SIZE.labels(collection).observe(len(batch))
+
+        for (report, future), outcome in zip(batch, outcomes):
+            if future is not None:
+                if not future.done():
+                    future.set_result(outcome)
+            elif outcome[0] is not None:
+                logger.error("Acknowledged %s report %s was not stored: %s",
+                             collection, report.id, outcome[0].get("errmsg"))
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""Run the API with several worker processes.
+
+Each worker builds its own app through ``server:create_app`` and opens its
+own MongoDB pool on startup, so the pool budget is split between workers:
+
+    python launch.py --workers 4 --pool-budget 200   # 4 workers x maxPoolSize 50
+
+Keep ``--pool-budget`` (or ``MONGO_POOL_BUDGET``) below what the MongoDB
+deployment accepts from this host, minus the maintenance commands' needs.
+``MONGO_MIN_POOL_SIZE`` connections per worker are opened before the worker
+reports ready on ``/api/health/ready``; ``/api/health/live`` only checks the
+worker's event loop. The other ``MONGO_*`` settings (timeouts, read
+preference, write concern) are read by ``database.MongoSettings`` in every
+worker.
+
+With more than one worker, metrics are collected per process into
+``PROMETHEUS_MULTIPROC_DIR`` (a fresh temporary directory unless set) and
+merged by ``/api/metrics``. Each worker also runs its own live-feed change
+stream and keeps its own caches and group-commit queue; shared state
+(counters, rollups, outbreak counts, cache versions) lives in MongoDB.
+"""
+import argparse
+import logging
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+import uvicorn
+from dotenv import load_dotenv
+
+ROOT_DIR = Path(__file__).parent
+load_dotenv(ROOT_DIR / '.env')
+
+logger = logging.getLogger(__name__)
+
+MIN_POOL_PER_WORKER = 5
+
+
+def pool_per_worker(budget: int, workers: int) -> int:
+    return max(MIN_POOL_PER_WORKER, budget // workers)
+
+
+def prepare_metrics_dir(workers: int):
+    directory = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+    if workers == 1 and not directory:
+        return
+    if not directory:
+        directory = tempfile.mkdtemp(prefix="jal-metrics-")
+        os.environ['PROMETHEUS_MULTIPROC_DIR'] = directory
+    # Samples left by an earlier run would be merged into this one
+    shutil.rmtree(directory, ignore_errors=True)
+    os.makedirs(directory)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default=os.environ.get('HOST', '0.0.0.0'))
+    parser.add_argument("--port", type=int, default=int(os.environ.get('PORT', '8001')))
+    parser.add_argument("--workers", type=int, default=int(os.environ.get('WEB_CONCURRENCY', os.cpu_count() or 1)))
+    parser.add_argument("--pool-budget", type=int, default=int(os.environ.get('MONGO_POOL_BUDGET', '200')),
+                        help="MongoDB connections shared by all workers")
+    args = parser.parse_args()
+    # Same format as the workers' log lines (see server.py)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    pool_size = pool_per_worker(args.pool_budget, args.workers)
+    os.environ['MONGO_MAX_POOL_SIZE'] = str(pool_size)
+    min_pool = min(int(os.environ.get('MONGO_MIN_POOL_SIZE', '10')), pool_size)
+    os.environ['MONGO_MIN_POOL_SIZE'] = str(min_pool)
+    prepare_metrics_dir(args.workers)
+
+    logger.info("Starting %d workers, MongoDB pool %d-%d connections each", args.workers, min_pool, pool_size)
+    uvicorn.run("server:create_app", factory=True, host=args.host, port=args.port, workers=args.workers,
+                app_dir=str(ROOT_DIR))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,221 @@
+"""Live report feed fed by a MongoDB change stream.
+
+One watcher per process follows the report collections through a single
+database-level change stream, so events from both collections share one
+ordered resume token, and fans every change out to the connected clients'
+queues. Recent events are kept in a ring buffer keyed by resume token: a
+client reconnecting with ``Last-Event-ID`` is replayed from the buffer, or
+from a private change stream resumed at its token if it fell further behind.
+
+Change streams need a replica set. For local testing a single node is enough:
+
+    mongod --replSet rs0 --dbpath /tmp/rs0 --port 27017
+    mongosh --eval 'rs.initiate()'
+"""
+import asyncio
+import logging
+from collections import deque
+from typing import AsyncIterator, Deque, List, NamedTuple, Optional, Set
+
+import orjson
+from pymongo.errors import OperationFailure, PyMongoError
+
+import sync
+
+logger = logging.getLogger(__name__)
+
+COLLECTIONS = ("water_reports", "patient_reports")
+BUFFER_SIZE = 5000
+SUBSCRIBER_QUEUE_SIZE = 1000
+MAX_CATCH_UP_EVENTS = 10000
+HEARTBEAT_SECONDS = 15.0
+RETRY_SECONDS = 5.0
+# Server error code for "The $changeStream stage is only supported on replica sets"
+CHANGE_STREAMS_UNSUPPORTED = 40573
+# Updates are only streamed when they change one of these
+VISIBLE_FIELDS = ("status", "risk_score")
+# Stored alongside reports but never sent to clients
+INTERNAL_FIELDS = ("_id", "risk_status", "location", "archive_batch", sync.SEQ_FIELD, sync.AT_FIELD)
+
+
+class Event(NamedTuple):
+    # "<resume token>.<n>": resume tokens sort in stream order, and n numbers
+    # the events produced by one change
+    id: str
+    name: str
+    data: dict
+
+    def encode(self) -> bytes:
+        return b"id: %s\nevent: %s\ndata: %s\n\n" % (self.id.encode(), self.name.encode(), orjson.dumps(self.data))
+
+
+RESET = Event("", "reset", {"reason": "resume point no longer available; refetch current state"})
+
+
+def _pipeline() -> List[dict]:
+    # Bookkeeping updates (sync stamps, rescored profiles, archive tagging) touch none of
+    # VISIBLE_FIELDS and are dropped server-side instead of reaching every subscriber
+    visible_update = {"operationType": "update", "$or": [
+        {f"updateDescription.updatedFields.{field}": {"$exists": True}} for field in VISIBLE_FIELDS
+    ]}
+    return [{"$match": {
+        "ns.coll": {"$in": list(COLLECTIONS)},
+        "$or": [{"operationType": {"$in": ["insert", "replace"]}}, visible_update],
+    }}]
+
+
+def to_events(change: dict) -> List[Event]:
+    """Translate one change into a report event plus a stats delta when the status moved."""
+    token = change["_id"]["_data"]
+    collection = change["ns"]["coll"]
+    operation = change["operationType"]
+    document = change.get("fullDocument") or {}
+    for field in INTERNAL_FIELDS:
+        document.pop(field, None)
+    payloads = [("report", {"collection": collection, "operation": operation, "report": document})]
+
+    delta = {}
+    if operation == "insert":
+        delta = {document.get("status"): 1}
+    else:
+        updated = (change.get("updateDescription") or {}).get("updatedFields", {})
+        before = change.get("fullDocumentBeforeChange") or {}
+        new_status = updated.get("status", document.get("status") if operation == "replace" else None)
+        old_status = before.get("status")
+        if new_status and old_status and new_status != old_status:
+            delta = {old_status: -1, new_status: 1}
+        elif new_status and not before:
+            # Without a pre-image the old status is unknown; tell clients to refresh totals
+            payloads.append(("stats", {"collection": collection, "refresh": True}))
+    if delta:
+        payloads.append(("stats", {"collection": collection, "delta": delta}))
+    return [Event(f"{token}.{n}", name, data) for n, (name, data) in enumerate(payloads)]
+
+
+class LiveFeed:
+    def __init__(self):
+        self.db = None
+        self.available = True
+        self._subscribers: Set[asyncio.Queue] = set()
+        self._buffer: Deque[Event] = deque(maxlen=BUFFER_SIZE)
+        self._resume_token: Optional[dict] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self, db):
+        if self._task is None:
+            self.db = db
+            self._task = asyncio.create_task(self._watch())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        for queue in list(self._subscribers):
+            self._offer(queue, None)
+
+    def _watch_options(self, resume_token: Optional[dict]) -> dict:
+        return {
+            "full_document": "updateLookup",
+            # Only filled in on collections with changeStreamPreAndPostImages enabled
+            "full_document_before_change": "whenAvailable",
+            "resume_after": resume_token,
+        }
+
+    async def _enable_pre_images(self):
+        # Lets update events carry the previous status (MongoDB 6.0+); deltas degrade to
+        # refresh hints without it
+        for collection in COLLECTIONS:
+            try:
+                await self.db.command({"collMod": collection, "changeStreamPreAndPostImages": {"enabled": True}})
+            except PyMongoError as exc:
+                logger.info("Pre-images unavailable for %s: %s", collection, exc)
+                return
+
+    async def _watch(self):
+        await self._enable_pre_images()
+        while True:
+            try:
+                async with self.db.watch(_pipeline(), **self._watch_options(self._resume_token)) as stream:
+                    logger.info("Live feed watching %s", ", ".join(COLLECTIONS))
+                    async for change in stream:
+                        self._resume_token = change["_id"]
+                        for event in to_events(change):
+                            self._publish(event)
+            except asyncio.CancelledError:
+                raise
+            except OperationFailure as exc:
+                if exc.code == CHANGE_STREAMS_UNSUPPORTED:
+                    logger.warning("Live feed disabled: change streams need a replica set")
+                    self.available = False
+                    return
+                logger.warning("Live feed stream failed (%s); retrying", exc)
+            except PyMongoError as exc:
+                logger.warning("Live feed stream failed (%s); retrying", exc)
+            await asyncio.sleep(RETRY_SECONDS)
+
+    def _offer(self, queue: asyncio.Queue, event: Optional[Event]):
+        try:
+            queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # A client this far behind is cut loose; it reconnects with its last event id
+            self._subscribers.discard(queue)
+            while not queue.empty():
+                queue.get_nowait()
+            queue.put_nowait(None)
+
+    def _publish(self, event: Event):
+        self._buffer.append(event)
+        for queue in list(self._subscribers):
+            self._offer(queue, event)
+
+    def _replay_from_buffer(self, last_event_id: str) -> Optional[List[Event]]:
+        if not self._buffer or last_event_id < self._buffer[0].id:
+            return None
+        return [event for event in self._buffer if event.id > last_event_id]
+
+    async def _catch_up(self, last_event_id: str) -> Optional[List[Event]]:
+        events = []
+        try:
+            token = last_event_id.rsplit(".", 1)[0]
+            async with self.db.watch(_pipeline(), **self._watch_options({"_data": token})) as stream:
+                while len(events) < MAX_CATCH_UP_EVENTS:
+                    change = await stream.try_next()
+                    if change is None:
+                        return events
+                    events.extend(to_events(change))
+        except PyMongoError as exc:
+            logger.info("Cannot resume live feed client from %s: %s", last_event_id, exc)
+        return None
+
+    async def subscribe(self, last_event_id: Optional[str] = None) -> AsyncIterator[bytes]:
+        queue: asyncio.Queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        # Subscribe before replaying so nothing published meanwhile is lost
+        self._subscribers.add(queue)
+        last_sent = last_event_id or ""
+        try:
+            if last_event_id:
+                replay = self._replay_from_buffer(last_event_id)
+                if replay is None:
+                    replay = await self._catch_up(last_event_id)
+                if replay is None:
+                    yield RESET.encode()
+                    replay = []
+                for event in replay:
+                    yield event.encode()
+                    last_sent = event.id
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield b": heartbeat\n\n"
+                    continue
+                if event is None:
+                    break
+                # Anything published while replaying was already sent from the replay
+                if event.id <= last_sent:
+                    continue
+                yield event.encode()
+                last_sent = event.id
+        finally:
+            self._subscribers.discard(queue)
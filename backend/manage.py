@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""Maintenance commands for the Jal Drishti backend.
+
+Run from the backend directory, e.g. ``python manage.py reconcile-stats``.
+"""
+import asyncio
+from pathlib import Path
+
+import typer
+from dotenv import load_dotenv
+
+import archive
+import database
+import faq_matcher
+import geo
+import http_cache
+import indexes
+import outbreak
+import report_stats
+import response_cache
+import rollups
+import sync
+import water_risk
+
+ROOT_DIR = Path(__file__).parent
+load_dotenv(ROOT_DIR / '.env')
+
+cli = typer.Typer(help="Jal Drishti maintenance commands")
+
+
+@cli.callback()
+def main():
+    pass
+
+
+def run_with_db(coro_fn, *args, **kwargs):
+    async def runner():
+        settings = database.MongoSettings.from_env()
+        client = database.create_client(settings)
+        try:
+            return await coro_fn(database.get_database(client, settings), *args, **kwargs)
+        finally:
+            client.close()
+    return asyncio.run(runner())
+
+
+@cli.command("reconcile-stats")
+def reconcile_stats():
+    """Rebuild the report status counters from the raw report collections."""
+    counts = run_with_db(report_stats.reconcile)
+    for collection, per_status in counts.items():
+        summary = ", ".join(f"{status}={count}" for status, count in per_status.items())
+        typer.echo(f"{collection}: {summary}")
+
+
+@cli.command("ensure-indexes")
+def ensure_indexes():
+    """Create any missing indexes and report queries still planned as COLLSCAN."""
+    async def run(db):
+        built = await indexes.ensure_indexes(db)
+        return built, await indexes.verify_query_plans(db)
+
+    built, collscans = run_with_db(run)
+    for collection, names in built.items():
+        typer.echo(f"built {collection}: {', '.join(names)}")
+    if not built:
+        typer.echo("all declared indexes already exist")
+    for name in collscans:
+        typer.echo(f"COLLSCAN: {name}", err=True)
+    raise typer.Exit(code=1 if collscans else 0)
+
+
+@cli.command("rebuild-outbreak-counts")
+def rebuild_outbreak_counts():
+    """Recompute the daily case counts used by outbreak detection from patient reports."""
+    written = run_with_db(outbreak.rebuild_counts)
+    typer.echo(f"rebuilt {written} daily case counts")
+
+
+@cli.command("rescore-water-reports")
+def rescore_water_reports(profile: str = typer.Option(None, help="Switch to this risk profile first")):
+    """Recompute risk scores (and triage status) for every water report."""
+    async def run(db):
+        scorer = water_risk.RiskScorer()
+        if profile:
+            await scorer.configure(db, profile)
+        else:
+            await scorer.load(db)
+
+        async def status_moved(moves):
+            # Counters that were never built are left alone
+            await report_stats.record_status_changes(db, "water_reports", moves)
+            await rollups.record_status_changes(db, "water_reports", moves)
+
+        scored, status_changes = await water_risk.rescore_collection(db, scorer.profile, on_moves=status_moved)
+        return scorer.profile.name, scored, status_changes
+
+    name, scored, status_changes = run_with_db(run)
+    typer.echo(f"rescored {scored} water reports with profile {name}")
+    if status_changes:
+        typer.echo("status changes: " + ", ".join(f"{s}={d:+d}" for s, d in status_changes.items() if d))
+
+
+@cli.command("rebuild-rollups")
+def rebuild_rollups():
+    """Recompute the per-district daily rollups from the raw report collections."""
+    written = run_with_db(rollups.rebuild)
+    typer.echo(f"rebuilt {written} district daily rollups")
+
+
+@cli.command("migrate-geo-locations")
+def migrate_geo_locations():
+    """Add GeoJSON locations to existing reports so nearby search finds them."""
+    updated = run_with_db(geo.migrate_locations, report_stats.REPORT_COLLECTIONS)
+    for collection, count in updated.items():
+        typer.echo(f"{collection}: {count} reports updated")
+
+
+@cli.command("backfill-sync")
+def backfill_sync():
+    """Give records written before delta sync existed a modification sequence number."""
+    stamped = run_with_db(sync.backfill, sync.SYNCED_COLLECTIONS)
+    for collection, count in stamped.items():
+        typer.echo(f"{collection}: {count} records stamped")
+
+
+@cli.command("archive-reports")
+def archive_reports(days: int = typer.Option(archive.ARCHIVE_AFTER_DAYS, help="Archive reports older than this")):
+    """Move old processed reports out of the hot collections into the Parquet archive."""
+    from server import EXPORT_MODELS  # the report models; importing the app does not connect
+
+    async def run(db):
+        archived = await archive.archive_reports(db, EXPORT_MODELS, days)
+        changed = [collection for collection, count in archived.items() if count]
+        if changed:
+            await http_cache.bump_versions(db, *changed)
+            # Reaches the workers only with a shared (Redis) cache; in-process caches expire on their own
+            await response_cache.from_env().invalidate(*changed)
+        return archived
+
+    for collection, count in run_with_db(run).items():
+        typer.echo(f"{collection}: {count} reports archived to {archive.ARCHIVE_DIR / collection}")
+
+
+@cli.command("answer-pending-queries")
+def answer_pending_queries(threshold: float = typer.Option(faq_matcher.FAQ_AUTO_ANSWER_THRESHOLD,
+                                                           help="Auto-answer at or above this confidence")):
+    """Match the pending query backlog against the FAQs and auto-answer close matches."""
+    async def run(db):
+        matcher = faq_matcher.FAQMatcher()
+        matcher.build(await db.faqs.find({}, {"_id": 0}).to_list(length=None))
+        return await faq_matcher.answer_pending(db, matcher, threshold)
+
+    updated, answered = run_with_db(run)
+    typer.echo(f"matched {updated} pending queries, auto-answered {answered}")
+
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,95 @@
+"""Viewport clustering for the map.
+
+Reports inside a bounding box are bucketed server-side into a fixed lat/lng
+grid whose cell size halves with every zoom level, so the response size is
+bounded by the number of cells on screen rather than by the number of reports.
+"""
+from typing import Dict, List, NamedTuple
+
+# At or above this zoom individual points are returned instead of clusters
+POINTS_MIN_ZOOM = 14
+MAX_VIEWPORT_POINTS = 500
+# Grid cells per 256px map tile side
+CELLS_PER_TILE = 4
+
+SOURCES = {"water_reports": "water_report", "patient_reports": "patient_report"}
+
+
+class BoundingBox(NamedTuple):
+    min_lat: float
+    min_lng: float
+    max_lat: float
+    max_lng: float
+
+    def to_filter(self) -> dict:
+        return {
+            "latitude": {"$gte": self.min_lat, "$lte": self.max_lat},
+            "longitude": {"$gte": self.min_lng, "$lte": self.max_lng},
+        }
+
+
+def cell_size(zoom: int) -> float:
+    """Width of a grid cell in degrees at the given zoom level."""
+    return 360.0 / (2 ** zoom * CELLS_PER_TILE)
+
+
+def cluster_pipeline(bbox: BoundingBox, zoom: int) -> List[dict]:
+    size = cell_size(zoom)
+
+    def branch(collection):
+        return [
+            {"$match": bbox.to_filter()},
+            {"$project": {
+                "_id": 0,
+                "type": {"$literal": SOURCES[collection]},
+                "status": 1,
+                "latitude": 1,
+                "longitude": 1,
+                # Cells are anchored at 0/0 so clusters stay put while panning
+                "x": {"$floor": {"$divide": ["$longitude", size]}},
+                "y": {"$floor": {"$divide": ["$latitude", size]}},
+            }},
+        ]
+
+    first, *rest = SOURCES
+    pipeline = branch(first)
+    for collection in rest:
+        pipeline.append({"$unionWith": {"coll": collection, "pipeline": branch(collection)}})
+    pipeline += [
+        {"$group": {
+            "_id": {"x": "$x", "y": "$y", "type": "$type", "status": "$status"},
+            "count": {"$sum": 1},
+            "lat_sum": {"$sum": "$latitude"},
+            "lng_sum": {"$sum": "$longitude"},
+        }},
+        {"$group": {
+            "_id": {"x": "$_id.x", "y": "$_id.y"},
+            "count": {"$sum": "$count"},
+            "lat_sum": {"$sum": "$lat_sum"},
+            "lng_sum": {"$sum": "$lng_sum"},
+            "breakdown": {"$push": {"type": "$_id.type", "status": "$_id.status", "count": "$count"}},
+        }},
+    ]
+    return pipeline
+
+
+def _format_cluster(row: dict) -> dict:
+    statuses: Dict[str, int] = {}
+    types: Dict[str, int] = {}
+    for part in row["breakdown"]:
+        statuses[part["status"]] = statuses.get(part["status"], 0) + part["count"]
+        types[part["type"]] = types.get(part["type"], 0) + part["count"]
+    return {
+        "id": f"{int(row['_id']['x'])}:{int(row['_id']['y'])}",
+        "latitude": row["lat_sum"] / row["count"],
+        "longitude": row["lng_sum"] / row["count"],
+        "count": row["count"],
+        "status": statuses,
+        "types": types,
+    }
+
+
+async def cluster_viewport(db, bbox: BoundingBox, zoom: int) -> List[dict]:
+    first = next(iter(SOURCES))
+    rows = db[first].aggregate(cluster_pipeline(bbox, zoom))
+    return [_format_cluster(row) async for row in rows]
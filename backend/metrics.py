@@ -0,0 +1,186 @@
+"""Request and database metrics in Prometheus text format.
+
+``MetricsMiddleware`` times every request by route template (never by raw
+path, which would give one series per report id) and counts the response
+bytes actually sent, so streamed exports and NDJSON pages are measured too.
+``CommandMetrics`` is a pymongo command listener recording per-collection,
+per-command timings and documents returned, and logs commands slower than
+``SLOW_QUERY_MS``. Response cache lookups and group commit ingestion
+(queue depth, flush latency, batch sizes) are recorded here too.
+"""
+import logging
+import os
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess)
+from pymongo import monitoring
+
+logger = logging.getLogger(__name__)
+
+SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', '100'))
+# Longest command text written to the slow-query log
+SLOW_QUERY_LOG_CHARS = 500
+
+registry = CollectorRegistry()
+
+REQUEST_DURATION = Histogram(
+    "jal_http_request_duration_seconds", "HTTP request latency by route",
+    ["method", "route", "status"], registry=registry,
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+)
+REQUESTS_IN_FLIGHT = Gauge("jal_http_requests_in_flight", "Requests being served", registry=registry,
+                           multiprocess_mode="livesum")
+RESPONSE_SIZE = Histogram(
+    "jal_http_response_size_bytes", "HTTP response body size by route",
+    ["method", "route"], registry=registry,
+    buckets=(256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216, 67108864),
+)
+COMMAND_DURATION = Histogram(
+    "jal_mongo_command_duration_seconds", "MongoDB command latency by collection and command",
+    ["collection", "command"], registry=registry,
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0),
+)
+DOCUMENTS_RETURNED = Counter(
+    "jal_mongo_documents_returned", "Documents returned by MongoDB commands",
+    ["collection", "command"], registry=registry,
+)
+COMMAND_FAILURES = Counter(
+    "jal_mongo_command_failures", "Failed MongoDB commands", ["collection", "command"], registry=registry,
+)
+SLOW_COMMANDS = Counter(
+    "jal_mongo_slow_commands", "MongoDB commands slower than the slow-query threshold",
+    ["collection", "command"], registry=registry,
+)
+CACHE_REQUESTS = Counter(
+    "jal_cache_requests", "Response cache lookups by route and result (hit, miss, coalesced)",
+    ["route", "result"], registry=registry,
+)
+INGEST_QUEUE_DEPTH = Gauge(
+    "jal_ingest_queue_depth", "Reports waiting for a group commit", ["collection"], registry=registry,
+    multiprocess_mode="livesum",
+)
+INGEST_FLUSH_DURATION = Histogram(
+    "jal_ingest_flush_duration_seconds", "Group commit latency by collection",
+    ["collection"], registry=registry,
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+)
+INGEST_BATCH_SIZE = Histogram(
+    "jal_ingest_batch_size", "Reports stored per group commit", ["collection"], registry=registry,
+    buckets=(1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500),
+)
+INGEST_FLUSH_FAILURES = Counter(
+    "jal_ingest_flush_failures", "Group commits that failed", ["collection"], registry=registry,
+)
+
+# Commands whose value is not a collection name, or that only add noise
+_IGNORED_COMMANDS = {"isMaster", "ismaster", "hello", "ping", "buildInfo", "saslStart", "saslContinue",
+                     "endSessions", "killCursors"}
+
+
+def render() -> Tuple[bytes, str]:
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        # Several workers (launch.py): merge every process's samples, whichever worker is scraped
+        merged = CollectorRegistry()
+        multiprocess.MultiProcessCollector(merged)
+        return generate_latest(merged), CONTENT_TYPE_LATEST
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware, so streamed bodies pass through untouched."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        size = 0
+
+        async def counting_send(message):
+            nonlocal status, size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        REQUESTS_IN_FLIGHT.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, counting_send)
+        finally:
+            REQUESTS_IN_FLIGHT.dec()
+            # The router records the matched route in the scope
+            route = getattr(scope.get("route"), "path", "unmatched")
+            method = scope["method"]
+            REQUEST_DURATION.labels(method, route, str(status)).observe(time.perf_counter() - started)
+            RESPONSE_SIZE.labels(method, route).observe(size)
+
+
+def _returned(reply: dict) -> int:
+    cursor = reply.get("cursor")
+    if cursor:
+        return len(cursor.get("firstBatch", cursor.get("nextBatch", ())))
+    if "values" in reply:  # distinct
+        return len(reply["values"])
+    if "value" in reply:  # findAndModify
+        return int(reply["value"] is not None)
+    return 0
+
+
+class CommandMetrics(monitoring.CommandListener):
+    """Runs on the driver's threads; pending commands are keyed by connection and request id."""
+
+    def __init__(self, slow_query_ms: float = SLOW_QUERY_MS):
+        self.slow_query_ms = slow_query_ms
+        self._pending: Dict[Tuple, Tuple[str, str, dict]] = {}
+        self._lock = threading.Lock()
+
+    def started(self, event):
+        if event.command_name in _IGNORED_COMMANDS:
+            return
+        value = event.command.get(event.command_name)
+        if event.command_name == "getMore":
+            collection = event.command.get("collection", "")
+            if collection.startswith("$cmd"):
+                # Database-level change stream; its getMores block by design
+                return
+        else:
+            collection = value if isinstance(value, str) else "-"
+        # Only the query shape is kept for the slow-query log, not inserted documents
+        shape = {k: v for k, v in event.command.items() if k in ("filter", "pipeline", "sort", "updates")}
+        with self._lock:
+            self._pending[(event.connection_id, event.request_id)] = (collection, event.command_name, shape)
+
+    def _finish(self, event) -> Optional[Tuple[str, str, dict]]:
+        with self._lock:
+            pending = self._pending.pop((event.connection_id, event.request_id), None)
+        if pending is None:
+            return None
+        collection, command, shape = pending
+        seconds = event.duration_micros / 1e6
+        COMMAND_DURATION.labels(collection, command).observe(seconds)
+        if seconds * 1000 >= self.slow_query_ms:
+            SLOW_COMMANDS.labels(collection, command).inc()
+            logger.warning("Slow query: %s on %s took %.1f ms %s",
+                           command, collection, seconds * 1000, str(shape)[:SLOW_QUERY_LOG_CHARS])
+        return pending
+
+    def succeeded(self, event):
+        pending = self._finish(event)
+        if pending:
+            returned = _returned(event.reply)
+            if returned:
+                DOCUMENTS_RETURNED.labels(pending[0], pending[1]).inc(returned)
+
+    def failed(self, event):
+        pending = self._finish(event)
+        if pending:
+            COMMAND_FAILURES.labels(pending[0], pending[1]).inc()
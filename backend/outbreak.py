@@ -0,0 +1,247 @@
+"""Outbreak early warning over patient reports.
+
+Daily case counts per (district, suspected disease) live in the
+``daily_case_counts`` collection and are incremented atomically on every
+patient report, so all workers agree on today's count. Each worker keeps the
+rolling window in NumPy arrays, one row per series, and derives an EWMA
+baseline and a one-sided CUSUM from the completed days. Those are recomputed
+for every series at once when the day rolls over; a new report only costs one
+counter increment and an O(1) comparison against its series' baseline.
+"""
+import logging
+import math
+import uuid
+from collections import Counter
+from datetime import date, datetime, timedelta
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+from pymongo import ReturnDocument
+
+logger = logging.getLogger(__name__)
+
+COUNTS_COLLECTION = "daily_case_counts"
+ALERTS_COLLECTION = "alerts"
+
+WINDOW_DAYS = 28
+EWMA_ALPHA = 0.3
+# Alert when today's count is this many standard deviations above the baseline...
+Z_THRESHOLD = 3.0
+# ...or when the accumulated CUSUM statistic crosses H (both in units of sigma)
+CUSUM_K = 0.5
+CUSUM_H = 4.0
+# Never alert on fewer cases than this, however quiet the baseline is
+MIN_CASES = 3
+# Keeps a series that has been silent for weeks from alerting on a single case
+SIGMA_FLOOR = 1.0
+# Furthest back the alerts endpoint looks
+MAX_ALERT_DAYS = 365
+
+SeriesKey = Tuple[str, str]
+
+
+class Signal(NamedTuple):
+    district: str
+    suspected_disease: str
+    day: date
+    cases: int
+    expected: float
+    z_score: float
+    cusum: float
+
+
+def _day(value: datetime) -> date:
+    return value.date() if isinstance(value, datetime) else value
+
+
+def _counts_id(key: SeriesKey, day: date) -> str:
+    return f"{key[0]}|{key[1]}|{day.isoformat()}"
+
+
+def normalize_disease(name: str) -> str:
+    return " ".join(name.split()).lower()
+
+
+class OutbreakDetector:
+    def __init__(self, window_days: int = WINDOW_DAYS):
+        self.window_days = window_days
+        self.today: Optional[date] = None
+        self._index: Dict[SeriesKey, int] = {}
+        self._keys: List[SeriesKey] = []
+        # Rows are series, grown geometrically; counts[:, -1] is today and the
+        # earlier columns are the completed days of the window
+        self.counts = np.zeros((0, window_days))
+        self.mean = np.zeros(0)
+        self.var = np.zeros(0)
+        self.cusum = np.zeros(0)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def _series(self, key: SeriesKey) -> int:
+        index = self._index.get(key)
+        if index is not None:
+            return index
+        index = len(self._keys)
+        self._index[key] = index
+        self._keys.append(key)
+        if index >= len(self.counts):
+            capacity = max(64, 2 * len(self.counts))
+            grow = capacity - len(self.counts)
+            self.counts = np.vstack([self.counts, np.zeros((grow, self.window_days))])
+            self.mean = np.concatenate([self.mean, np.zeros(grow)])
+            self.var = np.concatenate([self.var, np.zeros(grow)])
+            self.cusum = np.concatenate([self.cusum, np.zeros(grow)])
+        return index
+
+    def _fit_baselines(self):
+        # Replay the completed days column by column; each step updates every series at once
+        n = len(self.counts)
+        mean, var, cusum = np.zeros(n), np.zeros(n), np.zeros(n)
+        for column in range(self.window_days - 1):
+            x = self.counts[:, column]
+            sigma = np.maximum(np.sqrt(var), SIGMA_FLOOR)
+            cusum = np.maximum(0.0, cusum + (x - mean) / sigma - CUSUM_K)
+            diff = x - mean
+            mean = mean + EWMA_ALPHA * diff
+            var = (1 - EWMA_ALPHA) * (var + EWMA_ALPHA * diff ** 2)
+        self.mean, self.var, self.cusum = mean, var, cusum
+
+    async def load(self, db, today: date):
+        """(Re)build the window ending at ``today`` from the shared daily counts."""
+        start = today - timedelta(days=self.window_days - 1)
+        docs = await db[COUNTS_COLLECTION].find(
+            {"day": {"$gte": start.isoformat(), "$lte": today.isoformat()}}, {"_id": 0}
+        ).to_list(length=None)
+        self.today = today
+        self.counts[:] = 0
+        for doc in docs:
+            index = self._series((doc["district"], doc["suspected_disease"]))
+            column = self.window_days - 1 - (today - date.fromisoformat(doc["day"])).days
+            self.counts[index, column] = doc["count"]
+        self._fit_baselines()
+
+    def _evaluate(self, index: int, cases: float) -> Tuple[float, float, bool]:
+        mean = self.mean[index]
+        sigma = max(math.sqrt(self.var[index]), SIGMA_FLOOR)
+        z_score = (cases - mean) / sigma
+        cusum = max(0.0, self.cusum[index] + z_score - CUSUM_K)
+        fired = cases >= MIN_CASES and (z_score >= Z_THRESHOLD or cusum >= CUSUM_H)
+        return z_score, cusum, fired
+
+    def update(self, key: SeriesKey, day: date, cases: int) -> Optional[Signal]:
+        """Record today's shared count for a series and return a signal if it is anomalous."""
+        index = self._series(key)
+        offset = (self.today - day).days
+        if not 0 <= offset < self.window_days:
+            return None
+        self.counts[index, -1 - offset] = cases
+        if offset:
+            # Late reports for past days feed the next baseline refit but never alert
+            return None
+        z_score, cusum, fired = self._evaluate(index, cases)
+        if not fired:
+            return None
+        return Signal(key[0], key[1], day, cases, float(self.mean[index]), float(z_score), float(cusum))
+
+    def scan(self) -> List[Signal]:
+        """Evaluate today's counts for every series in one vectorized pass."""
+        n = len(self._keys)
+        if not n:
+            return []
+        cases, mean = self.counts[:n, -1], self.mean[:n]
+        sigma = np.maximum(np.sqrt(self.var[:n]), SIGMA_FLOOR)
+        z_scores = (cases - mean) / sigma
+        cusums = np.maximum(0.0, self.cusum[:n] + z_scores - CUSUM_K)
+        fired = (cases >= MIN_CASES) & ((z_scores >= Z_THRESHOLD) | (cusums >= CUSUM_H))
+        return [
+            Signal(*self._keys[i], self.today, int(cases[i]), float(mean[i]),
+                   float(z_scores[i]), float(cusums[i]))
+            for i in np.flatnonzero(fired)
+        ]
+
+    async def record_case(self, db, district: str, suspected_disease: str, report_date: datetime) -> Optional[Signal]:
+        key = (district, normalize_disease(suspected_disease))
+        day = _day(report_date)
+        doc = await db[COUNTS_COLLECTION].find_one_and_update(
+            {"_id": _counts_id(key, day)},
+            {"$inc": {"count": 1},
+             "$setOnInsert": {"district": key[0], "suspected_disease": key[1], "day": day.isoformat()}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        today = datetime.utcnow().date()
+        if self.today != today:
+            await self.load(db, today)
+        return self.update(key, day, doc["count"])
+
+
+async def rebuild_counts(db, window_days: int = WINDOW_DAYS) -> int:
+    """Recompute the daily case counts of the last window from the raw patient reports."""
+    start = datetime.combine(datetime.utcnow().date() - timedelta(days=window_days - 1), datetime.min.time())
+    rows = db.patient_reports.aggregate([
+        {"$match": {"report_date": {"$gte": start}}},
+        {"$group": {
+            "_id": {
+                "district": "$district",
+                "suspected_disease": {"$toLower": {"$trim": {"input": "$suspected_disease"}}},
+                "day": {"$dateToString": {"format": "%Y-%m-%d", "date": "$report_date"}},
+            },
+            "count": {"$sum": 1},
+        }},
+    ])
+    # Groups that differ only in inner whitespace share a series, so sum them before writing
+    counts = Counter()
+    async for row in rows:
+        key = (row["_id"]["district"], normalize_disease(row["_id"]["suspected_disease"]))
+        counts[key, date.fromisoformat(row["_id"]["day"])] += row["count"]
+    for (key, day), count in counts.items():
+        await db[COUNTS_COLLECTION].replace_one(
+            {"_id": _counts_id(key, day)},
+            {"district": key[0], "suspected_disease": key[1], "day": day.isoformat(), "count": count},
+            upsert=True,
+        )
+    return len(counts)
+
+
+async def raise_alert(db, signal: Signal) -> bool:
+    """Store or refresh the alert for a signal; returns True the first time it fires that day."""
+    now = datetime.utcnow()
+    result = await db[ALERTS_COLLECTION].update_one(
+        {"_id": _counts_id((signal.district, signal.suspected_disease), signal.day)},
+        {
+            "$set": {
+                "cases": signal.cases,
+                "expected": round(signal.expected, 3),
+                "z_score": round(signal.z_score, 3),
+                "cusum": round(signal.cusum, 3),
+                "updated_at": now,
+            },
+            "$setOnInsert": {
+                "id": str(uuid.uuid4()),
+                "district": signal.district,
+                "suspected_disease": signal.suspected_disease,
+                "day": signal.day.isoformat(),
+                "created_at": now,
+            },
+        },
+        upsert=True,
+    )
+    if result.upserted_id is not None:
+        logger.warning("Outbreak alert: %s cases of %s in %s on %s (expected %.1f)",
+                       signal.cases, signal.suspected_disease, signal.district, signal.day, signal.expected)
+    return result.upserted_id is not None
+
+
+async def affected_reports(db, signal: Signal, statuses) -> List[dict]:
+    """Reports counted in a signal's series that are still in one of ``statuses``."""
+    start = datetime.combine(signal.day, datetime.min.time())
+    candidates = await db.patient_reports.find(
+        {
+            "district": signal.district,
+            "report_date": {"$gte": start, "$lt": start + timedelta(days=1)},
+            "status": {"$in": list(statuses)},
+        },
+        {"_id": 0, "id": 1, "status": 1, "district": 1, "report_date": 1, "suspected_disease": 1},
+    ).to_list(length=None)
+    return [r for r in candidates if normalize_disease(r["suspected_disease"]) == signal.suspected_disease]
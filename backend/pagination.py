@@ -0,0 +1,54 @@
+"""Keyset pagination over ``(created_at, id)``.
+
+Cursors are opaque url-safe tokens encoding the sort key of the last item of
+a page; the next page is fetched with a range filter on that key, so deep
+pages cost the same as the first one.
+"""
+import base64
+import json
+from datetime import datetime
+from typing import Optional, Tuple
+
+# Newest first; ``id`` breaks ties between reports created in the same millisecond
+SORT = [("created_at", -1), ("id", -1)]
+
+# Largest page a list endpoint returns; a limit of 0 would mean "everything" to MongoDB
+MAX_PAGE = 500
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(created_at: datetime, item_id: str) -> str:
+    raw = json.dumps([created_at.isoformat(), item_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(token: str) -> Tuple[datetime, str]:
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        created_at, item_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(created_at), str(item_id)
+    except (ValueError, TypeError) as exc:
+        raise InvalidCursor("Invalid cursor") from exc
+
+
+def keyset_filter(cursor: Optional[str], base_filter: Optional[dict] = None) -> dict:
+    query = dict(base_filter or {})
+    if not cursor:
+        return query
+    created_at, item_id = decode_cursor(cursor)
+    after = {"$or": [
+        {"created_at": {"$lt": created_at}},
+        {"created_at": created_at, "id": {"$lt": item_id}},
+    ]}
+    return {"$and": [query, after]} if query else after
+
+
+def next_cursor(items: list, limit: int) -> Optional[str]:
+    # A short page means there is nothing left to fetch
+    if not items or len(items) < limit:
+        return None
+    last = items[-1]
+    return encode_cursor(last["created_at"], last["id"])
@@ -0,0 +1,124 @@
+"""Report status statistics.
+
+Counts are computed either with a single aggregation over both report
+collections, or read from the ``report_counters`` collection which is kept
+up to date by the write paths (see ``increment_counts`` / ``record_status_change``).
+The write paths never create counter documents: a counter starting from zero
+on a populated database would be wrong forever, so the first read seeds the
+counters with ``reconcile`` instead.
+"""
+from collections import Counter
+from typing import Dict, Iterable, Optional, Tuple
+
+REPORT_COLLECTIONS = ("water_reports", "patient_reports")
+COUNTERS_COLLECTION = "report_counters"
+STATUSES = ("submitted", "processed", "under_review", "high_priority")
+
+
+def _empty_counts() -> Dict[str, int]:
+    return {status: 0 for status in STATUSES}
+
+
+def _status_value(status) -> str:
+    # Accept both ReportStatus members and plain strings
+    return getattr(status, "value", status)
+
+
+async def aggregate_status_counts(db, by_collection: bool = False):
+    """Count reports per status for every report collection in one pipeline."""
+    def branch(name):
+        # The $match lets each branch run as a covered scan of the status index
+        return [
+            {"$match": {"status": {"$in": list(STATUSES)}}},
+            {"$project": {"_id": 0, "status": 1, "source": {"$literal": name}}},
+        ]
+
+    first, *rest = REPORT_COLLECTIONS
+    pipeline = branch(first)
+    for name in rest:
+        pipeline.append({"$unionWith": {"coll": name, "pipeline": branch(name)}})
+    pipeline.append({"$group": {"_id": {"source": "$source", "status": "$status"}, "count": {"$sum": 1}}})
+
+    counts = {name: _empty_counts() for name in REPORT_COLLECTIONS}
+    async for row in db[first].aggregate(pipeline):
+        status = row["_id"].get("status")
+        if status in STATUSES:
+            counts[row["_id"]["source"]][status] = row["count"]
+
+    if by_collection:
+        return counts
+    return sum_counts(counts.values())
+
+
+def sum_counts(per_collection: Iterable[Dict[str, int]]) -> Dict[str, int]:
+    totals = _empty_counts()
+    for counts in per_collection:
+        for status in STATUSES:
+            totals[status] += counts.get(status, 0)
+    return totals
+
+
+async def read_counters(db) -> Optional[Dict[str, int]]:
+    """Return totals from the counters collection, or None if it is not populated."""
+    docs = await db[COUNTERS_COLLECTION].find(
+        {"_id": {"$in": list(REPORT_COLLECTIONS)}}
+    ).to_list(length=len(REPORT_COLLECTIONS))
+    if len(docs) < len(REPORT_COLLECTIONS):
+        return None
+    return sum_counts(docs)
+
+
+async def increment_counts(db, collection: str, counts: Dict[str, int]):
+    """Apply status deltas; counters that were never built stay unbuilt until ``reconcile`` seeds them."""
+    await db[COUNTERS_COLLECTION].update_one(
+        {"_id": collection},
+        {"$inc": {_status_value(status): delta for status, delta in counts.items()}},
+    )
+
+
+async def remove_counts(db, collection: str, counts: Dict[str, int]):
+    """Take removed reports out of the counters; counters that were never built stay unbuilt."""
+    if counts:
+        await db[COUNTERS_COLLECTION].update_one(
+            {"_id": collection},
+            {"$inc": {_status_value(status): -count for status, count in counts.items()}},
+        )
+
+
+async def record_status_change(db, collection: str, old_status, new_status):
+    old_status, new_status = _status_value(old_status), _status_value(new_status)
+    if old_status == new_status:
+        return
+    await db[COUNTERS_COLLECTION].update_one(
+        {"_id": collection},
+        {"$inc": {old_status: -1, new_status: 1}},
+    )
+
+
+async def record_status_changes(db, collection: str, changes: Iterable[Tuple[dict, str, str]]):
+    """Apply many status moves at once; each change is (report, old status, new status)."""
+    counts = Counter()
+    for _, old_status, new_status in changes:
+        counts[_status_value(old_status)] -= 1
+        counts[_status_value(new_status)] += 1
+    counts = {status: delta for status, delta in counts.items() if delta}
+    if counts:
+        await increment_counts(db, collection, counts)
+
+
+async def reconcile(db) -> Dict[str, Dict[str, int]]:
+    """Rebuild the counters collection from the raw report collections."""
+    counts = await aggregate_status_counts(db, by_collection=True)
+    for name, per_status in counts.items():
+        await db[COUNTERS_COLLECTION].replace_one({"_id": name}, per_status, upsert=True)
+    return counts
+
+
+async def get_status_counts(db, use_counters: bool) -> Dict[str, int]:
+    if use_counters:
+        totals = await read_counters(db)
+        if totals is not None:
+            return totals
+        # Counters have never been built (or were dropped) - seed them now
+        return sum_counts((await reconcile(db)).values())
+    return await aggregate_status_counts(db)
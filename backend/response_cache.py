@@ -0,0 +1,162 @@
+"""Read-through cache for hot GET endpoints.
+
+Entries are keyed by route, parameters and the current generation of every
+collection the response is derived from. Writers call ``invalidate`` with
+the collections they changed, which bumps those generations: older entries
+are never served again and age out of the LRU. A computation that raced
+with a write is stored under the old generation, so it cannot resurrect
+stale data either.
+
+The default backend is an in-process LRU with TTL; each worker invalidates
+its own copy immediately, and other workers' copies expire after the TTL.
+Endpoints that also send a version ETag put it in the parameters, so the
+body always matches the ETag it is sent with, whichever worker wrote last.
+With ``CACHE_REDIS_URL`` set (and the ``redis`` package installed),
+entries and generations are shared, so invalidation reaches every worker.
+Concurrent misses on one key share a single computation; if the request
+running it is cancelled, a waiting request takes over instead of failing.
+"""
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Iterable, Tuple
+
+import orjson
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+CACHE_TTL_SECONDS = float(os.environ.get('CACHE_TTL_SECONDS', '30'))
+CACHE_MAX_ENTRIES = int(os.environ.get('CACHE_MAX_ENTRIES', '2048'))
+CACHE_REDIS_URL = os.environ.get('CACHE_REDIS_URL')
+
+_MISSING = object()
+
+
+class _LoadCancelled(Exception):
+    """The request computing a shared miss went away; its waiters load again."""
+
+
+class MemoryBackend:
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._generations: Dict[str, int] = {}
+
+    async def generations(self, collections: Iterable[str]) -> Tuple[int, ...]:
+        return tuple(self._generations.get(c, 0) for c in collections)
+
+    async def get(self, key: str):
+        entry = self._entries.get(key)
+        if entry is None:
+            return _MISSING
+        expires, value = entry
+        if expires < time.monotonic():
+            del self._entries[key]
+            return _MISSING
+        self._entries.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value, ttl: float):
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def invalidate(self, collections: Iterable[str]):
+        for collection in collections:
+            self._generations[collection] = self._generations.get(collection, 0) + 1
+
+
+class RedisBackend:
+    """Shared backend; values round-trip through JSON, so datetimes come back as ISO strings."""
+
+    GENERATIONS_KEY = "jal:cache:generations"
+
+    def __init__(self, url: str):
+        import redis.asyncio as redis  # optional dependency, only needed for a shared cache
+        self.redis = redis.from_url(url)
+
+    async def generations(self, collections: Iterable[str]) -> Tuple[int, ...]:
+        collections = list(collections)
+        values = await self.redis.hmget(self.GENERATIONS_KEY, collections) if collections else []
+        return tuple(int(v or 0) for v in values)
+
+    async def get(self, key: str):
+        data = await self.redis.get(f"jal:cache:{key}")
+        return _MISSING if data is None else orjson.loads(data)
+
+    async def set(self, key: str, value, ttl: float):
+        await self.redis.set(f"jal:cache:{key}", orjson.dumps(value), px=int(ttl * 1000))
+
+    async def invalidate(self, collections: Iterable[str]):
+        for collection in collections:
+            await self.redis.hincrby(self.GENERATIONS_KEY, collection, 1)
+
+
+class ResponseCache:
+    def __init__(self, backend, ttl: float = CACHE_TTL_SECONDS):
+        self.backend = backend
+        self.ttl = ttl
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    async def get_or_compute(self, route: str, params: dict, collections: Iterable[str],
+                             compute: Callable[[], Awaitable[Any]]):
+        """Return the cached value for ``route``/``params`` or compute and store it."""
+        if self.ttl <= 0:
+            return await compute()
+        collections = sorted(collections)
+        generations = await self.backend.generations(collections)
+        key = f"{route}|{orjson.dumps(params, option=orjson.OPT_SORT_KEYS).decode()}|{generations}"
+
+        while True:
+            pending = self._inflight.get(key)
+            if pending is None:
+                value = await self.backend.get(key)
+                if value is not _MISSING:
+                    metrics.CACHE_REQUESTS.labels(route, "hit").inc()
+                    return value
+                # A shared backend lookup yields to the loop; another miss may have started meanwhile
+                pending = self._inflight.get(key)
+            if pending is None:
+                break
+            metrics.CACHE_REQUESTS.labels(route, "coalesced").inc()
+            try:
+                return await asyncio.shield(pending)
+            except _LoadCancelled:
+                # The client that started the load disconnected; one of the waiters takes over
+                continue
+
+        metrics.CACHE_REQUESTS.labels(route, "miss").inc()
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            value = await compute()
+            await self.backend.set(key, value, self.ttl)
+            future.set_result(value)
+            return value
+        except asyncio.CancelledError:
+            # Cancelling the shared future would fail every coalesced request with this one
+            future.set_exception(_LoadCancelled())
+            future.exception()
+            raise
+        except Exception as exc:
+            future.set_exception(exc)
+            # Waiters get the exception; retrieve it here so an unwaited future doesn't warn
+            future.exception()
+            raise
+        finally:
+            del self._inflight[key]
+
+    async def invalidate(self, *collections: str):
+        await self.backend.invalidate(collections)
+
+
+def from_env() -> ResponseCache:
+    if CACHE_REDIS_URL:
+        logger.info("Response cache shared through Redis")
+        return ResponseCache(RedisBackend(CACHE_REDIS_URL))
+    return ResponseCache(MemoryBackend())
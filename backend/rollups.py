@@ -0,0 +1,198 @@
+"""Per-district daily rollups of the report collections.
+
+One document per (collection, district, day, category) holds the report
+count, the count per status and, for water reports, the min/max/sum/n of each
+water parameter; means are derived at read time. The category is the water
+source for water reports and the normalized suspected disease for patient
+reports, and the day is the collection or report date.
+
+Writers fold each insert into its rollup with ``$inc``/``$min``/``$max``, so
+trend queries read a few documents per district and day instead of scanning
+raw reports. ``rebuild`` recomputes everything from the raw collections.
+"""
+from collections import defaultdict
+from datetime import date, datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from pymongo import UpdateOne
+
+from outbreak import normalize_disease
+from report_stats import STATUSES, _status_value
+from water_risk import PARAMETERS
+
+ROLLUPS_COLLECTION = "district_daily_rollups"
+
+# collection -> (date field, category field)
+SOURCES = {
+    "water_reports": ("collection_date", "water_source"),
+    "patient_reports": ("report_date", "suspected_disease"),
+}
+MEASURED = {"water_reports": PARAMETERS, "patient_reports": ()}
+
+
+def key_fields(collection: str) -> Dict[str, int]:
+    """Projection of the report fields that locate its rollup."""
+    date_field, category_field = SOURCES[collection]
+    return {"district": 1, date_field: 1, category_field: 1}
+
+
+def _rollup_id(collection: str, report: dict) -> Tuple[str, dict]:
+    date_field, category_field = SOURCES[collection]
+    day = report[date_field]
+    day = (day.date() if isinstance(day, datetime) else day).isoformat()
+    category = _status_value(report[category_field])
+    if collection == "patient_reports":
+        category = normalize_disease(category)
+    key = {"collection": collection, "district": report["district"], "day": day, "category": category}
+    return f"{collection}|{report['district']}|{day}|{category}", key
+
+
+async def record_reports(db, collection: str, reports: Iterable[dict]):
+    """Fold newly inserted reports into their rollups, one upsert per rollup touched."""
+    keys = {}
+    inc = defaultdict(lambda: defaultdict(int))
+    low: Dict[str, Dict[str, float]] = defaultdict(dict)
+    high: Dict[str, Dict[str, float]] = defaultdict(dict)
+    for report in reports:
+        rollup_id, keys[rollup_id] = _rollup_id(collection, report)
+        counts = inc[rollup_id]
+        counts["count"] += 1
+        counts[f"statuses.{_status_value(report['status'])}"] += 1
+        for parameter in MEASURED[collection]:
+            value = report.get(parameter)
+            if value is None:
+                continue
+            counts[f"parameters.{parameter}.sum"] += value
+            counts[f"parameters.{parameter}.n"] += 1
+            field = f"parameters.{parameter}"
+            low[rollup_id][f"{field}.min"] = min(value, low[rollup_id].get(f"{field}.min", value))
+            high[rollup_id][f"{field}.max"] = max(value, high[rollup_id].get(f"{field}.max", value))
+
+    updates = []
+    for rollup_id, key in keys.items():
+        update = {"$inc": dict(inc[rollup_id]), "$setOnInsert": key}
+        if low[rollup_id]:
+            update["$min"] = low[rollup_id]
+            update["$max"] = high[rollup_id]
+        updates.append(UpdateOne({"_id": rollup_id}, update, upsert=True))
+    if updates:
+        await db[ROLLUPS_COLLECTION].bulk_write(updates, ordered=False)
+
+
+async def record_status_changes(db, collection: str, changes: Iterable[Tuple[dict, str, str]]):
+    """Move reports between status counts; each change is (report, old status, new status)."""
+    inc = defaultdict(lambda: defaultdict(int))
+    for report, old, new in changes:
+        old, new = _status_value(old), _status_value(new)
+        if old == new:
+            continue
+        rollup_id, _ = _rollup_id(collection, report)
+        inc[rollup_id][f"statuses.{old}"] -= 1
+        inc[rollup_id][f"statuses.{new}"] += 1
+    updates = [UpdateOne({"_id": rollup_id}, {"$inc": dict(fields)}) for rollup_id, fields in inc.items()]
+    if updates:
+        await db[ROLLUPS_COLLECTION].bulk_write(updates, ordered=False)
+
+
+def _rebuild_branch(collection: str) -> List[dict]:
+    date_field, category_field = SOURCES[collection]
+    category = f"${category_field}"
+    if collection == "patient_reports":
+        # normalize_disease: whitespace runs collapse to one space, then lower case
+        words = {"$map": {"input": {"$regexFindAll": {"input": category, "regex": r"\S+"}},
+                          "as": "word", "in": "$$word.match"}}
+        category = {"$toLower": {"$reduce": {
+            "input": words,
+            "initialValue": "",
+            "in": {"$cond": [{"$eq": ["$$value", ""]}, "$$this", {"$concat": ["$$value", " ", "$$this"]}]},
+        }}}
+    group = {
+        "_id": {
+            "district": "$district",
+            "day": {"$dateToString": {"format": "%Y-%m-%d", "date": f"${date_field}"}},
+            "category": category,
+        },
+        "count": {"$sum": 1},
+    }
+    for status in STATUSES:
+        group[f"status_{status}"] = {"$sum": {"$cond": [{"$eq": ["$status", status]}, 1, 0]}}
+    for parameter in MEASURED[collection]:
+        group[f"{parameter}_min"] = {"$min": f"${parameter}"}
+        group[f"{parameter}_max"] = {"$max": f"${parameter}"}
+        group[f"{parameter}_sum"] = {"$sum": f"${parameter}"}
+        group[f"{parameter}_n"] = {"$sum": {"$cond": [{"$isNumber": f"${parameter}"}, 1, 0]}}
+
+    project = {
+        "_id": {"$concat": [collection, "|", "$_id.district", "|", "$_id.day", "|", "$_id.category"]},
+        "collection": {"$literal": collection},
+        "district": "$_id.district",
+        "day": "$_id.day",
+        "category": "$_id.category",
+        "count": 1,
+        "statuses": {status: f"$status_{status}" for status in STATUSES},
+    }
+    if MEASURED[collection]:
+        project["parameters"] = {
+            parameter: {stat: f"${parameter}_{stat}" for stat in ("min", "max", "sum", "n")}
+            for parameter in MEASURED[collection]
+        }
+    return [{"$group": group}, {"$project": project}]
+
+
+async def rebuild(db) -> int:
+    """Recompute every rollup from the raw reports and atomically replace the collection.
+
+    Increments recorded while the aggregation runs are lost when ``$out``
+    swaps the collection, so run it while report writes are stopped.
+    """
+    first, *rest = SOURCES
+    pipeline = _rebuild_branch(first)
+    for name in rest:
+        pipeline.append({"$unionWith": {"coll": name, "pipeline": _rebuild_branch(name)}})
+    pipeline.append({"$out": ROLLUPS_COLLECTION})
+    # $out swaps the collection in one step and keeps its indexes
+    await db[first].aggregate(pipeline).to_list(length=None)
+    return await db[ROLLUPS_COLLECTION].count_documents({})
+
+
+def _format_day(row: dict, collection: str) -> dict:
+    day = {
+        "day": row["_id"]["day"],
+        "reports": row["count"],
+        "statuses": {status: row[f"status_{status}"] for status in STATUSES},
+    }
+    if MEASURED[collection]:
+        day["parameters"] = {
+            parameter: {
+                "min": row[f"{parameter}_min"],
+                "mean": round(row[f"{parameter}_sum"] / row[f"{parameter}_n"], 3) if row[f"{parameter}_n"] else None,
+                "max": row[f"{parameter}_max"],
+            }
+            for parameter in MEASURED[collection]
+        }
+    return day
+
+
+async def district_trends(db, collection: str, start: date, end: date,
+                          district: Optional[str] = None, category: Optional[str] = None) -> List[dict]:
+    """Daily series per district between ``start`` and ``end`` (inclusive), summed over categories."""
+    match = {"collection": collection, "day": {"$gte": start.isoformat(), "$lte": end.isoformat()}}
+    if district:
+        match["district"] = district
+    if category:
+        match["category"] = normalize_disease(category) if collection == "patient_reports" else category
+
+    group = {"_id": {"district": "$district", "day": "$day"}, "count": {"$sum": "$count"}}
+    for status in STATUSES:
+        group[f"status_{status}"] = {"$sum": f"$statuses.{status}"}
+    for parameter in MEASURED[collection]:
+        group[f"{parameter}_min"] = {"$min": f"$parameters.{parameter}.min"}
+        group[f"{parameter}_max"] = {"$max": f"$parameters.{parameter}.max"}
+        group[f"{parameter}_sum"] = {"$sum": f"$parameters.{parameter}.sum"}
+        group[f"{parameter}_n"] = {"$sum": f"$parameters.{parameter}.n"}
+
+    pipeline = [{"$match": match}, {"$group": group}, {"$sort": {"_id.district": 1, "_id.day": 1}}]
+    series: Dict[str, List[dict]] = {}
+    async for row in db[ROLLUPS_COLLECTION].aggregate(pipeline):
+        series.setdefault(row["_id"]["district"], []).append(_format_day(row, collection))
+    return [{"district": name, "days": days} for name, days in series.items()]
@@ -1,26 +1,64 @@
-from fastapi import FastAPI, APIRouter, HTTPException, UploadFile, File
+from fastapi import FastAPI, APIRouter, BackgroundTasks, Header, HTTPException, UploadFile, File, Request, Response
+from fastapi import Query as QueryParam
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient
+import asyncio
 import os
 import logging
+import time
+import orjson
 from pathlib import Path
-from pydantic import BaseModel, Field
-from typing import List, Optional
+from pydantic import BaseModel, ConfigDict, Field, ValidationError
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+from typing import Any, Dict, List, Optional, Tuple
+from collections import Counter
 import uuid
-from datetime import datetime
+from datetime import date, datetime, timedelta
 from enum import Enum
 
+import activity_feed
+import archive
+import compression
+import database
+import export
+import faq_matcher
+import faq_search
+import geo
+import hotspots
+import http_cache
+import indexes
+import ingest_buffer
+import live_feed
+import map_clusters
+import metrics
+import outbreak
+import pagination
+import report_stats
+import response_cache
+import rollups
+import sync
+import water_risk
+
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
-# MongoDB connection
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
+# MongoDB connection, opened on startup in each worker process (see connect_db)
+mongo_settings = database.MongoSettings.from_env()
+client = None
+db = None
+
+# Readiness probe timeout for the MongoDB ping
+READINESS_TIMEOUT_SECONDS = 2.0
+
+# Push new and updated reports to /api/live subscribers (needs a replica set)
+LIVE_FEED_ENABLED = os.environ.get('LIVE_FEED_ENABLED', 'true').lower() == 'true'
+
+# Queue single report submissions and store them with bulk inserts (see ingest_buffer)
+INGEST_GROUP_COMMIT = os.environ.get('INGEST_GROUP_COMMIT', 'false').lower() == 'true'
 
-# Create the main app without a prefix
-app = FastAPI()
+# Serve /report-stats from incrementally maintained counters instead of aggregating
+STATS_COUNTERS_ENABLED = os.environ.get('STATS_COUNTERS_ENABLED', 'false').lower() == 'true'
 
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
@@ -32,6 +70,23 @@ class ReportStatus(str, Enum):
     UNDER_REVIEW = "under_review"
     HIGH_PRIORITY = "high_priority"
 
+class ListFormat(str, Enum):
+    JSON = "json"
+    NDJSON = "ndjson"
+
+class ExportFormat(str, Enum):
+    CSV = "csv"
+    PARQUET = "parquet"
+
+class NearbyType(str, Enum):
+    ALL = "all"
+    WATER = "water"
+    PATIENT = "patient"
+
+class TrendSource(str, Enum):
+    WATER = "water"
+    PATIENT = "patient"
+
 class WaterSource(str, Enum):
     BOREWELL = "borewell"
     RIVER = "river"
@@ -62,6 +117,10 @@ class WaterQualityReport(BaseModel):
     created_at: datetime = Field(default_factory=datetime.utcnow)
     latitude: Optional[float] = None
     longitude: Optional[float] = None
+    # Filled in by risk triage on ingest
+    risk_score: Optional[float] = None
+    risk_flags: List[str] = []
+    risk_profile: Optional[str] = None
 
 class PatientReport(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
@@ -95,6 +154,9 @@ class Query(BaseModel):
     question: str
     status: str = "pending"
     response: Optional[str] = None
+    # Closest FAQ and its similarity; above the threshold the query is auto-answered with it
+    faq_id: Optional[str] = None
+    match_confidence: Optional[float] = None
     created_at: datetime = Field(default_factory=datetime.utcnow)
 
 class ReportStats(BaseModel):
@@ -107,6 +169,40 @@ class District(BaseModel):
     name: str
     state: str
 
+class StatusUpdate(BaseModel):
+    status: ReportStatus
+
+class ThresholdOverride(BaseModel):
+    # Only the fields sent are overridden; null clears an acceptable bound together with its limit
+    model_config = ConfigDict(extra="forbid", allow_inf_nan=False)
+    acceptable_min: Optional[float] = None
+    acceptable_max: Optional[float] = None
+    limit_min: Optional[float] = None
+    limit_max: Optional[float] = None
+    weight: float = Field(None, ge=0, le=1)
+
+class RiskProfileUpdate(BaseModel):
+    profile: str
+    overrides: Dict[str, ThresholdOverride] = {}
+
+class BatchItemResult(BaseModel):
+    index: int
+    id: Optional[str] = None
+    status: str  # "created", "duplicate", "invalid" or "error"
+    detail: Optional[str] = None
+
+class BatchResult(BaseModel):
+    created: int
+    duplicates: int
+    failed: int
+    results: List[BatchItemResult]
+
+MAX_BATCH_SIZE = 500
+DUPLICATE_KEY_ERROR = 11000
+
+DEFAULT_TREND_DAYS = 30
+MAX_TREND_DAYS = 366
+
 # Northeast India districts data
 NORTHEAST_DISTRICTS = [
     {"name": "Kamrup", "state": "Assam"},
@@ -159,6 +255,8 @@ NORTHEAST_DISTRICTS = [
     {"name": "Serchhip", "state": "Mizoram"}
 ]
 
+DISTRICTS_PAYLOAD = http_cache.StaticPayload([District(**district).dict() for district in NORTHEAST_DISTRICTS])
+
 # FAQ data
 FAQ_DATA = [
     {
@@ -198,6 +296,69 @@ FAQ_DATA = [
     }
 ]
 
+# Fast response path
+# Read endpoints return the stored documents straight to orjson: the projection
+# limits them to the API fields and the data was validated when it was written,
+# so building response models and re-validating them is skipped.
+def api_projection(model) -> dict:
+    return {"_id": 0, **{name: 1 for name in model.model_fields}}
+
+def field_projection(model, fields: Optional[str]) -> dict:
+    """Projection for a ?fields=a,b,c selection, or every API field when none is given."""
+    if not fields:
+        return api_projection(model)
+    requested = {name.strip() for name in fields.split(",") if name.strip()}
+    unknown = requested - model.model_fields.keys()
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+    # id and created_at are always included; the next-page cursor is built from them
+    return {"_id": 0, "id": 1, "created_at": 1, **{name: 1 for name in requested}}
+
+# Page size of the list endpoints; bounded so no request can ask for a whole collection
+PAGE_LIMIT = QueryParam(50, ge=1, le=pagination.MAX_PAGE)
+
+def page_response(items: list, limit: int) -> ORJSONResponse:
+    token = pagination.next_cursor(items, limit)
+    return ORJSONResponse(items, headers={"X-Next-Cursor": token} if token else None)
+
+# Response cache for the hot read endpoints, invalidated by collections_changed
+cache = response_cache.from_env()
+
+async def collections_changed(*collections: str):
+    """Invalidate the ETags and cached responses derived from these collections."""
+    await http_cache.bump_versions(db, *collections)
+    await cache.invalidate(*collections)
+
+# Paginated listing helpers
+def page_cursor(collection: str, projection: dict, cursor: Optional[str], limit: int):
+    try:
+        query = pagination.keyset_filter(cursor)
+    except pagination.InvalidCursor:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return db[collection].find(query, projection).sort(pagination.SORT).limit(limit)
+
+async def stream_ndjson(docs, limit: int):
+    """Write documents out as the driver yields them instead of buffering the page.
+
+    Headers are sent before the page is read, so a full page ends with a
+    ``{"next_cursor": ...}`` line in place of the X-Next-Cursor header.
+    """
+    count, last = 0, None
+    async for doc in docs:
+        count, last = count + 1, doc
+        yield orjson.dumps(doc, option=orjson.OPT_APPEND_NEWLINE)
+    # A short page means there is nothing left to fetch
+    if count >= limit:
+        token = pagination.encode_cursor(last["created_at"], last["id"])
+        yield orjson.dumps({"next_cursor": token}, option=orjson.OPT_APPEND_NEWLINE)
+
+async def list_page(collection: str, model, limit: int, cursor: Optional[str], format: ListFormat,
+                    fields: Optional[str] = None):
+    docs = page_cursor(collection, field_projection(model, fields), cursor, limit)
+    if format == ListFormat.NDJSON:
+        return StreamingResponse(stream_ndjson(docs, limit), media_type="application/x-ndjson")
+    return page_response(await docs.to_list(length=limit), limit)
+
 # API Routes
 @api_router.get("/")
 async def root():
@@ -205,184 +366,595 @@ async def root():
 
 # Districts
 @api_router.get("/districts", response_model=List[District])
-async def get_districts():
-    return [District(**district) for district in NORTHEAST_DISTRICTS]
+async def get_districts(request: Request):
+    return DISTRICTS_PAYLOAD.respond(request)
+
+# Water-quality risk triage
+risk_scorer = water_risk.RiskScorer()
+
+async def triage_water_reports(reports: List[WaterQualityReport]) -> List[dict]:
+    """Score reports in one vectorized pass and set the status of untriaged ones."""
+    profile = await risk_scorer.current(db)
+    scores, exceeded = profile.score(water_risk.to_matrix([report.dict() for report in reports]))
+    documents = []
+    for report, score, flags in zip(reports, scores, exceeded):
+        fields = water_risk.assessment(profile, score, flags)
+        report.risk_score, report.risk_flags, report.risk_profile = (
+            fields["risk_score"], fields["risk_flags"], fields["risk_profile"])
+        if report.status == ReportStatus.SUBMITTED:
+            report.status = ReportStatus(fields["risk_status"])
+        documents.append({**report.dict(), "risk_status": fields["risk_status"]})
+    return documents
+
+async def report_documents(collection: str, reports: list) -> List[dict]:
+    """Documents to store for new reports: model fields plus triage, GeoJSON location and sync sequence."""
+    if collection == "water_reports":
+        documents = await triage_water_reports(reports)
+    else:
+        documents = [report.dict() for report in reports]
+    return await sync.stamp_documents(db, [geo.with_location(document) for document in documents])
+
+async def rescore_water_reports(profile: water_risk.RiskProfile, query: Optional[dict] = None):
+    async def status_moved(moves):
+        # Applied as deltas; a rollup rebuild would lose increments from writes during the rescore
+        if STATS_COUNTERS_ENABLED:
+            await report_stats.record_status_changes(db, "water_reports", moves)
+        await rollups.record_status_changes(db, "water_reports", moves)
+
+    scored, _ = await water_risk.rescore_collection(db, profile, on_moves=status_moved, query=query)
+    await collections_changed("water_reports")
+    logger.info("Rescored %d water reports with risk profile %s", scored, profile.name)
+
+# Outbreak early warning
+outbreak_detector = outbreak.OutbreakDetector()
+ESCALATABLE_STATUSES = (ReportStatus.SUBMITTED.value, ReportStatus.UNDER_REVIEW.value)
+
+async def escalate_outbreak(signal: outbreak.Signal) -> List[str]:
+    await outbreak.raise_alert(db, signal)
+    affected = await outbreak.affected_reports(db, signal, ESCALATABLE_STATUSES)
+    if not affected:
+        return []
+    ids = [report["id"] for report in affected]
+    await sync.update_each(db, "patient_reports", ids, {"status": {"$in": list(ESCALATABLE_STATUSES)}},
+                           {"status": ReportStatus.HIGH_PRIORITY.value})
+    if STATS_COUNTERS_ENABLED:
+        changes = Counter({ReportStatus.HIGH_PRIORITY.value: len(affected)})
+        changes.subtract(report["status"] for report in affected)
+        await report_stats.increment_counts(db, "patient_reports", changes)
+    await rollups.record_status_changes(
+        db, "patient_reports", ((report, report["status"], ReportStatus.HIGH_PRIORITY) for report in affected))
+    await collections_changed("patient_reports")
+    return ids
+
+# Spatial hotspots, kept per worker and refreshed from MongoDB
+hotspot_index = hotspots.HotspotIndex()
+
+# Bookkeeping shared by every path that writes reports
+async def reports_inserted(collection: str, reports: list) -> set:
+    """Update derived state after reports are stored; returns ids escalated to high priority."""
+    if STATS_COUNTERS_ENABLED:
+        await report_stats.increment_counts(db, collection, Counter(report.status.value for report in reports))
+    documents = [report.dict() for report in reports]
+    await rollups.record_reports(db, collection, documents)
+    hotspot_index.add_reports(collection, documents)
+    await collections_changed(collection)
+
+    escalated = set()
+    if collection == "patient_reports":
+        for report in reports:
+            signal = await outbreak_detector.record_case(
+                db, report.district, report.suspected_disease, report.report_date)
+            if signal:
+                escalated.update(await escalate_outbreak(signal))
+    return escalated
+
+# Batch ingestion for offline collectors
+def _validation_detail(exc: ValidationError) -> str:
+    return "; ".join(f"{'.'.join(str(p) for p in err['loc'])}: {err['msg']}" for err in exc.errors())
+
+async def store_reports(collection: str, reports: list) -> Tuple[Dict[int, dict], set]:
+    """Insert validated reports with one bulk write; returns write errors by position and escalated ids."""
+    if not reports:
+        return {}, set()
+    write_errors = {}
+    try:
+        documents = await report_documents(collection, reports)
+        await db[collection].insert_many(documents, ordered=False)
+    except BulkWriteError as exc:
+        write_errors = {err["index"]: err for err in exc.details["writeErrors"]}
+    created = [report for position, report in enumerate(reports) if position not in write_errors]
+    escalated = await reports_inserted(collection, created) if created else set()
+    return write_errors, escalated
+
+async def insert_batch(collection: str, model, items: List[Dict[str, Any]]) -> BatchResult:
+    if len(items) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=400, detail=f"Batch exceeds {MAX_BATCH_SIZE} items")
+
+    results = [None] * len(items)
+    valid = []  # (position in request, validated model)
+    for index, item in enumerate(items):
+        try:
+            valid.append((index, model(**item)))
+        except ValidationError as exc:
+            results[index] = BatchItemResult(index=index, id=item.get("id"), status="invalid",
+                                             detail=_validation_detail(exc))
+
+    write_errors, _ = await store_reports(collection, [report for _, report in valid])
+    for position, (index, report) in enumerate(valid):
+        error = write_errors.get(position)
+        if error is None:
+            results[index] = BatchItemResult(index=index, id=report.id, status="created")
+        elif error["code"] == DUPLICATE_KEY_ERROR:
+            results[index] = BatchItemResult(index=index, id=report.id, status="duplicate")
+        else:
+            results[index] = BatchItemResult(index=index, id=report.id, status="error", detail=error.get("errmsg"))
+
+    statuses = Counter(result.status for result in results)
+    return BatchResult(
+        created=statuses["created"],
+        duplicates=statuses["duplicate"],
+        failed=statuses["invalid"] + statuses["error"],
+        results=results,
+    )
+
+# Single submissions, optionally group-committed
+async def flush_reports(collection: str, reports: list) -> list:
+    write_errors, escalated = await store_reports(collection, reports)
+    return [(write_errors.get(position), report.id in escalated) for position, report in enumerate(reports)]
+
+ingest = ingest_buffer.WriteBehindBuffer(flush_reports)
+
+async def ingest_report(collection: str, report) -> bool:
+    """Store one submitted report; returns True if it was escalated to high priority."""
+    if not INGEST_GROUP_COMMIT:
+        report_dict, = await report_documents(collection, [report])
+        try:
+            await db[collection].insert_one(report_dict)
+        except DuplicateKeyError:
+            raise HTTPException(status_code=409, detail="Report already exists")
+        return report.id in await reports_inserted(collection, [report])
+    try:
+        outcome = await ingest.submit(collection, report)
+    except ingest_buffer.BufferClosed:
+        raise HTTPException(status_code=503, detail="Report ingestion is shutting down")
+    if outcome is None:
+        # Acknowledged on queueing (INGEST_ACK=immediate); triage happens at flush
+        return False
+    error, escalated = outcome
+    if error is not None:
+        if error["code"] == DUPLICATE_KEY_ERROR:
+            raise HTTPException(status_code=409, detail="Report already exists")
+        raise HTTPException(status_code=500, detail=error.get("errmsg"))
+    return escalated
 
 # Water Quality Reports
 @api_router.post("/water-reports", response_model=WaterQualityReport)
 async def create_water_report(report: WaterQualityReport):
-    report_dict = report.dict()
-    await db.water_reports.insert_one(report_dict)
+    await ingest_report("water_reports", report)
     return report
 
+@api_router.post("/water-reports/batch", response_model=BatchResult)
+async def create_water_reports_batch(reports: List[Dict[str, Any]]):
+    return await insert_batch("water_reports", WaterQualityReport, reports)
+
 @api_router.get("/water-reports", response_model=List[WaterQualityReport])
-async def get_water_reports(limit: int = 50):
-    reports = await db.water_reports.find().sort("created_at", -1).limit(limit).to_list(length=limit)
-    return [WaterQualityReport(**report) for report in reports]
+async def get_water_reports(limit: int = PAGE_LIMIT, cursor: Optional[str] = None,
+                            format: ListFormat = ListFormat.JSON, fields: Optional[str] = None):
+    return await list_page("water_reports", WaterQualityReport, limit, cursor, format, fields)
+
+@api_router.get("/water-reports/high-risk", response_model=List[WaterQualityReport])
+async def get_high_risk_water_reports(limit: int = PAGE_LIMIT, min_score: float = water_risk.REVIEW_SCORE,
+                                      fields: Optional[str] = None):
+    reports = await db.water_reports.find(
+        {"risk_score": {"$gte": min_score}}, field_projection(WaterQualityReport, fields)
+    ).sort([("risk_score", -1), ("created_at", -1)]).limit(limit).to_list(length=limit)
+    return ORJSONResponse(reports)
 
 @api_router.get("/water-reports/{report_id}", response_model=WaterQualityReport)
-async def get_water_report(report_id: str):
-    report = await db.water_reports.find_one({"id": report_id})
+async def get_water_report(report_id: str, fields: Optional[str] = None):
+    report = await db.water_reports.find_one({"id": report_id}, field_projection(WaterQualityReport, fields))
     if not report:
         raise HTTPException(status_code=404, detail="Report not found")
-    return WaterQualityReport(**report)
+    return ORJSONResponse(report)
 
 # Patient Reports
 @api_router.post("/patient-reports", response_model=PatientReport)
 async def create_patient_report(report: PatientReport):
-    report_dict = report.dict()
-    await db.patient_reports.insert_one(report_dict)
+    if await ingest_report("patient_reports", report):
+        report.status = ReportStatus.HIGH_PRIORITY
     return report
 
+@api_router.post("/patient-reports/batch", response_model=BatchResult)
+async def create_patient_reports_batch(reports: List[Dict[str, Any]]):
+    return await insert_batch("patient_reports", PatientReport, reports)
+
 @api_router.get("/patient-reports", response_model=List[PatientReport])
-async def get_patient_reports(limit: int = 50):
-    reports = await db.patient_reports.find().sort("created_at", -1).limit(limit).to_list(length=limit)
-    return [PatientReport(**report) for report in reports]
+async def get_patient_reports(limit: int = PAGE_LIMIT, cursor: Optional[str] = None,
+                              format: ListFormat = ListFormat.JSON, fields: Optional[str] = None):
+    return await list_page("patient_reports", PatientReport, limit, cursor, format, fields)
+
+# Live feed
+live = live_feed.LiveFeed()
+
+@api_router.get("/live")
+async def stream_live_feed(last_event_id: Optional[str] = None,
+                           last_event_id_header: Optional[str] = Header(None, alias="Last-Event-ID")):
+    if not LIVE_FEED_ENABLED or not live.available:
+        raise HTTPException(status_code=503, detail="Live feed is not available")
+    return StreamingResponse(
+        live.subscribe(last_event_id_header or last_event_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+# Water-quality risk profile
+@api_router.get("/risk-profile")
+async def get_risk_profile():
+    await risk_scorer.current(db)
+    return {**risk_scorer.settings(), "available_profiles": sorted(water_risk.PROFILES)}
+
+@api_router.put("/risk-profile", status_code=202)
+async def update_risk_profile(update: RiskProfileUpdate, background_tasks: BackgroundTasks):
+    overrides = {parameter: fields.model_dump(exclude_unset=True) for parameter, fields in update.overrides.items()}
+    try:
+        # Checked against the profile's thresholds before anything is saved
+        profile = await risk_scorer.configure(db, update.profile, overrides)
+    except (ValueError, TypeError) as exc:
+        raise HTTPException(status_code=422, detail=str(exc))
+    # Existing reports are rescored against the new thresholds after responding
+    background_tasks.add_task(rescore_water_reports, profile)
+    return {**risk_scorer.settings(), "rescoring": True}
+
+# Outbreak alerts
+@api_router.get("/alerts")
+async def get_alerts(district: Optional[str] = None, days: int = QueryParam(7, ge=1, le=outbreak.MAX_ALERT_DAYS),
+                     limit: int = QueryParam(100, ge=1, le=pagination.MAX_PAGE)):
+    since = (datetime.utcnow().date() - timedelta(days=days - 1)).isoformat()
+    query = {"day": {"$gte": since}}
+    if district:
+        query["district"] = district
+    alerts = await db[outbreak.ALERTS_COLLECTION].find(query, {"_id": 0}).sort(
+        [("day", -1), ("cases", -1)]
+    ).limit(limit).to_list(length=limit)
+    return ORJSONResponse(alerts)
+
+# Report status changes
+async def update_report_status(collection: str, report_id: str, status: ReportStatus):
+    previous = await db[collection].find_one_and_update(
+        {"id": report_id},
+        {"$set": {"status": status.value, **await sync.stamp(db)}},
+        projection={"_id": 0, "status": 1, **rollups.key_fields(collection)},
+    )
+    if not previous:
+        raise HTTPException(status_code=404, detail="Report not found")
+    if STATS_COUNTERS_ENABLED:
+        await report_stats.record_status_change(db, collection, previous["status"], status)
+    await rollups.record_status_changes(db, collection, [(previous, previous["status"], status)])
+    await collections_changed(collection)
+    return {"id": report_id, "status": status.value}
+
+@api_router.put("/water-reports/{report_id}/status")
+async def update_water_report_status(report_id: str, update: StatusUpdate):
+    return await update_report_status("water_reports", report_id, update.status)
+
+@api_router.put("/patient-reports/{report_id}/status")
+async def update_patient_report_status(report_id: str, update: StatusUpdate):
+    return await update_report_status("patient_reports", report_id, update.status)
 
 # Report Statistics
 @api_router.get("/report-stats", response_model=ReportStats)
-async def get_report_stats():
-    # Count water reports
-    water_submitted = await db.water_reports.count_documents({"status": "submitted"})
-    water_processed = await db.water_reports.count_documents({"status": "processed"})
-    water_under_review = await db.water_reports.count_documents({"status": "under_review"})
-    water_high_priority = await db.water_reports.count_documents({"status": "high_priority"})
-    
-    # Count patient reports
-    patient_submitted = await db.patient_reports.count_documents({"status": "submitted"})
-    patient_processed = await db.patient_reports.count_documents({"status": "processed"})
-    patient_under_review = await db.patient_reports.count_documents({"status": "under_review"})
-    patient_high_priority = await db.patient_reports.count_documents({"status": "high_priority"})
-    
-    return ReportStats(
-        total_submitted=water_submitted + patient_submitted,
-        total_processed=water_processed + patient_processed,
-        under_review=water_under_review + patient_under_review,
-        high_priority=water_high_priority + patient_high_priority
+async def get_report_stats(request: Request):
+    etag = await http_cache.version_etag(db, "report-stats", report_stats.REPORT_COLLECTIONS)
+    if http_cache.is_fresh(request, etag):
+        return http_cache.not_modified(etag, http_cache.REVALIDATE)
+    # Keyed on the ETag too: another worker's write rotates it before this worker's cache hears of it
+    counts = await cache.get_or_compute(
+        "report-stats", {"etag": etag}, report_stats.REPORT_COLLECTIONS,
+        lambda: report_stats.get_status_counts(db, use_counters=STATS_COUNTERS_ENABLED),
+    )
+    stats = ReportStats(
+        total_submitted=counts["submitted"],
+        total_processed=counts["processed"],
+        under_review=counts["under_review"],
+        high_priority=counts["high_priority"]
+    )
+    return http_cache.json_response(request, stats.dict(), http_cache.REVALIDATE, etag=etag)
+
+# District analytics, answered from the daily rollups
+@api_router.get("/analytics/district-trends")
+async def get_district_trends(request: Request, source: TrendSource = TrendSource.WATER,
+                              start: Optional[date] = None, end: Optional[date] = None,
+                              district: Optional[str] = None, category: Optional[str] = None):
+    end = end or datetime.utcnow().date()
+    start = start or end - timedelta(days=DEFAULT_TREND_DAYS - 1)
+    if start > end:
+        raise HTTPException(status_code=400, detail="start must not be after end")
+    if (end - start).days >= MAX_TREND_DAYS:
+        raise HTTPException(status_code=400, detail=f"Range exceeds {MAX_TREND_DAYS} days")
+
+    collection = f"{source.value}_reports"
+    etag = await http_cache.version_etag(db, "district-trends", [collection])
+    if http_cache.is_fresh(request, etag):
+        return http_cache.not_modified(etag, http_cache.REVALIDATE)
+    districts = await rollups.district_trends(db, collection, start, end, district, category)
+    payload = {"source": source.value, "start": start.isoformat(), "end": end.isoformat(), "districts": districts}
+    return http_cache.json_response(request, payload, http_cache.REVALIDATE, etag=etag)
+
+# Bulk export for analysts
+EXPORT_MODELS = {"water_reports": WaterQualityReport, "patient_reports": PatientReport}
+
+@api_router.get("/export/{collection}")
+async def export_reports(collection: str, format: ExportFormat = ExportFormat.CSV,
+                         start: Optional[date] = None, end: Optional[date] = None,
+                         district: Optional[str] = None):
+    model = EXPORT_MODELS.get(collection)
+    if model is None:
+        raise HTTPException(status_code=404, detail="Unknown collection")
+    date_field, _ = rollups.SOURCES[collection]
+    query = export.export_filter(date_field, start, end, district)
+    cursor = db[collection].find(query, api_projection(model))
+    filename = f"{collection}-{datetime.utcnow():%Y%m%d}.{format.value}"
+    return StreamingResponse(
+        export.stream_export(cursor, model, format.value),
+        media_type=export.MEDIA_TYPES[format.value],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
     )
 
 # Recent Activity
 @api_router.get("/recent-activity")
-async def get_recent_activity(limit: int = 10):
-    # Get recent water reports
-    water_reports = await db.water_reports.find().sort("created_at", -1).limit(limit//2).to_list(length=limit//2)
-    
-    # Get recent patient reports
-    patient_reports = await db.patient_reports.find().sort("created_at", -1).limit(limit//2).to_list(length=limit//2)
-    
-    activities = []
-    
-    for report in water_reports:
-        activities.append({
-            "id": report["id"],
-            "type": "water_report",
-            "title": f"Water Quality Report - {report['location_name']}",
-            "location": f"{report['location_name']}, {report['district']}",
-            "status": report["status"],
-            "created_at": report["created_at"]
-        })
-    
-    for report in patient_reports:
-        activities.append({
-            "id": report["id"],
-            "type": "patient_report", 
-            "title": f"Patient Report - {report['suspected_disease']}",
-            "location": f"{report['location_name']}, {report['district']}",
-            "status": report["status"],
-            "created_at": report["created_at"]
-        })
-    
-    # Sort by created_at and return top activities
-    activities.sort(key=lambda x: x["created_at"], reverse=True)
-    return activities[:limit]
+async def get_recent_activity(limit: int = QueryParam(10, ge=1, le=pagination.MAX_PAGE),
+                              cursor: Optional[str] = None):
+    async def compute():
+        activities = await activity_feed.recent_activity(db, limit, cursor)
+        return {"items": activities, "cursor": pagination.next_cursor(activities, limit)}
+
+    try:
+        page = await cache.get_or_compute("recent-activity", {"limit": limit, "cursor": cursor},
+                                          activity_feed.SOURCES, compute)
+    except pagination.InvalidCursor:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return ORJSONResponse(page["items"], headers={"X-Next-Cursor": page["cursor"]} if page["cursor"] else None)
 
 # FAQ
+faq_index = faq_search.FAQSearchIndex()
+faq_answers = faq_matcher.FAQMatcher()
+# How long a worker trusts its FAQ indexes before checking whether another worker changed the FAQs
+FAQ_INDEX_TTL_SECONDS = 30.0
+faq_version = None
+faq_checked_at = 0.0
+
+async def refresh_faq_indexes(force: bool = False):
+    """Rebuild the search index and matcher when the FAQs' version token has moved."""
+    global faq_version, faq_checked_at
+    if not force and time.monotonic() - faq_checked_at < FAQ_INDEX_TTL_SECONDS:
+        return
+    faq_checked_at = time.monotonic()
+    version = await http_cache.version_etag(db, "faqs", ["faqs"])
+    if version == faq_version and not force:
+        return
+    # API fields only: search results are the stored documents, which also hold sync stamps
+    faqs = await db.faqs.find({}, api_projection(FAQ)).to_list(length=None)
+    faq_index.build(faqs)
+    faq_answers.build(faqs)
+    faq_version = version
+
+async def seed_faqs():
+    # Upsert on question so concurrent workers starting together don't duplicate entries;
+    # the unique question index makes the losing upsert of a race fail instead of inserting
+    seeded = False
+    for faq_data in FAQ_DATA:
+        faq = FAQ(**faq_data)
+        document, = await sync.stamp_documents(db, [faq.dict()])
+        try:
+            result = await db.faqs.update_one({"question": faq.question}, {"$setOnInsert": document}, upsert=True)
+        except DuplicateKeyError:
+            continue
+        seeded = seeded or result.upserted_id is not None
+    if seeded:
+        await collections_changed("faqs")
+
 @api_router.get("/faqs", response_model=List[FAQ])
-async def get_faqs():
-    faqs = await db.faqs.find().to_list(length=100)
-    if not faqs:
-        # Initialize FAQ data if empty
-        for faq_data in FAQ_DATA:
-            faq = FAQ(**faq_data)
-            await db.faqs.insert_one(faq.dict())
-        
-        faqs = await db.faqs.find().to_list(length=100)
-    
-    return [FAQ(**faq) for faq in faqs]
+async def get_faqs(request: Request):
+    etag = await http_cache.version_etag(db, "faqs", ["faqs"])
+    if http_cache.is_fresh(request, etag):
+        return http_cache.not_modified(etag, http_cache.REVALIDATE)
+    faqs = await cache.get_or_compute(
+        "faqs", {"etag": etag}, ["faqs"], lambda: db.faqs.find({}, api_projection(FAQ)).to_list(length=100))
+    return http_cache.json_response(request, faqs, http_cache.REVALIDATE, etag=etag)
+
+@api_router.post("/faqs", response_model=FAQ)
+async def create_faq(faq: FAQ):
+    faq_dict, = await sync.stamp_documents(db, [faq.dict()])
+    try:
+        await db.faqs.insert_one(faq_dict)
+    except DuplicateKeyError:
+        raise HTTPException(status_code=409, detail="FAQ already exists")
+    await collections_changed("faqs")
+    await refresh_faq_indexes(force=True)
+    return faq
 
 @api_router.get("/faqs/search")
-async def search_faqs(q: str):
-    faqs = await db.faqs.find({
-        "$or": [
-            {"question": {"$regex": q, "$options": "i"}},
-            {"answer": {"$regex": q, "$options": "i"}}
-        ]
-    }).to_list(length=50)
-    return [FAQ(**faq) for faq in faqs]
+async def search_faqs(request: Request, q: str, limit: int = QueryParam(50, ge=1, le=pagination.MAX_PAGE)):
+    await refresh_faq_indexes()
+    return http_cache.json_response(request, faq_index.search(q, limit=limit), http_cache.REVALIDATE)
 
 # Queries
 @api_router.post("/queries", response_model=Query)
 async def create_query(query: Query):
-    query_dict = query.dict()
+    if query.status == faq_matcher.PENDING:
+        await refresh_faq_indexes()
+        match, = faq_answers.match([query.question])
+        for field, value in faq_matcher.answer_fields(match).items():
+            setattr(query, field, value)
+    query_dict, = await sync.stamp_documents(db, [query.dict()])
     await db.queries.insert_one(query_dict)
     return query
 
 @api_router.get("/queries", response_model=List[Query])
-async def get_queries(limit: int = 50):
-    queries = await db.queries.find().sort("created_at", -1).limit(limit).to_list(length=limit)
-    return [Query(**query) for query in queries]
+async def get_queries(limit: int = PAGE_LIMIT, cursor: Optional[str] = None, format: ListFormat = ListFormat.JSON,
+                      fields: Optional[str] = None):
+    return await list_page("queries", Query, limit, cursor, format, fields)
 
 # Map locations - get reports with coordinates
+WATER_LOCATION_FIELDS = {"_id": 0, "id": 1, "location_name": 1, "latitude": 1, "longitude": 1,
+                         "status": 1, "water_source": 1, "ph_level": 1}
+PATIENT_LOCATION_FIELDS = {"_id": 0, "id": 1, "suspected_disease": 1, "latitude": 1, "longitude": 1,
+                           "status": 1, "patient_name": 1, "age": 1}
+
+MAP_COLLECTIONS = ("water_reports", "patient_reports")
+
+def water_location(report):
+    return {
+        "id": report["id"],
+        "type": "water_report",
+        "title": f"Water Quality - {report['location_name']}",
+        "latitude": report["latitude"],
+        "longitude": report["longitude"],
+        "status": report["status"],
+        "description": f"Water source: {report['water_source']}, pH: {report.get('ph_level', 'N/A')}"
+    }
+
+def patient_location(report):
+    return {
+        "id": report["id"],
+        "type": "patient_report",
+        "title": f"Health Alert - {report['suspected_disease']}",
+        "latitude": report["latitude"],
+        "longitude": report["longitude"],
+        "status": report["status"],
+        "description": f"Patient: {report['patient_name']}, Age: {report['age']}"
+    }
+
+async def find_locations(query: dict, limit: int):
+    water_reports = await db.water_reports.find(query, WATER_LOCATION_FIELDS).to_list(length=limit)
+    patient_reports = await db.patient_reports.find(query, PATIENT_LOCATION_FIELDS).to_list(length=limit)
+    return [water_location(r) for r in water_reports] + [patient_location(r) for r in patient_reports]
+
 @api_router.get("/map-locations")
-async def get_map_locations():
-    # Get water reports with coordinates
-    water_reports = await db.water_reports.find({
-        "latitude": {"$exists": True, "$ne": None},
-        "longitude": {"$exists": True, "$ne": None}
-    }).to_list(length=200)
-    
-    # Get patient reports with coordinates  
-    patient_reports = await db.patient_reports.find({
-        "latitude": {"$exists": True, "$ne": None},
-        "longitude": {"$exists": True, "$ne": None}
-    }).to_list(length=200)
-    
-    locations = []
-    
-    for report in water_reports:
-        locations.append({
-            "id": report["id"],
-            "type": "water_report",
-            "title": f"Water Quality - {report['location_name']}",
-            "latitude": report["latitude"],
-            "longitude": report["longitude"],
-            "status": report["status"],
-            "description": f"Water source: {report['water_source']}, pH: {report.get('ph_level', 'N/A')}"
-        })
-    
-    for report in patient_reports:
-        locations.append({
-            "id": report["id"],
-            "type": "patient_report",
-            "title": f"Health Alert - {report['suspected_disease']}",
-            "latitude": report["latitude"],
-            "longitude": report["longitude"],
-            "status": report["status"],
-            "description": f"Patient: {report['patient_name']}, Age: {report['age']}"
-        })
-    
-    return locations
-
-# Include the router in the main app
-app.include_router(api_router)
-
-app.add_middleware(
-    CORSMiddleware,
-    allow_credentials=True,
-    allow_origins=["*"],
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+async def get_map_locations(min_lat: Optional[float] = None, min_lng: Optional[float] = None,
+                            max_lat: Optional[float] = None, max_lng: Optional[float] = None,
+                            zoom: Optional[int] = None):
+    viewport = (min_lat, min_lng, max_lat, max_lng)
+    params = {"viewport": viewport, "zoom": zoom}
+    if zoom is None and all(v is None for v in viewport):
+        # Unfiltered pin list, as used by the current mobile home screen
+        return await cache.get_or_compute("map-locations", params, MAP_COLLECTIONS, lambda: find_locations({
+            "latitude": {"$exists": True, "$ne": None},
+            "longitude": {"$exists": True, "$ne": None}
+        }, limit=200))
+
+    if zoom is None or any(v is None for v in viewport):
+        raise HTTPException(status_code=400, detail="min_lat, min_lng, max_lat, max_lng and zoom are required together")
+    if not 0 <= zoom <= 22 or min_lat > max_lat or min_lng > max_lng:
+        raise HTTPException(status_code=400, detail="Invalid viewport")
+
+    bbox = map_clusters.BoundingBox(min_lat, min_lng, max_lat, max_lng)
+
+    async def compute():
+        if zoom >= map_clusters.POINTS_MIN_ZOOM:
+            points = await find_locations(bbox.to_filter(), limit=map_clusters.MAX_VIEWPORT_POINTS)
+            return {"zoom": zoom, "clusters": [], "points": points}
+        clusters = await map_clusters.cluster_viewport(db, bbox, zoom)
+        return {"zoom": zoom, "clusters": clusters, "points": []}
+
+    return await cache.get_or_compute("map-locations", params, MAP_COLLECTIONS, compute)
+
+# Read-only access to reports moved to the Parquet archive
+@api_router.get("/archive/{collection}/partitions")
+async def get_archive_partitions(collection: str):
+    if collection not in EXPORT_MODELS:
+        raise HTTPException(status_code=404, detail="Unknown collection")
+    return await asyncio.to_thread(archive.partition_summary, collection)
+
+@api_router.get("/archive/{collection}")
+async def get_archived_reports(collection: str, district: Optional[str] = None, start: Optional[date] = None,
+                               end: Optional[date] = None, status: Optional[ReportStatus] = None,
+                               limit: int = QueryParam(100, ge=1, le=archive.MAX_ARCHIVE_RESULTS)):
+    if collection not in EXPORT_MODELS:
+        raise HTTPException(status_code=404, detail="Unknown collection")
+    if start and end and start > end:
+        raise HTTPException(status_code=400, detail="start must not be after end")
+    reports = await asyncio.to_thread(archive.read_reports, collection, district, start, end,
+                                      status.value if status else None, limit)
+    return ORJSONResponse(reports)
+
+# Reports near a point, served by the 2dsphere index
+NEARBY_SOURCES = {
+    "water_reports": (WATER_LOCATION_FIELDS, water_location),
+    "patient_reports": (PATIENT_LOCATION_FIELDS, patient_location),
+}
+
+@api_router.get("/reports/nearby")
+async def get_nearby_reports(lat: float, lng: float, radius_km: float = 5.0, type: NearbyType = NearbyType.ALL,
+                             days: Optional[int] = QueryParam(None, ge=1), status: Optional[ReportStatus] = None,
+                             limit: int = QueryParam(100, ge=1, le=geo.MAX_NEARBY_RESULTS)):
+    if geo.point(lat, lng) is None:
+        raise HTTPException(status_code=400, detail="Invalid coordinates")
+    if not 0 < radius_km <= geo.MAX_RADIUS_KM:
+        raise HTTPException(status_code=400, detail=f"radius_km must be between 0 and {geo.MAX_RADIUS_KM:g}")
+    collections = list(NEARBY_SOURCES) if type == NearbyType.ALL else [f"{type.value}_reports"]
+
+    async def search(collection):
+        fields, formatter = NEARBY_SOURCES[collection]
+        date_field, _ = rollups.SOURCES[collection]
+        query = {}
+        if days is not None:
+            query[date_field] = {"$gte": datetime.utcnow() - timedelta(days=days)}
+        if status is not None:
+            query["status"] = status.value
+        reports = await geo.nearby(db, collection, lat, lng, radius_km, query, fields, limit)
+        return [{**formatter(r), "distance_km": round(r["distance_m"] / 1000, 3)} for r in reports]
+
+    results = [r for found in await asyncio.gather(*(search(c) for c in collections)) for r in found]
+    results.sort(key=lambda r: r["distance_km"])
+    return results[:limit]
+
+@api_router.get("/hotspots")
+async def get_hotspots(co_located_only: bool = False,
+                       limit: int = QueryParam(100, ge=1, le=hotspots.MAX_HOTSPOTS)):
+    await hotspot_index.refresh(db)
+    found = hotspot_index.hotspots()
+    if co_located_only:
+        found = [hotspot for hotspot in found if hotspot["co_located"]]
+    return {
+        "window_days": hotspot_index.window_days,
+        "cell_km": hotspot_index.cell_km,
+        "min_reports": hotspot_index.min_reports,
+        "total": len(found),
+        "hotspots": found[:limit],
+    }
+
+# Delta sync for the offline-first app
+SYNC_MODELS = {"water_reports": WaterQualityReport, "patient_reports": PatientReport, "queries": Query, "faqs": FAQ}
+
+@api_router.get("/sync")
+async def sync_changes(since: Optional[str] = None,
+                       limit: int = QueryParam(sync.DEFAULT_LIMIT, ge=1, le=sync.MAX_LIMIT)):
+    projections = {collection: api_projection(model) for collection, model in SYNC_MODELS.items()}
+    try:
+        return ORJSONResponse(await sync.changes_since(db, projections, since, limit))
+    except sync.InvalidToken:
+        raise HTTPException(status_code=400, detail="Invalid sync token")
+
+# Prometheus scrape target
+@api_router.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    body, content_type = metrics.render()
+    return Response(content=body, media_type=content_type)
+
+# Health probes
+ready = False
+
+@api_router.get("/health/live", include_in_schema=False)
+async def liveness():
+    # Answered from the event loop alone; a MongoDB outage must not get workers restarted
+    return {"status": "alive"}
+
+@api_router.get("/health/ready", include_in_schema=False)
+async def readiness():
+    if not ready or not await database.ping(db, READINESS_TIMEOUT_SECONDS):
+        return ORJSONResponse({"status": "unavailable"}, status_code=503)
+    return {"status": "ready"}
 
 # Configure logging
 logging.basicConfig(
@@ -391,6 +963,84 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-@app.on_event("shutdown")
+async def connect_db():
+    global client, db
+    client = database.create_client(mongo_settings, event_listeners=[metrics.CommandMetrics()])
+    db = database.get_database(client, mongo_settings)
+    await database.warm_up(db, mongo_settings.min_pool_size)
+
+async def bootstrap_indexes():
+    await indexes.ensure_indexes(db)
+    await indexes.verify_query_plans(db)
+
+async def bootstrap_risk_scorer():
+    await risk_scorer.load(db)
+    # Reports stored before scoring existed would otherwise be served without risk fields
+    unscored = {"risk_profile": {"$exists": False}}
+    if await db.water_reports.find_one(unscored, {"_id": 1}):
+        await rescore_water_reports(risk_scorer.profile, unscored)
+
+async def bootstrap_outbreak_detector():
+    if not await db[outbreak.COUNTS_COLLECTION].find_one({}) and await db.patient_reports.find_one({}):
+        await outbreak.rebuild_counts(db)
+    await outbreak_detector.load(db, datetime.utcnow().date())
+
+async def bootstrap_sync():
+    # Records written before sync existed have no sequence number yet
+    if any([await db[collection].find_one({sync.SEQ_FIELD: {"$exists": False}}, {"_id": 1})
+            for collection in sync.SYNCED_COLLECTIONS]):
+        await sync.backfill(db, sync.SYNCED_COLLECTIONS)
+
+async def start_ingest():
+    if INGEST_GROUP_COMMIT:
+        ingest.start(report_stats.REPORT_COLLECTIONS)
+
+async def start_live_feed():
+    if LIVE_FEED_ENABLED:
+        live.start(db)
+
+async def bootstrap_faqs():
+    await seed_faqs()
+    await refresh_faq_indexes(force=True)
+
+async def mark_ready():
+    global ready
+    ready = True
+
 async def shutdown_db_client():
-    client.close()
\ No newline at end of file
+    global ready
+    ready = False
+    # Queued reports must reach MongoDB before the client closes
+    await ingest.close()
+    await live.stop()
+    # None when startup failed before connect_db ran
+    if client is not None:
+        client.close()
+
+def create_app() -> FastAPI:
+    """Build the application; each worker process calls this and connects on startup."""
+    app = FastAPI(default_response_class=ORJSONResponse)
+    app.include_router(api_router)
+
+    app.add_middleware(
+        CORSMiddleware,
+        allow_credentials=True,
+        allow_origins=["*"],
+        allow_methods=["*"],
+        allow_headers=["*"],
+        expose_headers=["X-Next-Cursor", "ETag"],
+    )
+
+    app.add_middleware(compression.CompressionMiddleware)
+
+    # Outermost, so the timings include compression and response sizes are what went on the wire
+    app.add_middleware(metrics.MetricsMiddleware)
+
+    for hook in (connect_db, bootstrap_indexes, bootstrap_risk_scorer, bootstrap_outbreak_detector,
+                 bootstrap_sync, start_ingest, start_live_feed, bootstrap_faqs, mark_ready):
+        app.add_event_handler("startup", hook)
+    app.add_event_handler("shutdown", shutdown_db_client)
+    return app
+
+# Single-process entry point: `uvicorn server:app`; see launch.py for several workers
+app = create_app()
@@ -0,0 +1,182 @@
+"""Delta sync for offline clients.
+
+Every write to a synced collection stamps the documents it touches with the
+next values of one global modification sequence (``sync_seq``), reserved in
+blocks from the ``sync_sequence`` counter together with the server time of
+the reservation (``sync_at``). Removed records leave a tombstone carrying
+their own sequence number. A sync token holds the sequence a client has
+seen, so a refresh reads only the changes after it, by index, across all
+collections.
+
+A writer reserves numbers before its write commits, so a change may become
+visible after a higher-numbered one. Tokens therefore only advance to
+changes reserved more than ``SYNC_SETTLE_SECONDS`` ago; newer changes are
+returned as well but sent again on the next sync, and clients apply them
+idempotently by id. Tombstones expire after ``SYNC_TOMBSTONE_DAYS``, and an
+older token gets a full resync marked ``reset``.
+"""
+import base64
+import json
+import os
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from pymongo import ReturnDocument, UpdateOne
+
+SYNCED_COLLECTIONS = ("water_reports", "patient_reports", "queries", "faqs")
+SEQUENCE_COLLECTION = "sync_sequence"
+TOMBSTONES_COLLECTION = "sync_tombstones"
+SEQ_FIELD = "sync_seq"
+AT_FIELD = "sync_at"
+
+SYNC_SETTLE_SECONDS = float(os.environ.get('SYNC_SETTLE_SECONDS', '30'))
+SYNC_TOMBSTONE_DAYS = int(os.environ.get('SYNC_TOMBSTONE_DAYS', '90'))
+DEFAULT_LIMIT = 500
+MAX_LIMIT = 5000
+BACKFILL_CHUNK_SIZE = 1000
+
+
+class InvalidToken(ValueError):
+    pass
+
+
+def encode_token(seq: int, issued_at: datetime) -> str:
+    raw = json.dumps([seq, issued_at.isoformat()], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_token(token: str) -> Tuple[int, datetime]:
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        seq, issued_at = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return int(seq), datetime.fromisoformat(issued_at)
+    except (ValueError, TypeError) as exc:
+        raise InvalidToken("Invalid sync token") from exc
+
+
+async def reserve(db, count: int = 1) -> Tuple[int, datetime]:
+    """Reserve ``count`` consecutive sequence numbers; returns the first one and the reservation time."""
+    counter = await db[SEQUENCE_COLLECTION].find_one_and_update(
+        {"_id": "changes"},
+        {"$inc": {"seq": count}, "$currentDate": {"at": True}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+    return counter["seq"] - count + 1, counter["at"]
+
+
+async def stamp(db) -> dict:
+    """Sequence fields to ``$set`` on the single document changed by one update.
+
+    Never share one stamp across an ``update_many``: a sync page may end inside
+    a run of equal sequence numbers, and the rest of the run would be skipped.
+    """
+    seq, at = await reserve(db)
+    return {SEQ_FIELD: seq, AT_FIELD: at}
+
+
+async def stamp_documents(db, documents: List[dict]) -> List[dict]:
+    """Give each new document its own sequence number; one round trip for the whole batch."""
+    if documents:
+        first, at = await reserve(db, len(documents))
+        for offset, document in enumerate(documents):
+            document[SEQ_FIELD], document[AT_FIELD] = first + offset, at
+    return documents
+
+
+async def update_each(db, collection: str, ids: List[str], query: dict, fields: dict) -> int:
+    """``$set`` fields on the documents with these ids that still match ``query``.
+
+    Each document gets its own sequence number, in one bulk write. Returns the
+    number of documents updated.
+    """
+    if not ids:
+        return 0
+    first, at = await reserve(db, len(ids))
+    result = await db[collection].bulk_write([
+        UpdateOne({"id": record_id, **query}, {"$set": {**fields, SEQ_FIELD: first + offset, AT_FIELD: at}})
+        for offset, record_id in enumerate(ids)
+    ], ordered=False)
+    return result.modified_count
+
+
+async def record_deletions(db, collection: str, ids: List[str]):
+    if not ids:
+        return
+    first, at = await reserve(db, len(ids))
+    await db[TOMBSTONES_COLLECTION].insert_many([
+        {"collection": collection, "id": record_id, SEQ_FIELD: first + offset, AT_FIELD: at}
+        for offset, record_id in enumerate(ids)
+    ])
+
+
+async def backfill(db, collections: Iterable[str], chunk_size: int = BACKFILL_CHUNK_SIZE) -> Dict[str, int]:
+    """Stamp documents written before sync existed; returns documents stamped per collection."""
+    stamped = {}
+    for collection in collections:
+        stamped[collection] = 0
+        while True:
+            ids = [doc["_id"] for doc in await db[collection].find(
+                {SEQ_FIELD: {"$exists": False}}, {"_id": 1}).limit(chunk_size).to_list(length=chunk_size)]
+            if not ids:
+                break
+            first, at = await reserve(db, len(ids))
+            # Another worker may be stamping the same documents; the filter keeps the first stamp
+            await db[collection].bulk_write([
+                UpdateOne({"_id": _id, SEQ_FIELD: {"$exists": False}},
+                          {"$set": {SEQ_FIELD: first + offset, AT_FIELD: at}})
+                for offset, _id in enumerate(ids)
+            ], ordered=False)
+            stamped[collection] += len(ids)
+    return stamped
+
+
+async def changes_since(db, projections: Dict[str, dict], token: Optional[str], limit: int = DEFAULT_LIMIT) -> dict:
+    """Changes after ``token`` across the synced collections, oldest first, with the token to send next."""
+    now = datetime.utcnow()
+    since, reset = 0, True
+    if token:
+        since, issued_at = decode_token(token)
+        # Deletions older than the tombstones' lifetime can no longer be replayed
+        reset = issued_at < now - timedelta(days=SYNC_TOMBSTONE_DAYS)
+        if reset:
+            since = 0
+    limit = max(1, min(limit, MAX_LIMIT))
+    after = {SEQ_FIELD: {"$gt": since}}
+
+    page: List[Tuple[int, str, dict]] = []
+    for collection, projection in projections.items():
+        documents = await db[collection].find(after, {**projection, SEQ_FIELD: 1, AT_FIELD: 1}).sort(
+            SEQ_FIELD, 1).limit(limit + 1).to_list(length=limit + 1)
+        page.extend((doc[SEQ_FIELD], collection, doc) for doc in documents)
+    if not reset:
+        tombstones = await db[TOMBSTONES_COLLECTION].find(after, {"_id": 0}).sort(
+            SEQ_FIELD, 1).limit(limit + 1).to_list(length=limit + 1)
+        page.extend((doc[SEQ_FIELD], TOMBSTONES_COLLECTION, doc) for doc in tombstones)
+    page.sort(key=lambda change: change[0])
+    truncated = len(page) > limit
+    page = page[:limit]
+
+    settled = now - timedelta(seconds=SYNC_SETTLE_SECONDS)
+    next_seq, settling = since, False
+    changes = {collection: [] for collection in projections}
+    deleted = {collection: [] for collection in projections}
+    for seq, collection, doc in page:
+        reserved_at = doc.pop(AT_FIELD)
+        doc.pop(SEQ_FIELD)
+        # The token covers the settled prefix of the page only
+        settling = settling or reserved_at > settled
+        if not settling:
+            next_seq = seq
+        if collection == TOMBSTONES_COLLECTION:
+            deleted.setdefault(doc["collection"], []).append(doc["id"])
+        else:
+            changes[collection].append(doc)
+    return {
+        "token": encode_token(next_seq, now),
+        # Ask again right away; a page of still-settling changes can't advance the token
+        "has_more": truncated and next_seq > since,
+        "reset": reset,
+        "changes": changes,
+        "deleted": deleted,
+    }
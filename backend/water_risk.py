@@ -0,0 +1,276 @@
+"""Water-quality risk scoring against drinking-water threshold profiles.
+
+Each parameter has an acceptable range and a limit beyond it; a reading's
+severity grows linearly from 0 at the edge of the acceptable range to 1 at the
+limit. A report's risk score (0-100) is its worst weighted severity. Scoring
+works on an (n_reports, n_parameters) matrix, so a single report and a chunk
+of thousands go through the same vectorized code.
+"""
+import asyncio
+import time
+from collections import Counter
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+from pymongo import UpdateOne
+
+import sync
+
+PARAMETERS = ("ph_level", "turbidity", "chlorine", "e_coli", "total_coliform", "tds")
+
+SETTINGS_COLLECTION = "settings"
+SETTINGS_ID = "water_risk"
+DEFAULT_PROFILE = "bis_10500"
+
+# Score bands that drive automatic triage
+REVIEW_SCORE = 30.0
+HIGH_PRIORITY_SCORE = 70.0
+
+RESCORE_CHUNK_SIZE = 5000
+# Status moves of a chunk in flight at once; keep well below the connection pool size
+RESCORE_CONCURRENCY = 16
+# How long a worker trusts its copy of the active profile before re-reading it
+PROFILE_TTL_SECONDS = 30.0
+
+
+class Threshold(NamedTuple):
+    acceptable_min: Optional[float]
+    acceptable_max: Optional[float]
+    limit_min: Optional[float]
+    limit_max: Optional[float]
+    weight: float
+
+
+PROFILES: Dict[str, Dict[str, Threshold]] = {
+    # IS 10500:2012 acceptable limits, with the permissible limit where one exists
+    "bis_10500": {
+        "ph_level": Threshold(6.5, 8.5, 5.5, 9.5, 0.6),
+        "turbidity": Threshold(None, 1.0, None, 5.0, 0.7),
+        "chlorine": Threshold(0.2, 1.0, 0.0, 4.0, 0.6),
+        "e_coli": Threshold(None, 0.0, None, 1.0, 1.0),
+        "total_coliform": Threshold(None, 0.0, None, 1.0, 1.0),
+        "tds": Threshold(None, 500.0, None, 2000.0, 0.5),
+    },
+    # WHO Guidelines for Drinking-water Quality
+    "who": {
+        "ph_level": Threshold(6.5, 8.5, 5.5, 9.5, 0.6),
+        "turbidity": Threshold(None, 1.0, None, 4.0, 0.7),
+        "chlorine": Threshold(0.2, 0.5, 0.0, 5.0, 0.6),
+        "e_coli": Threshold(None, 0.0, None, 1.0, 1.0),
+        "total_coliform": Threshold(None, 0.0, None, 1.0, 1.0),
+        "tds": Threshold(None, 600.0, None, 1000.0, 0.5),
+    },
+}
+
+
+class RiskProfile:
+    """A threshold profile compiled into per-parameter arrays."""
+
+    def __init__(self, name: str, thresholds: Dict[str, Threshold]):
+        self.name = name
+        self.thresholds = thresholds
+        rows = [thresholds[p] for p in PARAMETERS]
+
+        def column(field, missing):
+            return np.array([missing if getattr(t, field) is None else getattr(t, field) for t in rows], dtype=float)
+
+        self.acceptable_min = column("acceptable_min", -np.inf)
+        self.acceptable_max = column("acceptable_max", np.inf)
+        with np.errstate(invalid="ignore"):
+            low_span = self.acceptable_min - column("limit_min", -np.inf)
+            high_span = column("limit_max", np.inf) - self.acceptable_max
+        # Spans only matter where the acceptable bound is finite; 1.0 keeps the rest harmless
+        self.low_span = np.where(np.isfinite(low_span) & (low_span > 0), low_span, 1.0)
+        self.high_span = np.where(np.isfinite(high_span) & (high_span > 0), high_span, 1.0)
+        self.weights = np.array([t.weight for t in rows], dtype=float)
+
+    def severities(self, values: np.ndarray) -> np.ndarray:
+        """Weighted per-parameter severities; NaN (not measured) counts as compliant."""
+        with np.errstate(invalid="ignore"):
+            below = np.where(values < self.acceptable_min, (self.acceptable_min - values) / self.low_span, 0.0)
+            above = np.where(values > self.acceptable_max, (values - self.acceptable_max) / self.high_span, 0.0)
+        return np.clip(np.maximum(below, above), 0.0, 1.0) * self.weights
+
+    def score(self, values: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Return (risk scores 0-100, boolean exceedance mask) for an (n, len(PARAMETERS)) matrix."""
+        severities = self.severities(values)
+        return np.round(100.0 * severities.max(axis=1, initial=0.0), 1), severities > 0
+
+
+def validate_threshold(parameter: str, t: Threshold):
+    """Reject thresholds that would not score sensibly; raises ValueError."""
+    for field, value in t._asdict().items():
+        if value is not None and not (isinstance(value, (int, float)) and np.isfinite(value)):
+            raise ValueError(f"{parameter}.{field} must be a finite number")
+    if t.weight is None or not 0 <= t.weight <= 1:
+        raise ValueError(f"{parameter}.weight must be between 0 and 1")
+    # A bound without its limit (or the reverse) leaves the severity undefined
+    if (t.acceptable_min is None) != (t.limit_min is None) or (t.acceptable_max is None) != (t.limit_max is None):
+        raise ValueError(f"{parameter}: each acceptable bound and its limit must both be set or both be null")
+    if ((t.limit_min is not None and t.limit_min >= t.acceptable_min)
+            or (t.limit_max is not None and t.limit_max <= t.acceptable_max)
+            or (None not in (t.acceptable_min, t.acceptable_max) and t.acceptable_min > t.acceptable_max)):
+        raise ValueError(f"{parameter}: thresholds must satisfy "
+                         "limit_min < acceptable_min <= acceptable_max < limit_max")
+
+
+def build_profile(name: str, overrides: Optional[Dict[str, dict]] = None) -> RiskProfile:
+    if name not in PROFILES:
+        raise ValueError(f"Unknown risk profile: {name}")
+    thresholds = dict(PROFILES[name])
+    for parameter, fields in (overrides or {}).items():
+        if parameter not in thresholds:
+            raise ValueError(f"Unknown water parameter: {parameter}")
+        unknown = set(fields) - set(Threshold._fields)
+        if unknown:
+            raise ValueError(f"Unknown threshold fields for {parameter}: {', '.join(sorted(unknown))}")
+        thresholds[parameter] = thresholds[parameter]._replace(**fields)
+        validate_threshold(parameter, thresholds[parameter])
+    return RiskProfile(name, thresholds)
+
+
+def to_matrix(reports: List[dict]) -> np.ndarray:
+    return np.array(
+        [[np.nan if r.get(p) is None else r[p] for p in PARAMETERS] for r in reports],
+        dtype=float,
+    ).reshape(len(reports), len(PARAMETERS))
+
+
+def triage_status(score: float) -> str:
+    if score >= HIGH_PRIORITY_SCORE:
+        return "high_priority"
+    if score >= REVIEW_SCORE:
+        return "under_review"
+    return "submitted"
+
+
+# Fields ``assessment`` stores; a rescore rewrites a report only when one of them changes
+ASSESSMENT_FIELDS = ("risk_score", "risk_flags", "risk_profile", "risk_status")
+
+
+def assessment(profile: RiskProfile, score: float, exceeded) -> dict:
+    """Fields stored on a water report for one scored row."""
+    status = triage_status(score)
+    return {
+        "risk_score": float(score),
+        "risk_flags": [p for p, flag in zip(PARAMETERS, exceeded) if flag],
+        "risk_profile": profile.name,
+        # Status triage last assigned; a different current status means a human changed it
+        "risk_status": status,
+    }
+
+
+class RiskScorer:
+    def __init__(self):
+        self.profile = build_profile(DEFAULT_PROFILE)
+        self._settings = {"profile": DEFAULT_PROFILE, "overrides": {}}
+        self._loaded_at = 0.0
+
+    async def load(self, db):
+        settings = await db[SETTINGS_COLLECTION].find_one({"_id": SETTINGS_ID}, {"_id": 0})
+        if settings:
+            self.profile = build_profile(settings["profile"], settings.get("overrides"))
+            self._settings = settings
+        self._loaded_at = time.monotonic()
+
+    async def current(self, db) -> RiskProfile:
+        # Another worker may have switched profiles; re-read it periodically
+        if time.monotonic() - self._loaded_at > PROFILE_TTL_SECONDS:
+            await self.load(db)
+        return self.profile
+
+    def settings(self) -> dict:
+        return {**self._settings, "review_score": REVIEW_SCORE, "high_priority_score": HIGH_PRIORITY_SCORE}
+
+    async def configure(self, db, name: str, overrides: Optional[Dict[str, dict]] = None) -> RiskProfile:
+        profile = build_profile(name, overrides)
+        settings = {"profile": name, "overrides": overrides or {}, "updated_at": datetime.utcnow()}
+        await db[SETTINGS_COLLECTION].replace_one({"_id": SETTINGS_ID}, settings, upsert=True)
+        self.profile, self._settings, self._loaded_at = profile, settings, time.monotonic()
+        return profile
+
+
+async def rescore_collection(
+        db, profile: RiskProfile, chunk_size: int = RESCORE_CHUNK_SIZE,
+        on_moves: Optional[Callable[[List[Tuple[dict, str, str]]], Awaitable[None]]] = None,
+        query: Optional[dict] = None) -> Tuple[int, Counter]:
+    """Rescore the water reports matching ``query`` (all by default) in chunks.
+
+    Returns (reports scored, status count deltas). Only reports whose
+    assessment changed are written and get a new sync sequence, so reports
+    stored before scoring existed are backfilled and an unchanged rescore
+    costs delta-sync clients nothing.
+
+    A report's status follows the new triage only while it still holds the
+    status triage gave it last time, so manual decisions are never overwritten.
+    Status moves are written conditionally on the status that was read, so a
+    manual change made during the rescore wins, and only the moves that were
+    actually written are counted. ``on_moves`` gets each chunk's written moves
+    as (report, old status, new status), even when other writes of the chunk
+    failed, so derived counts follow chunk by chunk if the rescore stops partway.
+    """
+    # district, date and source locate a report's rollup for on_moves
+    projection = {"_id": 0, "id": 1, "status": 1, "district": 1, "collection_date": 1, "water_source": 1,
+                  **{field: 1 for field in ASSESSMENT_FIELDS}, **{p: 1 for p in PARAMETERS}}
+    cursor = db.water_reports.find(query or {}, projection).batch_size(chunk_size)
+    scored = 0
+    status_changes = Counter()
+    chunk = []
+    # Status moves are single writes; bounded so a chunk can't drain the connection pool
+    concurrency = asyncio.Semaphore(RESCORE_CONCURRENCY)
+
+    async def move_status(report: dict, fields: dict) -> bool:
+        async with concurrency:
+            result = await db.water_reports.update_one(
+                {"id": report["id"], "status": report["status"]},
+                {"$set": {**fields, "status": fields["risk_status"]}})
+            if result.matched_count:
+                return True
+            # Someone changed the status since it was read; store the scores and keep their decision
+            await db.water_reports.update_one({"id": report["id"]}, {"$set": fields})
+            return False
+
+    async def flush():
+        nonlocal scored
+        scores, exceeded = profile.score(to_matrix(chunk))
+        changed = []
+        for report, score, flags in zip(chunk, scores, exceeded):
+            fields = assessment(profile, score, flags)
+            if any(report.get(field) != fields[field] for field in ASSESSMENT_FIELDS):
+                changed.append((report, fields))
+        scored += len(chunk)
+        chunk.clear()
+        if not changed:
+            return
+
+        first_seq, stamped_at = await sync.reserve(db, len(changed))
+        updates, moves = [], []
+        for offset, (report, fields) in enumerate(changed):
+            fields.update({sync.SEQ_FIELD: first_seq + offset, sync.AT_FIELD: stamped_at})
+            if report.get("risk_status", "submitted") == report["status"] and fields["risk_status"] != report["status"]:
+                moves.append((report, fields))
+            else:
+                updates.append(UpdateOne({"id": report["id"]}, {"$set": fields}))
+        if updates:
+            await db.water_reports.bulk_write(updates, ordered=False)
+        outcomes = await asyncio.gather(*(move_status(report, fields) for report, fields in moves),
+                                        return_exceptions=True)
+        written = [(report, report["status"], fields["risk_status"])
+                   for (report, fields), outcome in zip(moves, outcomes) if outcome is True]
+        for _, old, new in written:
+            status_changes[old] -= 1
+            status_changes[new] += 1
+        if written and on_moves is not None:
+            await on_moves(written)
+        for outcome in outcomes:
+            if isinstance(outcome, BaseException):
+                raise outcome
+
+    async for report in cursor:
+        chunk.append(report)
+        if len(chunk) >= chunk_size:
+            await flush()
+    if chunk:
+        await flush()
+    return scored, status_changes
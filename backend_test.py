@@ -6,10 +6,14 @@ Tests all API endpoints for functionality, data validation, and error handling
 
 import requests
 import json
+import threading
 from datetime import datetime
 import sys
 import os
 
+# The engine checks call the backend's pure functions directly
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+
 # Get backend URL from frontend .env file
 def get_backend_url():
     try:
@@ -113,12 +117,27 @@ class BackendTester:
             self.errors.append(f"POST {endpoint}: {str(e)}")
             return False
 
+    def check(self, description, condition, detail=""):
+        """Record one deterministic assertion"""
+        if condition:
+            print(f"   ✅ {description}")
+            self.passed += 1
+        else:
+            print(f"   ❌ FAILED - {description} {detail}".rstrip())
+            self.failed += 1
+            self.errors.append(f"{description} {detail}".rstrip())
+        return condition
+
     def run_all_tests(self):
         """Run all backend API tests"""
         print("=" * 80)
         print("🚀 STARTING JAL DRISHTI BACKEND API TESTS")
         print("=" * 80)
         
+        # Test 0: Health probes
+        self.test_get_endpoint("/health/live", expected_keys=["status"], description="Liveness probe")
+        self.test_get_endpoint("/health/ready", expected_keys=["status"], description="Readiness probe")
+        
         # Test 1: Districts API
         self.test_get_endpoint("/districts", 
                              expected_keys=["name", "state"],
@@ -137,6 +156,31 @@ class BackendTester:
         self.test_get_endpoint("/map-locations",
                              description="Map marker locations")
         
+        # Test 4b: Clustered map viewport
+        self.test_get_endpoint("/map-locations?min_lat=22&min_lng=89&max_lat=29&max_lng=97&zoom=6",
+                             expected_keys=["zoom", "clusters", "points"],
+                             description="Clustered map viewport")
+        
+        # Test 4c: Nearby reports
+        self.test_get_endpoint("/reports/nearby?lat=26.14&lng=91.73&radius_km=10",
+                             description="Reports near Guwahati")
+        
+        # Test 4d: Hotspots
+        self.test_get_endpoint("/hotspots",
+                             expected_keys=["window_days", "hotspots"],
+                             description="Spatial report hotspots")
+        
+        self.test_hotspot_engine()
+        
+        # Test 4e: Delta sync
+        self.test_get_endpoint("/sync?limit=50",
+                             expected_keys=["token", "has_more", "changes", "deleted"],
+                             description="Delta sync from scratch")
+        
+        # Test 4f: Archive partitions
+        self.test_get_endpoint("/archive/water_reports/partitions",
+                             description="Archived water report partitions")
+        
         # Test 5: FAQs API
         self.test_get_endpoint("/faqs",
                              expected_keys=["id", "question", "answer", "category"],
@@ -146,6 +190,12 @@ class BackendTester:
         self.test_get_endpoint("/faqs/search?q=water",
                              description="FAQ search functionality")
         
+        # Test 6b: BM25 ranking on a fixed corpus
+        self.test_faq_search_engine()
+        
+        # Test 6c: FAQ similarity for automatic answers
+        self.test_faq_matcher()
+        
         # Test 7: Water Report Submission
         water_report_data = {
             "location_name": "Test Location, Shillong",
@@ -166,6 +216,9 @@ class BackendTester:
                               water_report_data,
                               description="Water quality report submission")
         
+        # Test 7b: Risk scoring of water readings
+        self.test_risk_scoring()
+        
         # Test 8: Patient Report Submission
         patient_report_data = {
             "patient_name": "Test Patient",
@@ -186,10 +239,44 @@ class BackendTester:
                               patient_report_data,
                               description="Patient report submission")
         
-        # Test 9: Verify districts contain Northeast states
+        # Test 8b: Batch submission from offline collectors
+        self.test_post_endpoint("/water-reports/batch",
+                              [water_report_data, water_report_data],
+                              description="Water quality report batch submission")
+        
+        self.test_batch_outcomes(water_report_data)
+        
+        # Test 8c: Outbreak alerts
+        self.test_outbreak_engine()
+        self.test_get_endpoint("/alerts",
+                             description="Outbreak early-warning alerts")
+        
+        # Test 8d: Delta sync picks up new reports
+        self.test_sync_tokens(water_report_data)
+        
+        # Test 9: Cursor pagination of report lists
+        self.test_get_endpoint("/water-reports?limit=5",
+                             expected_keys=["id", "location_name", "district", "status"],
+                             description="Water reports first page")
+        self.test_get_endpoint("/water-reports?limit=5&fields=district,status",
+                             expected_keys=["id", "district", "status"],
+                             description="Water reports with field selection")
+        
+        # Test 9a: Cursor tokens
+        self.test_cursors()
+        
+        # Test 9b: District trends from the daily rollups
+        self.test_get_endpoint("/analytics/district-trends?source=water",
+                             expected_keys=["source", "start", "end", "districts"],
+                             description="District trends analytics")
+        
+        # Test 10: Verify districts contain Northeast states
         self.test_northeast_districts()
         
-        # Test 10: Test error handling
+        # Test 10b: Live feed pushes new reports (needs MongoDB running as a replica set)
+        self.test_live_feed(water_report_data)
+        
+        # Test 11: Test error handling
         self.test_error_handling()
         
         # Print final results
@@ -226,6 +313,341 @@ class BackendTester:
             self.failed += 1
             self.errors.append(f"Districts validation: {str(e)}")
     
+    def test_cursors(self):
+        """Cursors round-trip and garbage cursors are rejected with 400"""
+        print(f"\n🧪 Testing Cursor Pagination Tokens")
+        try:
+            import pagination
+            created_at = datetime(2024, 5, 1, 12, 30, 15, 123000)
+            token = pagination.encode_cursor(created_at, "report-1")
+            self.check("Cursor round-trips",
+                       pagination.decode_cursor(token) == (created_at, "report-1"))
+            filter_ = pagination.keyset_filter(token, {"district": "Kamrup"})
+            self.check("Keyset filter keeps the base filter",
+                       filter_["$and"][0] == {"district": "Kamrup"})
+            try:
+                pagination.decode_cursor("not-a-cursor")
+                self.check("Garbage cursor raises InvalidCursor", False)
+            except pagination.InvalidCursor:
+                self.check("Garbage cursor raises InvalidCursor", True)
+            response = requests.get(f"{BASE_URL}/water-reports?cursor=not-a-cursor", timeout=10)
+            self.check("Invalid cursor returns 400", response.status_code == 400,
+                       f"(got {response.status_code})")
+        except Exception as e:
+            print(f"   ❌ ERROR: {str(e)}")
+            self.failed += 1
+            self.errors.append(f"Cursor pagination: {str(e)}")
+    
+    def test_faq_search_engine(self):
+        """BM25 ranking, field weights and prefix expansion of the FAQ index"""
+        print(f"\n🧪 Testing FAQ Search Ranking")
+        try:
+            from faq_search import FAQSearchIndex
+            faqs = [
+                {"id": "boil", "question": "Should I boil drinking water?",
+                 "answer": "Boiling for one minute kills cholera bacteria."},
+                {"id": "cholera", "question": "What are the symptoms of cholera?",
+                 "answer": "Watery diarrhoea and dehydration."},
+                {"id": "tank", "question": "How do I clean a storage tank?",
+                 "answer": "Scrub it and rinse away any contamination."},
+            ]
+            index = FAQSearchIndex()
+            index.build(faqs)
+            ids = lambda query: [faq["id"] for faq in index.search(query)]
+            self.check("Question matches outrank answer matches",
+                       ids("cholera") == ["cholera", "boil"], f"(got {ids('cholera')})")
+            self.check("Rarer terms decide the ranking",
+                       ids("cholera symptoms")[0] == "cholera", f"(got {ids('cholera symptoms')})")
+            self.check("Partial words expand as prefixes",
+                       ids("contam") == ["tank"], f"(got {ids('contam')})")
+            self.check("Short partial words are not expanded", ids("ch") == [], f"(got {ids('ch')})")
+            self.check("Stopword-only queries match nothing", ids("what is the") == [])
+            self.check("Limit caps the results", len(index.search("water cholera tank", limit=2)) == 2)
+        except Exception as e:
+            print(f"   ❌ ERROR: {str(e)}")
+            self.failed += 1
+            self.errors.append(f"FAQ search ranking: {str(e)}")
+    
+    def test_batch_outcomes(self, report_data):
+        """A batch reports created, duplicate and invalid items by position"""
+        print(f"\n🧪 Testing Batch Item Outcomes")
+        try:
+            report_id = f"batch-test-{datetime.now().timestamp()}"
+            items = [{**report_data, "id": report_id}, {**report_data, "id": report_id}, {"district": "Kamrup"}]
+            response = requests.post(f"{BASE_URL}/water-reports/batch", json=items, timeout=10)
+            if not self.check("Batch accepted", response.status_code == 200, f"(got {response.status_code})"):
+                return
+            result = response.json()
+            statuses = [item["status"] for item in result["results"]]
+            self.check("Items reported in request order", statuses == ["created", "duplicate", "invalid"],
+                       f"(got {statuses})")
+            totals = (result["created"], result["duplicates"], result["failed"])
+            self.check("Totals match the items", totals == (1, 1, 1),
+                       f"(got {totals})")
+            response = requests.post(f"{BASE_URL}/water-reports/batch", json=items[:1], timeout=10)
+            self.check("Resubmitted item is a duplicate",
+                       response.status_code == 200 and response.json()["duplicates"] == 1)
+        except Exception as e:
+            print(f"   ❌ ERROR: {str(e)}")
+            self.failed += 1
+            self.errors.append(f"Batch outcomes: {str(e)}")
+    
+    def test_outbreak_engine(self):
+        """EWMA spikes and CUSUM drifts over a baseline of one case a day"""
+        print(f"\n🧪 Testing Outbreak Detection")
+        try:
+            from datetime import date, timedelta
+            import outbreak
+            today = date(2024, 6, 28)
+            key = ("Kamrup", "cholera")
+            
+            def detector(recent_days=0, recent_cases=0):
+                engine = outbreak.OutbreakDetector()
+                engine.today = today
+                late_alerts = []
+                for days_ago in range(1, engine.window_days):
+                    cases = recent_cases if days_ago <= recent_days else 1
+                    late_alerts.append(engine.update(key, today - timedelta(days=days_ago), cases))
+                engine._fit_baselines()
+                return engine, late_alerts
+            
+            engine, late_alerts = detector()
+            self.check("Past days never alert", late_alerts == [None] * (engine.window_days - 1))
+            self.check("Baseline is one case a day", abs(engine.mean[0] - 1) < 0.01, f"(got {engine.mean[0]:.3f})")
+            self.check("Usual count does not alert", detector()[0].update(key, today, 1) is None)
+            self.check("Below the minimum cases does not alert", detector()[0].update(key, today, 2) is None)
+            signal = detector()[0].update(key, today, 5)
+            self.check("Spike fires on the z-score", signal is not None and signal.z_score >= outbreak.Z_THRESHOLD,
+                       f"(got {signal})")
+            engine = detector(recent_days=3, recent_cases=4)[0]
+            signal = engine.update(key, today, 4)
+            self.check("Sustained rise fires on the CUSUM",
+                       signal is not None and signal.z_score < outbreak.Z_THRESHOLD
+                       and signal.cusum >= outbreak.CUSUM_H,
+                       f"(got {signal})")
+            self.check("Vectorized scan agrees with update", engine.scan() == [signal])
+            self.check("Shorter rise stays quiet",
+                       detector(recent_days=1, recent_cases=4)[0].update(key, today, 4) is None)
+        except Exception as e:
+            print(f"   ❌ ERROR: {str(e)}")
+            self.failed += 1
+            self.errors.append(f"Outbreak detection: {str(e)}")
+    
+    def test_risk_scoring(self):
+        """Severity scoring matrix, triage bands and threshold validation"""
+        print(f"\n🧪 Testing Water Risk Scoring")
+        try:
+            import water_risk
+            profile = water_risk.build_profile("bis_10500")
+            readings = [
+                {"ph_level": 7.2, "turbidity": 0.5},    # compliant
+                {"ph_level": 7.2, "turbidity": 3.0},    # halfway to the turbidity limit
+                {"ph_level": 9.0, "turbidity": 3.0},    # worst parameter wins
+                {"ph_level": 5.0},                      # beyond the pH limit
+                {"e_coli": 1},                          # any E. coli
+                {},                                     # nothing measured
+            ]
+            scores, exceeded = profile.score(water_risk.to_matrix(readings))
+            self.check("Scores follow the weighted severities",
+                       scores.tolist() == [0.0, 35.0, 35.0, 60.0, 100.0, 0.0], f"(got {scores.tolist()})")
+            flags = [water_risk.assessment(profile, score, row)["risk_flags"] for score, row in zip(scores, exceeded)]
+            self.check("Flags name the exceeded parameters",
+                       flags == [[], ["turbidity"], ["ph_level", "turbidity"], ["ph_level"], ["e_coli"], []],
+                       f"(got {flags})")
+            statuses = [water_risk.triage_status(score) for score in scores]
+            self.check("Triage bands",
+                       statuses == ["submitted", "under_review", "under_review", "under_review", "high_priority",
+                                    "submitted"], f"(got {statuses})")
+            single, _ = profile.score(water_risk.to_matrix(readings[1:2]))
+            self.check("One report scores like a row of a chunk", single.tolist() == [35.0])
+            for description, overrides in [
+                ("Inverted thresholds are rejected", {"turbidity": {"acceptable_max": 6.0}}),
+                ("Unknown threshold fields are rejected", {"turbidity": {"maximum": 6.0}}),
+                ("Bounds without limits are rejected", {"tds": {"limit_max": None}}),
+            ]:
+                try:
+                    water_risk.build_profile("bis_10500", overrides)
+                    self.check(description, False)
+                except ValueError:
+                    self.check(description, True)
+        except Exception as e:
+            print(f"   ❌ ERROR: {str(e)}")
+            self.failed += 1
+            self.errors.append(f"Water risk scoring: {str(e)}")
+    
+    def test_hotspot_engine(self):
+        """Dense grid cells group into connected hotspots"""
+        print(f"\n🧪 Testing Hotspot Detection")
+        try:
+            from datetime import date, timedelta
+            import hotspots
+            today = date(2024, 6, 28)
+            index = hotspots.HotspotIndex(window_days=14, cell_km=1.0, min_reports=5)
+            index.today = today
+            reported = datetime(2024, 6, 27, 9, 0)
+            step = index.cell_degrees
+            
+            def patients(prefix, count, latitude, longitude, report_date=reported):
+                return [{"id": f"{prefix}-{n}", "latitude": latitude, "longitude": longitude,
+                         "report_date": report_date, "suspected_disease": " Cholera "} for n in range(count)]
+            
+            # Three patients and two failing water sources in one cell
+            added = index.add_reports("patient_reports", patients("village", 3, 26.1405, 91.7305))
+            added += index.add_reports("water_reports", [
+                {"id": f"well-{n}", "latitude": 26.1405, "longitude": 91.7305, "collection_date": reported,
+                 "water_source": "well", "risk_score": 80.0} for n in range(2)])
+            # Three patients in each of three adjacent cells along a road
+            for n in range(3):
+                added += index.add_reports(
+                    "patient_reports", patients(f"road{n}", 3, 25.5 + step / 2, 91.9 + (n + 0.5) * step))
+            # Too few reports, too old or water that passed
+            added += index.add_reports("patient_reports", patients("remote", 4, 27.0, 94.0))
+            added += index.add_reports("patient_reports", patients("old", 5, 24.0, 92.0, reported - timedelta(days=20)))
+            added += index.add_reports("water_reports", [
+                {"id": "clean", "latitude": 26.1405, "longitude": 91.7305, "collection_date": reported,
+                 "water_source": "well", "risk_score": 10.0}])
+            self.check("Only qualifying reports are indexed", added == 18, f"(got {added})")
+            
+            found = index.hotspots()
+            shapes = [(h["cells"], h["count"], h["co_located"]) for h in found]
+            self.check("Co-located hotspot first, then the connected chain",
+                       shapes == [(1, 5, True), (3, 9, False)], f"(got {shapes})")
+            if found:
+                self.check("Labels are normalised and counted",
+                           found[0]["suspected_diseases"] == {"cholera": 3}
+                           and found[0]["water_sources"] == {"well": 2},
+                           f"(got {found[0]['suspected_diseases']}, {found[0]['water_sources']})")
+            self.check("Hotspots are cached until the index changes", index.hotspots() is found)
+        except Exception as e:
+            print(f"   ❌ ERROR: {str(e)}")
+            self.failed += 1
+            self.errors.append(f"Hotspot detection: {str(e)}")
+    
+    def test_sync_tokens(self, report_data):
+        """Sync tokens round-trip, expire into a reset and hold back settling changes"""
+        print(f"\n🧪 Testing Delta Sync Tokens")
+        try:
+            from datetime import timedelta
+            import sync
+            issued_at = datetime(2024, 6, 28, 10, 0, 0, 500000)
+            self.check("Token round-trips", sync.decode_token(sync.encode_token(42, issued_at)) == (42, issued_at))
+            try:
+                sync.decode_token("not-a-token")
+                self.check("Garbage token raises InvalidToken", False)
+            except sync.InvalidToken:
+                self.check("Garbage token raises InvalidToken", True)
+            response = requests.get(f"{BASE_URL}/sync", params={"since": "not-a-token"}, timeout=10)
+            self.check("Invalid token returns 400", response.status_code == 400, f"(got {response.status_code})")
+            expired = sync.encode_token(1, datetime.utcnow() - timedelta(days=sync.SYNC_TOMBSTONE_DAYS + 1))
+            response = requests.get(f"{BASE_URL}/sync", params={"since": expired, "limit": 1}, timeout=10)
+            self.check("Expired token gets a full resync", response.status_code == 200 and response.json()["reset"])
+            
+            def synced_ids(token):
+                # Follow has_more to the end; returns the water report ids seen and the last token
+                ids = set()
+                for _ in range(20):
+                    page = requests.get(f"{BASE_URL}/sync", params={"since": token, "limit": sync.MAX_LIMIT},
+                                        timeout=30).json()
+                    ids.update(report["id"] for report in page["changes"]["water_reports"])
+                    token = page["token"]
+                    if not page["has_more"]:
+                        break
+                return ids, token
+            
+            _, token = synced_ids(None)
+            report_id = f"sync-test-{datetime.now().timestamp()}"
+            requests.post(f"{BASE_URL}/water-reports", json={**report_data, "id": report_id}, timeout=10)
+            ids, token = synced_ids(token)
+            self.check("New report is in the next sync", report_id in ids)
+            ids, _ = synced_ids(token)
+            # Settling changes are resent until they are older than SYNC_SETTLE_SECONDS
+            self.check("Settling report is sent again", report_id in ids)
+        except Exception as e:
+            print(f"   ❌ ERROR: {str(e)}")
+            self.failed += 1
+            self.errors.append(f"Delta sync: {str(e)}")
+    
+    def test_faq_matcher(self):
+        """TF-IDF confidences against the automatic answer threshold"""
+        print(f"\n🧪 Testing FAQ Matching")
+        try:
+            import faq_matcher
+            faqs = [
+                {"id": "boil", "question": "Should I boil drinking water?",
+                 "answer": "Boiling for one minute kills cholera bacteria."},
+                {"id": "cholera", "question": "What are the symptoms of cholera?",
+                 "answer": "Watery diarrhoea and dehydration."},
+                {"id": "tank", "question": "How do I clean a storage tank?",
+                 "answer": "Scrub it and rinse away any contamination."},
+            ]
+            matcher = faq_matcher.FAQMatcher()
+            matcher.build(faqs)
+            questions = ["What are the symptoms of cholera?", "Symptoms of cholera in children after floods",
+                         "Football scores"]
+            exact, partial, unrelated = matcher.match(questions)
+            fields = faq_matcher.answer_fields(exact)
+            self.check("Exact FAQ question is answered automatically",
+                       exact is not None and exact.faq["id"] == "cholera"
+                       and exact.confidence >= faq_matcher.FAQ_AUTO_ANSWER_THRESHOLD
+                       and fields.get("status") == faq_matcher.AUTO_ANSWERED
+                       and fields.get("response") == faqs[1]["answer"], f"(got {exact})")
+            fields = faq_matcher.answer_fields(partial)
+            self.check("Partial match is suggested but left for a person",
+                       partial is not None and partial.faq["id"] == "cholera"
+                       and partial.confidence < faq_matcher.FAQ_AUTO_ANSWER_THRESHOLD
+                       and "status" not in fields and fields["faq_id"] == "cholera", f"(got {partial})")
+            self.check("Unrelated question has no match", unrelated is None
+                       and faq_matcher.answer_fields(unrelated) == {"faq_id": None, "match_confidence": None})
+            self.check("Batch matches equal single matches",
+                       [matcher.match([question])[0] for question in questions] == [exact, partial, unrelated])
+        except Exception as e:
+            print(f"   ❌ ERROR: {str(e)}")
+            self.failed += 1
+            self.errors.append(f"FAQ matching: {str(e)}")
+    
+    def test_live_feed(self, report_data):
+        """Open the SSE feed, submit a report and wait for its event"""
+        print(f"\n🧪 Testing Live Feed (SSE)")
+        received = threading.Event()
+        subscribed = threading.Event()
+        feed_status = {}
+        
+        def listen():
+            try:
+                with requests.get(f"{BASE_URL}/live", stream=True, timeout=15) as response:
+                    feed_status["code"] = response.status_code
+                    subscribed.set()
+                    if response.status_code != 200:
+                        return
+                    for line in response.iter_lines(decode_unicode=True):
+                        if line == "event: report":
+                            received.set()
+                            return
+            except Exception:
+                pass
+        
+        listener = threading.Thread(target=listen, daemon=True)
+        listener.start()
+        try:
+            subscribed.wait(10)
+            if feed_status.get("code") == 503:
+                # Change streams need a replica set; nothing to check without one
+                print(f"   ⏭️  SKIPPED - Live feed unavailable (MongoDB is not a replica set)")
+                return
+            threading.Event().wait(1)  # let the subscription register
+            requests.post(f"{BASE_URL}/water-reports", json=report_data, timeout=10)
+            if received.wait(10):
+                print(f"   ✅ SUCCESS - Report event received")
+                self.passed += 1
+            else:
+                print(f"   ❌ FAILED - No live event received (status {feed_status.get('code')})")
+                self.failed += 1
+                self.errors.append("Live feed: no event received for a new report")
+        except Exception as e:
+            print(f"   ❌ ERROR: {str(e)}")
+            self.failed += 1
+            self.errors.append(f"Live feed: {str(e)}")
+    
     def test_error_handling(self):
         """Test error handling for invalid requests"""
         print(f"\n🧪 Testing Error Handling")